@@ -1,3 +1,14 @@
 from django.contrib import admin
+from .models import RequestProfile
 
-# Register your models here.
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Read-only listing of captured request profiles, slowest first."""
+    list_display = ['path', 'method', 'status_code', 'duration_ms', 'trigger', 'user', 'created_at']
+    list_filter = ['trigger', 'method', 'status_code']
+    search_fields = ['path']
+    ordering = ['-duration_ms']
+    readonly_fields = ['path', 'method', 'status_code', 'duration_ms', 'trigger', 'profile_file', 'user', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
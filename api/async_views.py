@@ -0,0 +1,144 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from .digests import file_digest
+from .metrics import UPLOADS_TOTAL, time_stage
+from .model_registry import get_caption_generator
+from .models import Caption, Image
+from .pipeline import copy_processed_image, enqueue_image, processed_duplicates
+from .renditions import schedule_renditions
+from .serializers import ImageSerializer
+from .uploads import (
+    NSFW_REJECTED, analysed_image, check_upload, upload_error, upload_failure, use_async_pipeline, with_caption
+)
+from .vision import aanalyze_image, get_vision_backend
+
+# DRF views are synchronous, so under ASGI every upload to ImageViewSet holds a thread for the
+# whole vision round trip. The view here is a native coroutine: vision calls and database
+# queries are awaited, and only CPU-bound work (hashing, downscaling, captioning) is handed to
+# worker threads. It answers exactly like ImageViewSet.upload_image.
+
+
+async def authenticate(request):
+    """
+    Authenticates a plain Django request with the DRF authentication classes.
+
+    :return: Tuple of (DRF Request, user); the user is None unless valid credentials were sent.
+    """
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = await sync_to_async(lambda: drf_request.user)()
+    except exceptions.AuthenticationFailed:
+        return drf_request, None
+    return drf_request, user if user.is_authenticated else None
+
+
+def image_response(drf_request, image, response_status, caption=None):
+    image_data = ImageSerializer(image, context={'request': drf_request}).data
+    return JsonResponse(with_caption(image_data, caption), status=response_status)
+
+
+def error_response(error):
+    """:param error: Tuple of (body, status) from the upload helpers."""
+    body, response_status = error
+    return JsonResponse(body, status=response_status)
+
+
+@csrf_exempt  # Clients authenticate with a token, as on the DRF views
+@require_POST
+async def upload_image_async(request):
+    with time_stage('total'):
+        return await handle_upload(request)
+
+
+async def handle_upload(request):
+    """Async counterpart of ImageViewSet.handle_upload, recording the same metrics."""
+    drf_request, user = await authenticate(request)
+    if user is None:
+        authenticators = drf_request.authenticators
+        response = JsonResponse({"detail": "Authentication credentials were not provided or are invalid."},
+                                status=status.HTTP_401_UNAUTHORIZED)
+        if authenticators and authenticators[0].authenticate_header(drf_request):
+            response['WWW-Authenticate'] = authenticators[0].authenticate_header(drf_request)
+        return response
+
+    # Parsing runs the upload handlers, which hash the file as it is read.
+    files = await sync_to_async(lambda: request.FILES, thread_sensitive=False)()
+    image_file = files.get('image')
+    rejection = check_upload(image_file, getattr(request, 'rejected_uploads', {}))
+    if rejection is not None:
+        return error_response(rejection)
+
+    digest = getattr(image_file, 'content_hash', None)
+    if not digest:
+        with time_stage('digest'):
+            digest = await sync_to_async(file_digest, thread_sensitive=False)(image_file)
+    with time_stage('duplicate_lookup'):
+        duplicate = await processed_duplicates(digest, user).afirst()
+    if duplicate is not None:
+        UPLOADS_TOTAL.labels(outcome='duplicate').inc()
+        return await reuse_duplicate(drf_request, user, duplicate)
+
+    if use_async_pipeline(request.GET):
+        UPLOADS_TOTAL.labels(outcome='queued').inc()
+        image = Image(user=user, status='PENDING', content_hash=digest)
+        await sync_to_async(image.store_file, thread_sensitive=False)(image_file.name, image_file)
+        await image.asave()
+        await sync_to_async(enqueue_image)(image.id)
+        return image_response(drf_request, image, status.HTTP_202_ACCEPTED)
+
+    try:
+        with time_stage('vision'):
+            labels, is_nsfw, nsfw_score = await aanalyze_image(image_file, digest=digest, backend=get_vision_backend())
+    except Exception as e:
+        return error_response(upload_failure(f"Error processing image: {str(e)}", status.HTTP_400_BAD_REQUEST,
+                                             'vision_error'))
+
+    image = analysed_image(user, digest, labels, is_nsfw, nsfw_score)
+    if not is_nsfw:
+        image_file.seek(0)
+        with time_stage('storage'):
+            await sync_to_async(image.store_file, thread_sensitive=False)(image_file.name, image_file)
+    with time_stage('db_write'):
+        await image.asave()
+
+    if is_nsfw:
+        return error_response(upload_error(NSFW_REJECTED, status.HTTP_400_BAD_REQUEST, 'rejected_nsfw'))
+
+    # Checks the model store for a newer published version, which reads from disk.
+    caption_generator = await sync_to_async(get_caption_generator, thread_sensitive=False)()
+    try:
+        with time_stage('caption'):
+            caption_text = await sync_to_async(caption_generator.generate_improved_caption,
+                                               thread_sensitive=False)(labels)
+        with time_stage('db_write'):
+            caption = await Caption.objects.acreate(image=image, text=caption_text, generated_text=caption_text)
+
+        with time_stage('update_model'):
+            await sync_to_async(caption_generator.update_model, thread_sensitive=False)(labels, caption_text)
+        await sync_to_async(schedule_renditions)(image.id)
+
+    except Exception as e:
+        return error_response(upload_failure(f"Error generating caption: {str(e)}",
+                                             status.HTTP_500_INTERNAL_SERVER_ERROR, 'caption_error'))
+
+    UPLOADS_TOTAL.labels(outcome='accepted').inc()
+    return image_response(drf_request, image, status.HTTP_201_CREATED, caption=caption)
+
+
+async def reuse_duplicate(drf_request, user, duplicate):
+    """Async counterpart of ImageViewSet.reuse_duplicate."""
+    if duplicate.user_id == user.id:
+        image, response_status = duplicate, status.HTTP_200_OK
+    else:
+        image = await sync_to_async(copy_processed_image)(duplicate, user)
+        response_status = status.HTTP_201_CREATED
+
+    if image.is_nsfw:
+        return error_response(upload_error(NSFW_REJECTED, status.HTTP_400_BAD_REQUEST))
+    # Own images keep the caption joined by processed_duplicates; copies get their own.
+    return image_response(drf_request, image, response_status, caption=getattr(image, 'caption', None))
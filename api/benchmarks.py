@@ -0,0 +1,160 @@
+import io
+import os
+import platform
+import statistics
+import tempfile
+import time
+import django
+import numpy as np
+import sklearn
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image as PILImage
+from rest_framework.test import APIClient
+from .caption_generator import CustomCaptionGenerator
+from .model_registry import reset_caption_generator
+from .rekognition import reset_rekognition_client
+from .vision import reset_vision_backend
+
+# Storage and vision settings for upload benchmarks, so they run offline and never touch media files.
+OFFLINE_UPLOAD_SETTINGS = {
+    'STORAGES': {
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    'VISION_BACKEND': 'api.vision.RekognitionBackend',
+    'REKOGNITION_BACKEND': 'stub',
+    'ASYNC_UPLOADS': False,
+    'RENDITIONS_ON_UPLOAD': False,
+    'CAPTION_CACHE_SHARED': False,
+}
+
+
+def environment():
+    """Describes the machine and library versions a run was made with."""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'django': django.get_version(),
+        'numpy': np.__version__,
+        'scikit-learn': sklearn.__version__,
+    }
+
+
+def synthetic_corpus(size, n_captions, vocabulary_size=2000, seed=0):
+    """
+    Generates a reproducible training corpus.
+
+    :param size: Number of (labels, caption) examples.
+    :param n_captions: Number of distinct captions.
+    :param vocabulary_size: Number of distinct labels.
+    :param seed: Random seed.
+    :return: Tuple of (labels_list, captions).
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"label{i}" for i in range(vocabulary_size)])
+    lengths = rng.integers(3, 7, size=size)
+    labels_list = [vocabulary[rng.integers(0, vocabulary_size, size=length)].tolist() for length in lengths]
+    captions = [f"Caption {i}" for i in rng.integers(0, n_captions, size=size)]
+    return labels_list, captions
+
+
+def timed(func, calls):
+    """
+    Calls func repeatedly and summarises the per-call wall time.
+
+    :return: Dict with calls, total_seconds, mean_us, median_us and p95_us.
+    """
+    durations = []
+    for i in range(calls):
+        start = time.perf_counter()
+        func(i)
+        durations.append(time.perf_counter() - start)
+    durations_us = sorted(d * 1e6 for d in durations)
+    return {
+        'calls': calls,
+        'total_seconds': sum(durations),
+        'mean_us': statistics.fmean(durations_us),
+        'median_us': statistics.median(durations_us),
+        'p95_us': durations_us[min(int(len(durations_us) * 0.95), len(durations_us) - 1)],
+    }
+
+
+def benchmark_caption_model(size, n_captions, calls=200, seed=0):
+    """
+    Times training, single and batch caption generation, and online updates at one corpus size.
+
+    :param size: Number of training examples.
+    :param n_captions: Number of distinct captions in the corpus.
+    :param calls: Number of timed calls for the per-call benchmarks.
+    :return: List of result dicts.
+    """
+    labels_list, captions = synthetic_corpus(size, n_captions, seed=seed)
+    queries, new_captions = synthetic_corpus(calls, n_captions * 2, seed=seed + 1)
+    common = {'size': size, 'captions': n_captions}
+
+    generator = CustomCaptionGenerator()
+    start = time.perf_counter()
+    generator.train(labels_list, captions)
+    results = [dict(common, name='train', total_seconds=time.perf_counter() - start, calls=1)]
+
+    results.append(dict(common, name='generate_improved_caption',
+                        **timed(lambda i: generator.generate_improved_caption(queries[i]), calls)))
+    start = time.perf_counter()
+    generator.generate_improved_captions(queries, rng=seed)
+    batch_seconds = time.perf_counter() - start
+    results.append(dict(common, name='generate_improved_captions', calls=1, batch_size=calls,
+                        total_seconds=batch_seconds, mean_us=batch_seconds * 1e6 / calls))
+    results.append(dict(common, name='update_model',
+                        **timed(lambda i: generator.update_model(queries[i], new_captions[i]), calls)))
+    results.append(dict(common, name='generate_improved_caption_after_updates',
+                        **timed(lambda i: generator.generate_improved_caption(queries[i]), calls)))
+    return results
+
+
+def sample_image(index, size=640):
+    """Encodes a distinct JPEG per index, so uploads are never deduplicated."""
+    rng = np.random.default_rng(index)
+    pixels = rng.integers(0, 256, size=(size // 8, size // 8, 3), dtype=np.uint8)
+    image = PILImage.fromarray(pixels).resize((size, size))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def benchmark_uploads(count, image_size=640):
+    """
+    Times ``POST /api/images/upload_image/`` end to end with the stub vision backend and in-memory storage.
+
+    Runs against the current database, so call it inside a throwaway test database.
+
+    :param count: Number of uploads.
+    :param image_size: Side length of the uploaded JPEGs.
+    :return: List with one result dict.
+    """
+    images = [sample_image(i, image_size) for i in range(count)]
+    with override_settings(CAPTION_MODEL_DIR=tempfile.mkdtemp(), **OFFLINE_UPLOAD_SETTINGS):
+        reset_rekognition_client()
+        reset_vision_backend()
+        reset_caption_generator()
+        try:
+            user, _ = User.objects.get_or_create(username='benchmark')
+            client = APIClient()
+            client.force_authenticate(user=user)
+
+            def upload(i):
+                response = client.post('/api/images/upload_image/',
+                                       {'image': SimpleUploadedFile(f"bench_{i}.jpg", images[i],
+                                                                    content_type='image/jpeg')},
+                                       format='multipart')
+                if response.status_code != 201:
+                    raise RuntimeError(f"Upload failed with status {response.status_code}: {response.data}")
+
+            result = timed(upload, count)
+        finally:
+            reset_rekognition_client()
+            reset_vision_backend()
+            reset_caption_generator()
+    return [dict(result, name='upload_image', image_size=image_size)]
@@ -0,0 +1,93 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+
+
+def canonical_labels(labels):
+    """
+    Normalises a label list so label sets that vectorise identically share a cache entry.
+
+    :return: Tuple of lower-cased labels in sorted order.
+    """
+    return tuple(sorted(label.strip().lower() for label in labels))
+
+
+class CaptionCache:
+    """
+    LRU cache of caption distributions keyed by model revision and canonical label set.
+
+    Entries hold the (captions, probabilities) computed by
+    CustomCaptionGenerator.caption_distribution, so captions are still sampled per request.
+    Captions are stored as strings rather than class indices, which differ between workers
+    once their online updates have added captions in a different order. Online
+    updates change the distribution only slightly, so entries are keyed by the generator's
+    revision divided into buckets of CAPTION_CACHE_STALE_UPDATES updates; they expire once
+    that many updates have been applied, and immediately when a different model is swapped in.
+
+    With CAPTION_CACHE_SHARED set, misses fall through to the Django cache under a key that
+    includes the published store version, so workers serving the same version share entries.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = settings.CAPTION_CACHE_SIZE if max_entries is None else max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _revision_bucket(self, revision):
+        return revision // max(settings.CAPTION_CACHE_STALE_UPDATES, 1)
+
+    def _shared_key(self, version, revision, labels):
+        label_hash = hashlib.blake2b('\x1f'.join(labels).encode(), digest_size=16).hexdigest()
+        return f"caption_probs_{version}_{self._revision_bucket(revision)}_{label_hash}"
+
+    def get(self, labels, revision, version=None):
+        """
+        :param labels: Canonical label tuple.
+        :param revision: Revision of the generator being served.
+        :param version: Published store version of the generator, if any.
+        :return: Cached (captions, probabilities), or None.
+        """
+        if self.max_entries <= 0:
+            return None
+        key = (self._revision_bucket(revision), labels)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+
+        if settings.CAPTION_CACHE_SHARED and version is not None:
+            value = cache.get(self._shared_key(version, revision, labels))
+            if value is not None:
+                self._store(key, value)
+        return value
+
+    def set(self, labels, revision, value, version=None):
+        """
+        :param labels: Canonical label tuple.
+        :param revision: Revision of the generator that computed the value.
+        :param value: Tuple of (captions, probabilities).
+        :param version: Published store version of the generator, if any.
+        """
+        if self.max_entries <= 0:
+            return
+        self._store((self._revision_bucket(revision), labels), value)
+        if settings.CAPTION_CACHE_SHARED and version is not None:
+            cache.set(self._shared_key(version, revision, labels), value, timeout=settings.CAPTION_CACHE_TIMEOUT)
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every in-process entry, e.g. when a different model is swapped in."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
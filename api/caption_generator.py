@@ -1,9 +1,23 @@
+import json
 import random
+from pathlib import Path
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 import numpy as np
+from scipy.special import logsumexp
+from .caption_index import CaptionIndex
+from .online_model import OnlineNaiveBayes
+
+# Arrays persisted by save(), keyed by file stem. Each is written as its own .npy file so
+# load() can memory-map it read-only and share the pages between worker processes.
+MODEL_ARRAYS = ('idf', 'feature_count', 'class_count', 'feature_log_prob', 'class_log_prior')
 
 class CustomCaptionGenerator:
+    # Above this many captions, generate_improved_caption scores only the candidates a
+    # CaptionIndex retrieves for the query instead of every caption the model knows.
+    index_min_classes = 1024
+    index_postings_per_term = 64
+
     def __init__(self):
         """Initializes the caption generator with a TF-IDF vectorizer and a Naive Bayes classifier."""
         self.vectorizer = TfidfVectorizer()
@@ -15,6 +29,12 @@ class CustomCaptionGenerator:
             "A view of {}."
         ]
         self.trained = False
+        # Growable copy of the model, created on the first online update (see update_model).
+        self.online = None
+        self.index = None
+        self.n_documents = 0
+        # Bumped whenever the model changes, so cached distributions can be invalidated.
+        self.revision = 0
 
     def generate_caption(self, labels):
         """
@@ -39,8 +59,96 @@ class CustomCaptionGenerator:
         label_strings = [' '.join(labels) for labels in labels_list]
         X = self.vectorizer.fit_transform(label_strings)
         self.classifier.fit(X, captions)
+        self.online = None
+        self.index = None
+        self.n_documents = len(label_strings)
+        self.revision += 1
+        self.trained = True
+
+    def train_streaming(self, batches, progress=None, max_classes=None):
+        """
+        Trains the model from batches of examples without holding the corpus in memory.
+
+        Makes two passes over ``batches``: the first collects the vocabulary, document
+        frequencies and captions, the second accumulates counts one batch at a time into an
+        OnlineNaiveBayes. Memory no longer depends on the number of examples, but the model
+        keeps dense captions x vocabulary count arrays, so it still grows with the number of
+        distinct captions. Without ``max_classes`` the result matches train() on the same data.
+
+        With ``max_classes``, captions are counted with 2 x max_classes counters (Misra-Gries)
+        and only the max_classes most frequent survivors are trained on, which bounds memory by
+        max_classes x vocabulary; examples with other captions are skipped.
+
+        :param batches: Callable returning a fresh iterable of batches, each a list of (labels, caption) pairs.
+        :param progress: Optional callable invoked as ``progress(phase, examples_seen)`` after each
+            batch, where phase is 'vocabulary' or 'counts'.
+        :param max_classes: Most captions to keep; falsy keeps every caption.
+        :return: Number of examples trained on.
+        """
+        analyzer = self.vectorizer.build_analyzer()
+        document_frequency, caption_counts, n_documents = {}, {}, 0
+        for batch in batches():
+            for labels, caption in batch:
+                for term in set(analyzer(' '.join(labels))):
+                    document_frequency[term] = document_frequency.get(term, 0) + 1
+                if max_classes:
+                    count_frequent(caption_counts, caption, 2 * max_classes)
+                else:
+                    caption_counts[caption] = caption_counts.get(caption, 0) + 1
+            n_documents += len(batch)
+            if progress is not None:
+                progress('vocabulary', n_documents)
+        if not n_documents:
+            return 0
+
+        if max_classes:
+            captions = set(sorted(caption_counts, key=caption_counts.get, reverse=True)[:max_classes])
+        else:
+            captions = set(caption_counts)
+        online = OnlineNaiveBayes.from_document_frequency(analyzer, document_frequency, n_documents, captions,
+                                                           alpha=self.classifier.alpha)
+        for batch in batches():
+            if max_classes:
+                batch = [(labels, caption) for labels, caption in batch if caption in captions]
+            if batch:
+                online.partial_fit([labels for labels, _ in batch], [caption for _, caption in batch])
+            if progress is not None:
+                progress('counts', online.n_documents)
+
+        self.set_online_model(online)
+        return online.n_documents
+
+    def set_online_model(self, online):
+        """
+        Serves a fully trained OnlineNaiveBayes, e.g. one assembled from sharded counts.
+
+        :param online: OnlineNaiveBayes to use for every later read and update.
+        """
+        self.online = online
+        self.index = None
+        self.n_documents = online.n_documents
+        self.revision += 1
         self.trained = True
 
+    @property
+    def classes(self):
+        """Captions the model can produce, in probability column order."""
+        if self.online is not None:
+            return self.online.classes
+        return self.classifier.classes_
+
+    def predict_proba(self, labels_list):
+        """
+        Computes the probability of every caption for each list of labels.
+
+        :param labels_list: List of lists of labels.
+        :return: Array of shape (len(labels_list), len(self.classes)).
+        """
+        if self.online is not None:
+            return self.online.predict_proba(self.online.transform(labels_list))
+        X = self.vectorizer.transform([' '.join(labels) for labels in labels_list])
+        return self.classifier.predict_proba(X)
+
     def generate_improved_caption(self, labels):
         """
         Generates an improved caption using the trained model.
@@ -51,19 +159,131 @@ class CustomCaptionGenerator:
         if not self.trained:
             return self.generate_caption(labels)
         
-        label_string = ' '.join(labels)
-        X = self.vectorizer.transform([label_string])
-        
-        # Get probability distribution over captions
-        probs = self.classifier.predict_proba(X)[0]
-        
-        # Sample a caption based on the probability distribution
-        caption_idx = np.random.choice(len(self.classifier.classes_), p=probs)
-        return self.classifier.classes_[caption_idx]
+        # Get probability distribution over candidate captions
+        captions, probs = self.caption_distribution(labels)
+        return self.sample_caption(captions, probs)
+
+    def caption_distribution(self, labels):
+        """
+        Computes the caption distribution for the labels with the captions spelled out.
+
+        Unlike the indices returned by candidate_proba, the result does not depend on the order
+        of this model's classes, so it can be shared with processes serving another copy.
+
+        :param labels: List of labels describing the image.
+        :return: Tuple of (list of caption strings, probabilities over those captions).
+        """
+        candidates, probs = self.candidate_proba(labels)
+        return self.classes[candidates].tolist(), probs
+
+    @staticmethod
+    def sample_caption(captions, probs):
+        """
+        Samples a caption from a distribution returned by caption_distribution.
+
+        :param captions: Candidate caption strings.
+        :param probs: Probability of each candidate.
+        :return: Caption string.
+        """
+        return captions[np.random.choice(len(captions), p=probs)]
+
+    def generate_improved_captions(self, labels_list, rng=None):
+        """
+        Generates improved captions for many label lists at once.
+
+        The label lists are vectorised into one sparse matrix, scored in one predict_proba
+        call and sampled together by inverting each row's cumulative distribution against
+        one uniform draw per row. Models large enough to use the caption index are scored
+        per list against their retrieved candidates.
+
+        :param labels_list: List of lists of labels.
+        :param rng: Optional np.random.Generator (or seed) used for sampling.
+        :return: List of caption strings, one per label list.
+        """
+        if not self.trained:
+            return [self.generate_caption(labels) for labels in labels_list]
+        if not labels_list:
+            return []
+        rng = np.random.default_rng(rng)
+        classes = self.classes
+
+        if len(classes) >= self.index_min_classes:
+            captions = []
+            for labels, draw in zip(labels_list, rng.random(len(labels_list))):
+                candidates, probs = self.candidate_proba(labels)
+                caption_idx = min(np.searchsorted(np.cumsum(probs), draw * probs.sum(), side='right'),
+                                  len(candidates) - 1)
+                captions.append(classes[candidates[caption_idx]])
+            return captions
+
+        cdf = np.cumsum(self.predict_proba(labels_list), axis=1)
+        draws = rng.random((len(labels_list), 1)) * cdf[:, -1:]
+        caption_idx = np.minimum((cdf <= draws).sum(axis=1), len(classes) - 1)
+        return classes[caption_idx].tolist()
+
+    def top_captions(self, labels, k=5):
+        """
+        Returns the most probable captions for the labels.
+
+        :param labels: List of labels describing the image.
+        :param k: Number of captions to return.
+        :return: List of (caption, probability) tuples, most probable first.
+        """
+        if not self.trained:
+            return []
+        candidates, probs = self.candidate_proba(labels)
+        order = np.argsort(probs)[::-1][:k]
+        classes = self.classes
+        return [(classes[candidates[i]], float(probs[i])) for i in order]
+
+    def candidate_proba(self, labels):
+        """
+        Computes the caption distribution for the labels.
+
+        Small models score every caption. Once the model has index_min_classes captions, only
+        those retrieved from the CaptionIndex are scored and the distribution is renormalised
+        over them, which drops the long tail of captions unrelated to the labels.
+
+        :param labels: List of labels describing the image.
+        :return: Tuple of (caption indices, probabilities over those captions).
+        """
+        if len(self.classes) < self.index_min_classes:
+            return np.arange(len(self.classes)), self.predict_proba([labels])[0]
+
+        if self.online is not None:
+            X = self.online.transform([labels])
+        else:
+            X = self.vectorizer.transform([' '.join(labels)])
+        columns, weights = X.indices, X.data
+        candidates = self.get_index().candidates(columns)
+        if self.online is not None:
+            jll = self.online.joint_log_likelihood_for(columns, weights, candidates)
+        else:
+            feature_log_prob = self.classifier.feature_log_prob_[np.ix_(candidates, columns)]
+            jll = feature_log_prob @ weights + self.classifier.class_log_prior_[candidates]
+        return candidates, np.exp(jll - logsumexp(jll))
+
+    def get_index(self):
+        """
+        Returns the caption retrieval index, building it on first use.
+
+        :return: CaptionIndex kept up to date by update_model.
+        """
+        if self.index is None:
+            if self.online is not None:
+                feature_count, class_count = self.online.feature_count, self.online.class_count
+            else:
+                feature_count, class_count = self.classifier.feature_count_, self.classifier.class_count_
+            self.index = CaptionIndex.build(feature_count, class_count, self.index_postings_per_term)
+        return self.index
 
     def update_model(self, labels, caption):
         """
         Updates the trained model with new data.
+
+        Labels and captions the model has not seen before are added to it. The first update
+        copies the (possibly memory-mapped) arrays into an OnlineNaiveBayes, which serves
+        every later read and update.
         
         :param labels: List of labels describing the image.
         :param caption: The new caption to be added to the model.
@@ -71,9 +291,14 @@ class CustomCaptionGenerator:
         if not self.trained:
             self.train([labels], [caption])
         else:
-            label_string = ' '.join(labels)
-            X = self.vectorizer.transform([label_string])
-            self.classifier.partial_fit(X, [caption], classes=self.classifier.classes_)
+            if self.online is None:
+                self.online = OnlineNaiveBayes.from_estimators(self.vectorizer, self.classifier, self.n_documents)
+            updated = self.online.partial_fit([labels], [caption])
+            self.n_documents = self.online.n_documents
+            self.revision += 1
+            if self.index is not None:
+                for class_index, columns in updated:
+                    self.index.update(class_index, columns, self.online.feature_count, self.online.class_count)
 
     def explicit_train(self, labels_list, captions):
         """
@@ -83,3 +308,114 @@ class CustomCaptionGenerator:
         :param captions: List of captions corresponding to the labels.
         """
         self.train(labels_list, captions)
+
+    def save(self, path):
+        """
+        Saves the trained model to a directory as a JSON manifest plus one .npy file per array.
+
+        :param path: Directory to write the model into; created if missing.
+        """
+        if not self.trained:
+            raise ValueError("Cannot save an untrained caption model")
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        vocabulary = self.vocabulary()
+        manifest = {
+            'templates': self.templates,
+            'vocabulary': sorted(vocabulary, key=vocabulary.get),
+            'classes': self.classes.tolist(),
+            'alpha': self.classifier.alpha,
+            'n_documents': self.n_documents,
+        }
+        arrays = self.model_arrays()
+        for name in MODEL_ARRAYS:
+            np.save(path / f"{name}.npy", np.ascontiguousarray(arrays[name]))
+        with open(path / 'model.json', 'w') as f:
+            json.dump(manifest, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loads a model written by save().
+
+        :param path: Directory the model was saved to.
+        :param mmap: Memory-map the arrays read-only instead of reading them into memory.
+        :return: Trained CustomCaptionGenerator.
+        """
+        path = Path(path)
+        with open(path / 'model.json') as f:
+            manifest = json.load(f)
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode='r' if mmap else None)
+            for name in MODEL_ARRAYS
+        }
+
+        generator = cls()
+        generator.templates = manifest['templates']
+        generator.vectorizer.vocabulary_ = {term: i for i, term in enumerate(manifest['vocabulary'])}
+        generator.vectorizer.idf_ = arrays['idf']
+
+        classifier = generator.classifier
+        classifier.alpha = manifest['alpha']
+        classifier.classes_ = np.array(manifest['classes'])
+        classifier.n_features_in_ = len(manifest['vocabulary'])
+        classifier.feature_count_ = arrays['feature_count']
+        classifier.class_count_ = arrays['class_count']
+        classifier.feature_log_prob_ = arrays['feature_log_prob']
+        classifier.class_log_prior_ = arrays['class_log_prior']
+        generator.n_documents = manifest.get('n_documents', int(classifier.class_count_.sum()))
+        generator.trained = True
+        return generator
+
+    def vocabulary(self):
+        """
+        :return: Mapping of label term to feature column, including terms learned online.
+        """
+        if self.online is not None:
+            return self.online.vocabulary
+        return self.vectorizer.vocabulary_
+
+    def model_arrays(self):
+        """
+        Returns the fitted arrays named in MODEL_ARRAYS, including online updates.
+
+        :return: Dict of array name to numpy array.
+        """
+        if self.online is not None:
+            return {
+                'idf': self.online.idf,
+                'feature_count': self.online.feature_count,
+                'class_count': self.online.class_count,
+                'feature_log_prob': self.online.feature_log_prob(),
+                'class_log_prior': self.online.class_log_prior(),
+            }
+        return {
+            'idf': self.vectorizer.idf_,
+            'feature_count': self.classifier.feature_count_,
+            'class_count': self.classifier.class_count_,
+            'feature_log_prob': self.classifier.feature_log_prob_,
+            'class_log_prior': self.classifier.class_log_prior_,
+        }
+
+
+def count_frequent(counts, item, capacity):
+    """
+    Counts one item with the Misra-Gries summary, which never holds more than ``capacity`` counters.
+
+    Every item occurring in more than 1/(capacity + 1) of the stream keeps a counter; counts
+    are underestimates.
+
+    :param counts: Dict of item to count, updated in place.
+    :param item: Item seen.
+    :param capacity: Most counters kept.
+    """
+    if item in counts:
+        counts[item] += 1
+    elif len(counts) < capacity:
+        counts[item] = 1
+    else:
+        for key in list(counts):
+            counts[key] -= 1
+            if not counts[key]:
+                del counts[key]
@@ -0,0 +1,83 @@
+import numpy as np
+
+# Feature counts copied per block of columns while building, about 32 MB of float64.
+BUILD_BLOCK_VALUES = 1 << 22
+
+
+class CaptionIndex:
+    """
+    Inverted index from label term to the captions that weight it most.
+
+    Each term keeps a posting list of at most ``postings_per_term`` caption (class) indices,
+    chosen by their accumulated TF-IDF count for the term, plus one list of the most frequent
+    captions overall. A query only scores the union of its terms' postings and the popular
+    list, so its cost depends on the number of query terms and the posting size rather than
+    the number of captions, and the index itself is bounded by terms x postings_per_term.
+    """
+
+    def __init__(self, postings_per_term=64):
+        """
+        :param postings_per_term: Maximum number of captions kept per term.
+        """
+        self.postings_per_term = postings_per_term
+        self.postings = {}
+        self.popular = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def build(cls, feature_count, class_count, postings_per_term=64):
+        """
+        Indexes a fitted model.
+
+        :param feature_count: Array of shape (n_classes, n_features) with accumulated term weights.
+        :param class_count: Number of training documents per caption.
+        :param postings_per_term: Maximum number of captions kept per term.
+        :return: CaptionIndex.
+        """
+        index = cls(postings_per_term)
+        n_classes, n_features = feature_count.shape
+        # Columns are copied a block at a time, so building never holds a second full-size matrix.
+        block_size = max(1, BUILD_BLOCK_VALUES // max(n_classes, 1))
+        for block_start in range(0, n_features, block_size):
+            block = np.array(feature_count[:, block_start:block_start + block_size], order='F')
+            for offset in range(block.shape[1]):
+                weights = block[:, offset]
+                classes = np.flatnonzero(weights)
+                if len(classes) > postings_per_term:
+                    classes = classes[np.argpartition(weights[classes], -postings_per_term)[-postings_per_term:]]
+                if len(classes):
+                    index.postings[block_start + offset] = classes.astype(np.int64)
+        index.popular = index._top(np.arange(len(class_count)), np.asarray(class_count))
+        return index
+
+    def _top(self, classes, weights):
+        if len(classes) <= self.postings_per_term:
+            return classes
+        return classes[np.argpartition(weights, -self.postings_per_term)[-self.postings_per_term:]]
+
+    def update(self, class_index, columns, feature_count, class_count):
+        """
+        Records that a caption's weights changed after an online update.
+
+        :param class_index: Caption row that was updated.
+        :param columns: Term columns that were updated.
+        :param feature_count: The model's feature_count array, already updated.
+        :param class_count: The model's class_count array, already updated.
+        """
+        for column in columns:
+            posting = self.postings.get(column)
+            if posting is None:
+                self.postings[column] = np.array([class_index], dtype=np.int64)
+            elif class_index not in posting:
+                self.postings[column] = self._top(np.append(posting, class_index),
+                                                  feature_count[np.append(posting, class_index), column])
+        if class_index not in self.popular:
+            candidates = np.append(self.popular, class_index)
+            self.popular = self._top(candidates, class_count[candidates])
+
+    def candidates(self, columns):
+        """
+        :param columns: Term columns present in a query.
+        :return: Sorted array of caption indices worth scoring for the query.
+        """
+        lists = [self.postings[column] for column in columns if column in self.postings]
+        return np.unique(np.concatenate([self.popular] + lists))
@@ -0,0 +1,31 @@
+import hashlib
+
+DIGEST_SIZE = 32  # bytes; hex digests are 64 characters
+
+
+def content_digest(chunks):
+    """
+    Computes a stable BLAKE2b digest over a sequence of byte chunks.
+
+    Unlike ``hash()``, the result is identical across processes and restarts, so it can be
+    used as a shared cache key and stored in the database.
+
+    :param chunks: Iterable of bytes objects.
+    :return: Hex digest string.
+    """
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def file_digest(uploaded_file):
+    """
+    Computes the content digest of an uploaded file chunk by chunk and rewinds it.
+
+    :param uploaded_file: Django File or UploadedFile.
+    :return: Hex digest string.
+    """
+    digest = content_digest(uploaded_file.chunks())
+    uploaded_file.seek(0)
+    return digest
@@ -0,0 +1,111 @@
+import io
+from PIL import Image as PILImage, ImageOps, UnidentifiedImageError
+
+# Formats vision backends accept as-is; anything else is always re-encoded.
+PASSTHROUGH_FORMATS = ('JPEG', 'PNG')
+# Lowest quality tried when re-encoding to fit a byte budget.
+MIN_JPEG_QUALITY = 45
+
+
+class UnreadableImage(ValueError):
+    """Raised when an upload cannot be decoded as an image."""
+
+
+def load_downscaled(source, max_dimension):
+    """
+    Decodes an opened image once, upright and no larger than max_dimension.
+
+    JPEGs use ``Image.draft`` so the decoder itself downsamples by a power of two, which
+    is much faster than decoding at full size and resizing.
+
+    :param source: PIL image that has been opened but not loaded.
+    :param max_dimension: Longest side allowed, in pixels.
+    :return: RGB PIL image.
+    """
+    if source.format == 'JPEG':
+        source.draft('RGB', (max_dimension, max_dimension))
+    image = ImageOps.exif_transpose(source).convert('RGB')
+    image.thumbnail((max_dimension, max_dimension), PILImage.LANCZOS)
+    return image
+
+
+def prepare_for_analysis(image, max_dimension, quality=90, max_bytes=None):
+    """
+    Produces the bytes sent to the vision backend: EXIF-oriented and no larger than max_dimension.
+
+    Accepts a file so large uploads are decoded straight from their temporary file and
+    only the bounded, downscaled copy is held in memory. Images already within both the
+    dimension and byte bounds are passed through untouched. Uploads Pillow cannot decode are
+    rejected here rather than sent to the backend in full. The caller keeps the original for
+    storage.
+
+    :param image: Image bytes, or a binary file positioned at the start of the image.
+    :param max_dimension: Longest side allowed, in pixels; falsy disables preprocessing.
+    :param quality: JPEG quality used when re-encoding.
+    :param max_bytes: Largest original passed through as-is; larger ones are re-encoded, at lower
+        quality if needed to fit.
+    :return: Image bytes for analysis.
+    :raises UnreadableImage: If the image cannot be decoded.
+    """
+    if isinstance(image, bytes):
+        image_file = io.BytesIO(image)
+    else:
+        image_file = image
+
+    def original_bytes():
+        image_file.seek(0)
+        return image_file.read()
+
+    if not max_dimension:
+        return original_bytes()
+
+    try:
+        with PILImage.open(image_file) as source:
+            orientation = source.getexif().get(0x0112, 1)
+            if (source.format in PASSTHROUGH_FORMATS and orientation == 1
+                    and max(source.size) <= max_dimension
+                    and (not max_bytes or byte_size(image_file) <= max_bytes)):
+                return image if isinstance(image, bytes) else original_bytes()
+            downscaled = load_downscaled(source, max_dimension)
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        raise UnreadableImage(f"Not a readable image: {str(e)}") from e
+
+    encoded = encode_jpeg(downscaled, quality)
+    while max_bytes and len(encoded) > max_bytes and quality > MIN_JPEG_QUALITY:
+        quality = max(quality - 15, MIN_JPEG_QUALITY)
+        encoded = encode_jpeg(downscaled, quality)
+    return encoded
+
+
+def byte_size(image_file):
+    """:return: Size in bytes of a seekable binary file; its position is left unchanged."""
+    size = getattr(image_file, 'size', None)
+    if size is not None:
+        return size
+    position = image_file.tell()
+    size = image_file.seek(0, io.SEEK_END)
+    image_file.seek(position)
+    return size
+
+
+def encode_jpeg(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def render_rendition(image_file, max_dimension, image_format, quality):
+    """
+    Renders a resized copy of a stored image.
+
+    :param image_file: Open binary file with the original image.
+    :param max_dimension: Longest side of the rendition, in pixels.
+    :param image_format: Pillow format name, e.g. 'WEBP'.
+    :param quality: Encoder quality.
+    :return: Tuple of (encoded bytes, width, height).
+    """
+    with PILImage.open(image_file) as source:
+        image = load_downscaled(source, max_dimension)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue(), image.width, image.height
@@ -0,0 +1,76 @@
+import io
+import numpy as np
+from PIL import Image as PILImage
+
+# Hue bins on PIL's 0-255 hue scale and the colour label each one maps to.
+HUE_LABELS = (
+    (0, 11, 'Red'),
+    (11, 28, 'Orange'),
+    (28, 46, 'Yellow'),
+    (46, 120, 'Green'),
+    (120, 135, 'Cyan'),
+    (135, 185, 'Blue'),
+    (185, 220, 'Purple'),
+    (220, 245, 'Pink'),
+    (245, 256, 'Red'),
+)
+
+
+def analyze_locally(image_bytes, max_dimension, nsfw_threshold):
+    """
+    Labels and moderates image bytes with colour, histogram and EXIF heuristics.
+
+    Runs in LocalBackend's process pool, which imports this module without setting up Django,
+    so it must only depend on its arguments.
+
+    :param image_bytes: Encoded image.
+    :param max_dimension: Longest side the image is reduced to before analysis.
+    :param nsfw_threshold: Skin-tone pixel percentage at or above which the image is rejected.
+    :return: Tuple of (labels, is_nsfw, nsfw_score).
+    """
+    with PILImage.open(io.BytesIO(image_bytes)) as source:
+        exif = source.getexif()
+        width, height = source.size
+        source.draft('RGB', (max_dimension, max_dimension))
+        rgb = source.convert('RGB')
+    rgb.thumbnail((max_dimension, max_dimension))
+
+    labels = []
+    if width > height * 1.2:
+        labels.append('Landscape')
+    elif height > width * 1.2:
+        labels.append('Portrait')
+    else:
+        labels.append('Square')
+    if exif.get(271) or exif.get(272):  # Camera make / model
+        labels.append('Photo')
+
+    hsv = np.asarray(rgb.convert('HSV'), dtype=np.int32).reshape(-1, 3)
+    hue, saturation, value = hsv[:, 0], hsv[:, 1] / 255.0, hsv[:, 2] / 255.0
+    brightness = value.mean()
+    if brightness > 0.7:
+        labels.append('Bright')
+    elif brightness < 0.3:
+        labels.append('Dark')
+
+    if saturation.mean() < 0.1:
+        labels.append('Monochrome')
+    else:
+        chromatic = hue[(saturation > 0.2) & (value > 0.2)]
+        if chromatic.size:
+            counts = {}
+            for low, high, name in HUE_LABELS:
+                counts[name] = counts.get(name, 0) + np.count_nonzero((chromatic >= low) & (chromatic < high))
+            dominant = max(counts, key=counts.get)
+            if counts[dominant] / hue.size > 0.25:
+                labels.append(dominant)
+        if saturation.mean() > 0.45:
+            labels.append('Colorful')
+
+    # Classic RGB skin-tone rule; crude, but enough to flag obviously skin-dominated frames.
+    pixels = np.asarray(rgb, dtype=np.int32).reshape(-1, 3)
+    r, g, b = pixels[:, 0], pixels[:, 1], pixels[:, 2]
+    skin = ((r > 95) & (g > 40) & (b > 20) & (pixels.max(axis=1) - pixels.min(axis=1) > 15)
+            & (np.abs(r - g) > 15) & (r > g) & (r > b))
+    nsfw_score = round(float(skin.mean()) * 100, 2)
+    return labels, nsfw_score >= nsfw_threshold, nsfw_score
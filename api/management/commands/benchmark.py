@@ -0,0 +1,48 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from api.benchmarks import benchmark_caption_model, benchmark_uploads, environment
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the caption model and upload pipeline offline and writes the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000,1000000',
+                            help="Comma-separated training corpus sizes.")
+        parser.add_argument('--captions-per-size', type=float, default=0.01,
+                            help="Distinct captions as a fraction of the corpus size.")
+        parser.add_argument('--max-captions', type=int, default=5000,
+                            help="Upper bound on distinct captions per corpus.")
+        parser.add_argument('--calls', type=int, default=200,
+                            help="Timed calls per per-call benchmark.")
+        parser.add_argument('--uploads', type=int, default=50,
+                            help="Uploads to time end to end (0 skips the upload benchmark).")
+        parser.add_argument('--output', default=None,
+                            help="File to write the JSON report to (defaults to stdout).")
+
+    def handle(self, *args, **options):
+        results = []
+        for size in [int(size) for size in options['sizes'].split(',') if size]:
+            n_captions = max(2, min(int(size * options['captions_per_size']), options['max_captions']))
+            self.stderr.write(f"Benchmarking caption model with {size} examples and {n_captions} captions")
+            results += benchmark_caption_model(size, n_captions, calls=options['calls'])
+
+        if options['uploads'] > 0:
+            self.stderr.write(f"Benchmarking {options['uploads']} uploads")
+            # Uploads write rows, so they run against a throwaway test database.
+            setup_test_environment()
+            databases = setup_databases(verbosity=0, interactive=False)
+            try:
+                results += benchmark_uploads(options['uploads'])
+            finally:
+                teardown_databases(databases, verbosity=0)
+                teardown_test_environment()
+
+        report = json.dumps({'timestamp': time.time(), 'environment': environment(), 'results': results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,41 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.models import Image
+from api.pipeline import process_pending_images, requeue_stale_images
+
+
+class Command(BaseCommand):
+    help = ("Processes queued (PENDING) image uploads in the background, re-queueing PROCESSING "
+            "images whose worker appears to have died.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit.")
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help="Seconds to wait between polls when the queue is empty.")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Maximum number of images claimed per poll.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Worker threads (defaults to UPLOAD_WORKERS).")
+        parser.add_argument('--processing-timeout', type=int, default=None,
+                            help="Seconds after which a PROCESSING image is re-queued "
+                                 "(defaults to UPLOAD_PROCESSING_TIMEOUT).")
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or settings.UPLOAD_WORKERS
+        while True:
+            requeued = requeue_stale_images(options['processing_timeout'])
+            if requeued:
+                self.stdout.write(f"Re-queued {requeued} images abandoned mid-processing")
+            image_ids = list(
+                Image.objects.filter(status='PENDING')
+                .order_by('id')
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if image_ids:
+                processed = process_pending_images(image_ids, workers)
+                self.stdout.write(f"Processed {processed}/{len(image_ids)} queued images")
+            if options['once'] and len(image_ids) < options['batch_size']:
+                break
+            if not image_ids:
+                time.sleep(options['interval'])
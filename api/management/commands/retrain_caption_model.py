@@ -0,0 +1,60 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.model_store import ModelStore
+from api.training import retrain_from_database, retrain_parallel_from_database, training_data_signature
+
+
+class Command(BaseCommand):
+    help = "Retrains the caption model from stored images and captions and publishes it to the workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Keep running, retraining every INTERVAL seconds when the data has changed.")
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Rows fetched per query (defaults to CAPTION_RETRAIN_CHUNK_SIZE).")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Train sharded across this many processes (defaults to CAPTION_TRAINING_WORKERS; "
+                                 "0 streams in one process).")
+        parser.add_argument('--holdout', type=float, default=0.0,
+                            help="Fraction of examples held out and evaluated in parallel (sharded training only).")
+        parser.add_argument('--max-classes', type=int, default=None,
+                            help="Keep only this many of the most frequent captions, bounding model memory "
+                                 "(defaults to CAPTION_RETRAIN_MAX_CLASSES; streaming training only).")
+        parser.add_argument('--progress', action='store_true',
+                            help="Report the number of examples processed after each chunk.")
+
+    def handle(self, *args, **options):
+        store = ModelStore()
+        last_signature = None
+        while True:
+            signature = training_data_signature()
+            if signature != last_signature:
+                version = self.retrain(store, options)
+                if version is None:
+                    self.stdout.write("No captioned images to train on")
+                else:
+                    self.stdout.write(f"Published caption model version {version}")
+                last_signature = signature
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
+
+    def retrain(self, store, options):
+        workers = settings.CAPTION_TRAINING_WORKERS if options['workers'] is None else options['workers']
+        if workers <= 0 and not options['holdout']:
+            progress = self.report_progress if options['progress'] else None
+            return retrain_from_database(store, chunk_size=options['chunk_size'], progress=progress,
+                                         max_classes=options['max_classes'])
+
+        version, report = retrain_parallel_from_database(store, workers=workers, holdout=options['holdout'],
+                                                         chunk_size=options['chunk_size'])
+        if report is not None:
+            self.stdout.write(
+                f"Held-out accuracy {report['accuracy']:.3f} on {report['examples']} examples "
+                f"({report['examples_per_second']:.0f} examples/s)"
+            )
+        return version
+
+    def report_progress(self, phase, examples_seen):
+        self.stdout.write(f"{phase}: {examples_seen} examples")
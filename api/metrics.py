@@ -0,0 +1,70 @@
+import os
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+# Set PROMETHEUS_MULTIPROC_DIR (to an empty directory, before the workers start) to aggregate
+# metrics across worker processes; each process then writes its samples to memory-mapped
+# files in that directory and /metrics merges them. Servers that recycle workers should call
+# prometheus_client.multiprocess.mark_process_dead(pid) when one exits.
+
+UPLOAD_STAGE_SECONDS = Histogram(
+    'caption_upload_stage_seconds',
+    "Time spent in each stage of handling an image upload.",
+    ['stage'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+UPLOADS_TOTAL = Counter(
+    'caption_uploads_total',
+    "Image uploads by outcome.",
+    ['outcome'],
+)
+VISION_RESULTS_TOTAL = Counter(
+    'caption_vision_results_total',
+    "Vision analyses by where the result came from: cache, stored (an earlier upload's row) or backend.",
+    ['source'],
+)
+CAPTION_CACHE_TOTAL = Counter(
+    'caption_distribution_cache_total',
+    "Caption distribution cache lookups by result.",
+    ['result'],
+)
+CAPTION_MODEL_CAPTIONS = Gauge(
+    'caption_model_captions',
+    "Captions known to the served caption model.",
+    multiprocess_mode='livemax',
+)
+CAPTION_MODEL_FEATURES = Gauge(
+    'caption_model_features',
+    "Label terms in the served caption model's vocabulary.",
+    multiprocess_mode='livemax',
+)
+
+
+def time_stage(stage):
+    """
+    Times a block of upload work.
+
+    :param stage: Stage name, e.g. 'vision' or 'db_write'.
+    :return: Context manager observing the elapsed time in UPLOAD_STAGE_SECONDS.
+    """
+    return UPLOAD_STAGE_SECONDS.labels(stage=stage).time()
+
+
+def record_model_size(generator):
+    """Publishes the size of a CustomCaptionGenerator on the model gauges."""
+    if not generator.trained:
+        return
+    CAPTION_MODEL_CAPTIONS.set(len(generator.classes))
+    CAPTION_MODEL_FEATURES.set(len(generator.vocabulary()))
+
+
+def metrics_view(request):
+    """Serves every metric in the Prometheus text format, merged across processes when configured."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,151 @@
+import cProfile
+import logging
+import random
+import re
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from .models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+# cProfile hooks the interpreter (through sys.monitoring from Python 3.12, where a second
+# enable() raises), so only one request is profiled at a time per process.
+_profiler_lock = threading.Lock()
+
+
+class ProfilingMiddleware:
+    """
+    Captures a cProfile of selected requests and records it as a RequestProfile.
+
+    A request is profiled when PROFILING_ENABLED is set, when it falls within
+    PROFILING_SAMPLE_RATE, or when a staff user sends the PROFILING_HEADER. API clients
+    authenticate inside the DRF view, so for header requests without a session user the token
+    is checked here, before the profiler starts. Profiles are written to PROFILING_DIR as
+    .pstats files, readable with ``python -m pstats`` or snakeviz.
+
+    Requests arriving while another request is being profiled are served unprofiled.
+
+    The middleware is async-capable so async views stay on the event loop under ASGI. A
+    profile taken there also covers whatever else the loop ran while the request awaited.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        trigger = self.trigger_for(request)
+        profiler = self.start_profiler() if trigger is not None else None
+        if profiler is None:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop_profiler(profiler)
+        self.finish_profile(profiler, request, response, (time.perf_counter() - start) * 1000, trigger)
+        return response
+
+    async def __acall__(self, request):
+        if request.META.get(settings.PROFILING_HEADER):
+            # Checking the user may query the database.
+            trigger = await sync_to_async(self.trigger_for)(request)
+        else:
+            trigger = self.trigger_for(request)
+        profiler = self.start_profiler() if trigger is not None else None
+        if profiler is None:
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop_profiler(profiler)
+        await sync_to_async(self.finish_profile)(profiler, request, response,
+                                                 (time.perf_counter() - start) * 1000, trigger)
+        return response
+
+    def start_profiler(self):
+        """
+        :return: An enabled cProfile.Profile, or None if another request is being profiled.
+        """
+        if not _profiler_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler or debugger owns the hook.
+            _profiler_lock.release()
+            logger.warning(f"Request not profiled: {str(e)}")
+            return None
+        return profiler
+
+    def stop_profiler(self, profiler):
+        profiler.disable()
+        _profiler_lock.release()
+
+    def finish_profile(self, profiler, request, response, duration_ms, trigger):
+        user = getattr(request, 'user', None)
+        if user is not None and not user.is_authenticated:
+            user = None
+        try:
+            self.save_profile(profiler, request, response, duration_ms, trigger, user)
+        except Exception as e:
+            logger.error(f"Error saving request profile: {str(e)}")
+
+    def trigger_for(self, request):
+        """
+        :return: Why the request should be profiled ('setting', 'header' or 'sample'), or None.
+        """
+        if settings.PROFILING_ENABLED:
+            return 'setting'
+        if request.META.get(settings.PROFILING_HEADER) and self.is_staff_request(request):
+            return 'header'
+        if settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return 'sample'
+        return None
+
+    def is_staff_request(self, request):
+        """
+        Checks the session user set by AuthenticationMiddleware, falling back to the API token.
+
+        :return: True if the request comes from a staff user.
+        """
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            try:
+                # Only reads the Authorization header, so the plain Django request will do.
+                authenticated = TokenAuthentication().authenticate(request)
+            except exceptions.AuthenticationFailed:
+                return False
+            user = authenticated[0] if authenticated is not None else None
+        return user is not None and user.is_staff
+
+    def save_profile(self, profiler, request, response, duration_ms, trigger, user):
+        directory = settings.PROFILING_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r'[^\w-]+', '_', request.path).strip('_')[:80] or 'root'
+        path = directory / f"{time.strftime('%Y%m%d-%H%M%S')}_{time.perf_counter_ns()}_{request.method}_{slug}.pstats"
+        profiler.dump_stats(path)
+        RequestProfile.objects.create(
+            path=request.path[:2048],
+            method=request.method,
+            status_code=response.status_code,
+            duration_ms=duration_ms,
+            trigger=trigger,
+            profile_file=str(path),
+            user=user,
+        )
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-18 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0004_caption_generated_at_image_uploaded_at_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="image",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=64
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 02:00
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0005_image_content_hash"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="image",
+            name="image",
+            field=models.ImageField(upload_to=api.models.image_upload_to),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.7 on 2026-10-18 02:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_image_labels(apps, schema_editor):
+    Image = apps.get_model("api", "Image")
+    ImageLabel = apps.get_model("api", "ImageLabel")
+    rows = []
+    for image_id, labels in Image.objects.values_list("id", "labels").iterator(chunk_size=2000):
+        names = {str(label).strip().lower()[:255] for label in labels or []}
+        rows.extend(ImageLabel(image_id=image_id, name=name) for name in sorted(names) if name)
+        if len(rows) >= 2000:
+            ImageLabel.objects.bulk_create(rows)
+            rows = []
+    ImageLabel.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0007_rendition"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageLabel",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                (
+                    "image",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="label_entries",
+                        to="api.image",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["name", "image"], name="api_imagelabel_name_image"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("image", "name"), name="unique_image_label"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_image_labels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.7 on 2026-10-18 02:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0008_imagelabel"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="image",
+            index=models.Index(
+                fields=["user", "-uploaded_at", "-id"], name="api_image_user_feed"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0010_requestprofile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="image",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
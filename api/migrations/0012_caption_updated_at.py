@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 02:58
+
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    Caption = apps.get_model("api", "Caption")
+    Caption.objects.update(updated_at=models.F("generated_at"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0011_image_claimed_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="caption",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-18 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0012_caption_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="caption",
+            name="generated_text",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from .caption_cache import CaptionCache, canonical_labels
+from .caption_generator import CustomCaptionGenerator
+from .metrics import CAPTION_CACHE_TOTAL, record_model_size
+from .model_store import ModelStore
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCaptionGenerator:
+    """
+    Thread-safe facade around the CustomCaptionGenerator shared by every request in a worker.
+
+    Online updates (``update_model``) mutate the classifier in place, so they and the reads
+    that depend on the same arrays are serialised through a lock. Full retrains are done
+    copy-on-write: a fresh generator is trained outside the lock and swapped in atomically.
+
+    When backed by a ModelStore, retrains are published as new versions and ``refresh``
+    hot-swaps to whatever version another worker has published since.
+
+    Online updates are never published: they live only in this process's memory and are
+    discarded when it swaps to another version. Uploads and caption corrections persist their
+    Image/Caption rows, so they reach every worker through the next full retrain
+    (``manage.py retrain_caption_model``).
+
+    Caption distributions are cached per label set in a CaptionCache, so repeated label sets
+    skip vectorisation and scoring and only pay for sampling.
+    """
+
+    def __init__(self, generator=None, store=None, version=None):
+        self._generator = generator if generator is not None else CustomCaptionGenerator()
+        self._lock = threading.RLock()
+        self.store = store
+        self.version = version
+        self.cache = CaptionCache()
+        self._last_refresh = time.monotonic()
+
+    @property
+    def generator(self):
+        """The generator currently being served."""
+        return self._generator
+
+    @property
+    def trained(self):
+        return self._generator.trained
+
+    def generate_caption(self, labels):
+        return self._generator.generate_caption(labels)
+
+    def generate_improved_caption(self, labels):
+        with self._lock:
+            generator = self._generator
+            if not generator.trained:
+                return generator.generate_caption(labels)
+            key = canonical_labels(labels)
+            distribution = self.cache.get(key, generator.revision, self.version)
+            CAPTION_CACHE_TOTAL.labels(result='miss' if distribution is None else 'hit').inc()
+            if distribution is None:
+                distribution = generator.caption_distribution(labels)
+                self.cache.set(key, generator.revision, distribution, self.version)
+            return generator.sample_caption(*distribution)
+
+    def generate_improved_captions(self, labels_list, rng=None):
+        with self._lock:
+            return self._generator.generate_improved_captions(labels_list, rng=rng)
+
+    def update_model(self, labels, caption):
+        with self._lock:
+            self._generator.update_model(labels, caption)
+            record_model_size(self._generator)
+
+    def explicit_train(self, labels_list, captions):
+        generator = CustomCaptionGenerator()
+        generator.explicit_train(labels_list, captions)
+        version = self.store.save(generator) if self.store is not None else None
+        self.swap(generator, version)
+
+    def swap(self, generator, version=None):
+        """
+        Replaces the served generator.
+
+        :param generator: A fully trained CustomCaptionGenerator.
+        :param version: Store version the generator was loaded from, if any.
+        """
+        with self._lock:
+            self._generator = generator
+            self.version = version
+            self.cache.clear()
+            record_model_size(generator)
+
+    def refresh(self, force=False):
+        """
+        Hot-swaps to the published store version if it differs from the one being served.
+
+        Checks are rate-limited by CAPTION_MODEL_REFRESH_INTERVAL unless ``force`` is set.
+        Online updates made since the served version was loaded are discarded by a swap.
+        """
+        if self.store is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_refresh < settings.CAPTION_MODEL_REFRESH_INTERVAL:
+            return
+        self._last_refresh = now
+
+        published = self.store.current_version()
+        if published is None or published == self.version:
+            return
+        try:
+            version, generator = self.store.load(published)
+        except Exception as e:
+            logger.error(f"Error loading caption model version {published}: {str(e)}")
+            return
+        self.swap(generator, version)
+        logger.info(f"Switched to caption model version {version}")
+
+
+_shared_generator = None
+_shared_generator_lock = threading.Lock()
+
+
+def get_caption_generator():
+    """
+    Returns the process-wide shared caption generator, creating it on first use.
+
+    :return: SharedCaptionGenerator instance.
+    """
+    global _shared_generator
+    shared = _shared_generator
+    if shared is None:
+        with _shared_generator_lock:
+            if _shared_generator is None:
+                _shared_generator = SharedCaptionGenerator(store=ModelStore())
+                _shared_generator.refresh(force=True)
+            shared = _shared_generator
+    shared.refresh()
+    return shared
+
+
+def reset_caption_generator():
+    """Drops the shared caption generator so the next request starts from a fresh model."""
+    global _shared_generator
+    with _shared_generator_lock:
+        _shared_generator = None
@@ -0,0 +1,113 @@
+import logging
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from django.conf import settings
+from .caption_generator import CustomCaptionGenerator
+
+logger = logging.getLogger(__name__)
+
+VERSION_DIR_PATTERN = re.compile(r'^v(\d+)$')
+CURRENT_POINTER = 'CURRENT'
+
+
+class ModelStore:
+    """
+    Versioned on-disk store for caption models.
+
+    Each version lives in its own immutable ``v<NNNNNN>`` directory written by
+    ``CustomCaptionGenerator.save``. A ``CURRENT`` file names the published version and is
+    replaced atomically, so workers can poll it and hot-swap without ever observing a
+    partially written model.
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root if root is not None else settings.CAPTION_MODEL_DIR)
+
+    def versions(self):
+        """
+        Lists the versions present in the store.
+
+        :return: Sorted list of version numbers.
+        """
+        if not self.root.is_dir():
+            return []
+        versions = []
+        for entry in self.root.iterdir():
+            match = VERSION_DIR_PATTERN.match(entry.name)
+            if match and entry.is_dir():
+                versions.append(int(match.group(1)))
+        return sorted(versions)
+
+    def current_version(self):
+        """
+        Reads the published version.
+
+        :return: Version number, or None if nothing has been published.
+        """
+        try:
+            return int((self.root / CURRENT_POINTER).read_text().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def path_for(self, version):
+        return self.root / f"v{version:06d}"
+
+    def save(self, generator, publish=True):
+        """
+        Writes a generator as a new version.
+
+        :param generator: Trained CustomCaptionGenerator.
+        :param publish: Point CURRENT at the new version once it is fully written.
+        :return: The new version number.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix='.staging-', dir=self.root))
+        try:
+            generator.save(staging)
+            while True:
+                version = (self.versions() or [0])[-1] + 1
+                try:
+                    os.rename(staging, self.path_for(version))
+                    break
+                except OSError:
+                    # Another writer claimed this version number first; try the next one.
+                    if not self.path_for(version).exists():
+                        raise
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if publish:
+            self.publish(version)
+        logger.info(f"Saved caption model version {version}")
+        return version
+
+    def publish(self, version):
+        """
+        Atomically marks a version as the one workers should serve.
+
+        :param version: Version number to publish.
+        """
+        if not self.path_for(version).is_dir():
+            raise ValueError(f"Caption model version {version} does not exist")
+        fd, tmp_path = tempfile.mkstemp(prefix='.current-', dir=self.root)
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(version))
+        os.replace(tmp_path, self.root / CURRENT_POINTER)
+
+    def load(self, version=None, mmap=True):
+        """
+        Loads a stored version.
+
+        :param version: Version number to load; defaults to the published version.
+        :param mmap: Memory-map the model arrays read-only.
+        :return: Tuple of (version, CustomCaptionGenerator), or (None, None) if the store is empty.
+        """
+        if version is None:
+            version = self.current_version()
+        if version is None:
+            return None, None
+        return version, CustomCaptionGenerator.load(self.path_for(version), mmap=mmap)
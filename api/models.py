@@ -1,23 +1,151 @@
+import os
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+def image_upload_to(instance, filename):
+    """Stores images under their content digest so identical uploads share a single blob."""
+    if not instance.content_hash:
+        return f"images/{filename}"
+    extension = os.path.splitext(filename)[1].lower()
+    return f"images/{instance.content_hash[:2]}/{instance.content_hash}{extension}"
+
+def normalize_label(label):
+    """Canonical form used to index and search labels."""
+    return str(label).strip().lower()
+
 class Image(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='images/')
+    image = models.ImageField(upload_to=image_upload_to)
     is_nsfw = models.BooleanField(default=False)
     nsfw_score = models.FloatField(default=0)
     status = models.CharField(max_length=10, default='PENDING')
     labels = models.JSONField(default=list)
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)  # BLAKE2b of the uploaded bytes
     uploaded_at = models.DateTimeField(auto_now_add=True)  # Use auto_now_add
+    claimed_at = models.DateTimeField(null=True, blank=True)  # When an upload worker moved it to PROCESSING
+
+    class Meta:
+        indexes = [
+            # Serves the per-user feed's keyset pagination on (uploaded_at, id) without a sort.
+            models.Index(fields=['user', '-uploaded_at', '-id'], name='api_image_user_feed'),
+        ]
 
     def __str__(self):
         return f"Image {self.id} by {self.user.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'labels' in field_names:
+            # A copy, so in-place edits such as labels.append() are still seen as changes.
+            instance._indexed_labels = list(instance.labels)
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        # A new row has no ImageLabel rows yet, which matches an empty label list.
+        if self.labels != getattr(self, '_indexed_labels', [] if adding else None):
+            self.index_labels(replace=not adding)
+
+    def index_labels(self, replace=True):
+        """
+        Rewrites this image's ImageLabel rows to match ``labels``.
+
+        :param replace: Delete existing rows first; not needed for a row that was just inserted.
+        """
+        if replace:
+            self.label_entries.all().delete()
+        ImageLabel.objects.bulk_create(ImageLabel.rows_for(self))
+        self._indexed_labels = list(self.labels)
+
+    def store_file(self, filename, content):
+        """
+        Attaches the uploaded file, reusing the stored blob if the same content is already on disk.
+
+        :param filename: Original upload name, used for the extension.
+        :param content: Django File with the image data.
+        """
+        name = image_upload_to(self, filename)
+        if self.content_hash and self.image.storage.exists(name):
+            self.image.name = name
+        else:
+            self.image.save(filename, content, save=False)
+
+    def release_file(self):
+        """Detaches the file, deleting the blob only if no other image still references it."""
+        if not self.image:
+            return
+        if Image.objects.filter(image=self.image.name).exclude(pk=self.pk).exists():
+            self.image.name = ''
+        else:
+            self.image.delete(save=False)
+
+class ImageLabel(models.Model):
+    """One row per distinct (normalised) label of an image, so label searches use an index instead of scanning JSON."""
+    image = models.ForeignKey(Image, on_delete=models.CASCADE, related_name='label_entries')
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['image', 'name'], name='unique_image_label'),
+        ]
+        indexes = [
+            models.Index(fields=['name', 'image'], name='api_imagelabel_name_image'),
+        ]
+
+    def __str__(self):
+        return f"Label {self.name} of Image {self.image_id}"
+
+    @classmethod
+    def rows_for(cls, image):
+        """
+        Builds unsaved rows for an image's labels, for bulk_create.
+
+        :param image: Saved Image.
+        :return: List of ImageLabel instances.
+        """
+        names = {normalize_label(label)[:255] for label in image.labels or []}
+        return [cls(image=image, name=name) for name in sorted(names) if name]
+
 class Caption(models.Model):
     image = models.OneToOneField(Image, on_delete=models.CASCADE)
     text = models.TextField()
+    # Caption as generated, before any update_caption edit; blank on captions stored before it was kept
+    generated_text = models.TextField(blank=True, default='')
     generated_at = models.DateTimeField(auto_now_add=True)  # Use auto_now_add
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Bumped by edits, e.g. update_caption
 
     def __str__(self):
         return f"Caption for Image {self.image.id}"
+
+class Rendition(models.Model):
+    image = models.ForeignKey(Image, on_delete=models.CASCADE, related_name='renditions')
+    name = models.CharField(max_length=32)  # Key into settings.IMAGE_RENDITIONS
+    file = models.FileField(upload_to='renditions/')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['image', 'name'], name='unique_image_rendition'),
+        ]
+
+    def __str__(self):
+        return f"Rendition {self.name} of Image {self.image_id}"
+
+class RequestProfile(models.Model):
+    """A cProfile capture of one API request, written by ProfilingMiddleware."""
+    path = models.CharField(max_length=2048)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField(db_index=True)
+    trigger = models.CharField(max_length=10)  # 'setting', 'sample' or 'header'
+    profile_file = models.CharField(max_length=1024)  # .pstats file under PROFILING_DIR
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,282 @@
+import numpy as np
+from scipy import sparse
+from scipy.special import logsumexp
+from sklearn.preprocessing import normalize
+
+INITIAL_CAPACITY = 16
+
+
+def grown_capacity(capacity, needed):
+    """Doubles a capacity until it fits ``needed``, so repeated growth is amortised O(1)."""
+    capacity = max(capacity, INITIAL_CAPACITY)
+    while capacity < needed:
+        capacity *= 2
+    return capacity
+
+
+def vocabulary_from_document_frequency(document_frequency, n_documents):
+    """
+    Orders terms and smooths IDF as TfidfVectorizer does.
+
+    :param document_frequency: Mapping of term to the number of documents containing it.
+    :param n_documents: Number of documents the frequencies were counted over.
+    :return: Tuple of (mapping of term to column index, IDF weight per column).
+    """
+    terms = sorted(document_frequency)
+    df = np.array([document_frequency[term] for term in terms], dtype=np.float64)
+    idf = np.log((1 + n_documents) / (1 + df)) + 1
+    return {term: i for i, term in enumerate(terms)}, idf
+
+
+def tfidf_transform(analyzer, vocabulary, idf, label_lists):
+    """
+    Vectorises label lists with a fixed vocabulary, ignoring unknown terms.
+
+    :param analyzer: Callable turning a label string into tokens.
+    :param vocabulary: Mapping of term to column index.
+    :param idf: IDF weight per column.
+    :param label_lists: List of lists of labels.
+    :return: L2-normalised TF-IDF CSR matrix of shape (len(label_lists), len(idf)).
+    """
+    indptr, indices, data = [0], [], []
+    for labels in label_lists:
+        counts = {}
+        for token in analyzer(' '.join(labels)):
+            index = vocabulary.get(token)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        indices.extend(counts)
+        data.extend(counts.values())
+        indptr.append(len(indices))
+    X = sparse.csr_matrix((np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), indptr),
+                          shape=(len(label_lists), len(idf)))
+    X.data *= idf[X.indices]
+    return normalize(X, copy=False)
+
+
+class OnlineNaiveBayes:
+    """
+    Multinomial Naive Bayes over TF-IDF label features whose vocabulary and caption set grow online.
+
+    Counts live in over-allocated buffers that double when full, so adding a new label
+    term or caption class is amortised O(1) instead of reallocating every matrix. The
+    log-probability matrix is kept unnormalised (``log(count + alpha)``) alongside per-class
+    totals; prediction subtracts the totals, which lets a new term or an update touch only
+    the affected entries instead of renormalising every row.
+
+    Terms first seen online get the smoothed IDF they would have had if they occurred in
+    exactly one of the documents seen so far; existing IDF weights stay as trained.
+    """
+
+    def __init__(self, analyzer, vocabulary, idf, classes, feature_count, class_count, n_documents, alpha=1.0):
+        """
+        :param analyzer: Callable turning a label string into tokens.
+        :param vocabulary: Mapping of term to column index.
+        :param idf: IDF weight per column.
+        :param classes: Caption per row.
+        :param feature_count: Array of shape (n_classes, n_features) with summed TF-IDF weights.
+        :param class_count: Number of training documents per caption.
+        :param n_documents: Number of documents seen, used for IDF of new terms.
+        :param alpha: Additive smoothing parameter.
+        """
+        self.analyzer = analyzer
+        self.alpha = alpha
+        self.n_documents = n_documents
+        self.vocabulary = dict(vocabulary)
+        self.class_index = {caption: i for i, caption in enumerate(classes)}
+        self.n_features = 0
+        self.n_classes = 0
+
+        self._idf = np.empty(0)
+        self._classes = np.empty(0, dtype=object)
+        self._feature_count = np.zeros((0, 0))
+        self._log_smoothed = np.zeros((0, 0))
+        self._totals = np.zeros(0)
+        self._class_count = np.zeros(0)
+        self._reserve(len(self.class_index), len(self.vocabulary))
+        self.n_features = len(self.vocabulary)
+        self.n_classes = len(self.class_index)
+        self._class_total = float(np.sum(class_count))
+
+        feature_count = np.asarray(feature_count, dtype=np.float64)
+        self._idf[:self.n_features] = idf
+        self._classes[:self.n_classes] = list(classes)
+        self._feature_count[:self.n_classes, :self.n_features] = feature_count
+        self._log_smoothed[:self.n_classes, :self.n_features] = np.log(feature_count + alpha)
+        self._totals[:self.n_classes] = feature_count.sum(axis=1) + alpha * self.n_features
+        self._class_count[:self.n_classes] = class_count
+
+    @classmethod
+    def from_estimators(cls, vectorizer, classifier, n_documents):
+        """
+        Builds the online model from a fitted TfidfVectorizer and MultinomialNB.
+
+        :return: OnlineNaiveBayes holding copies of the estimators' arrays.
+        """
+        return cls(
+            vectorizer.build_analyzer(),
+            vectorizer.vocabulary_,
+            vectorizer.idf_,
+            classifier.classes_.tolist(),
+            classifier.feature_count_,
+            classifier.class_count_,
+            n_documents,
+            alpha=classifier.alpha,
+        )
+
+    @classmethod
+    def from_document_frequency(cls, analyzer, document_frequency, n_documents, captions, alpha=1.0):
+        """
+        Builds an empty model over a known vocabulary and caption set, ready for partial_fit.
+
+        Terms and captions are sorted and IDF is smoothed as TfidfVectorizer does, so counts
+        accumulated over the same documents reproduce the fitted sklearn estimators.
+
+        :param analyzer: Callable turning a label string into tokens.
+        :param document_frequency: Mapping of term to the number of documents containing it.
+        :param n_documents: Number of documents the frequencies were counted over.
+        :param captions: Iterable of every caption that will be trained on.
+        :param alpha: Additive smoothing parameter.
+        :return: OnlineNaiveBayes with zero counts.
+        """
+        vocabulary, idf = vocabulary_from_document_frequency(document_frequency, n_documents)
+        classes = sorted(set(captions))
+        return cls(analyzer, vocabulary, idf, classes,
+                   np.zeros((len(classes), len(vocabulary))), np.zeros(len(classes)), 0, alpha=alpha)
+
+    @property
+    def idf(self):
+        return self._idf[:self.n_features]
+
+    @property
+    def classes(self):
+        return self._classes[:self.n_classes]
+
+    @property
+    def feature_count(self):
+        return self._feature_count[:self.n_classes, :self.n_features]
+
+    @property
+    def class_count(self):
+        return self._class_count[:self.n_classes]
+
+    def feature_log_prob(self):
+        """Normalised log P(term | caption), as MultinomialNB.feature_log_prob_ would hold."""
+        return self._log_smoothed[:self.n_classes, :self.n_features] - np.log(self._totals[:self.n_classes])[:, None]
+
+    def class_log_prior(self):
+        """Log P(caption), as MultinomialNB.class_log_prior_ would hold."""
+        return np.log(self.class_count) - np.log(self._class_total)
+
+    def _reserve(self, n_classes, n_features):
+        """Ensures the buffers can hold n_classes x n_features, doubling capacity when they cannot."""
+        class_capacity, feature_capacity = self._feature_count.shape
+        if n_classes <= class_capacity and n_features <= feature_capacity:
+            return
+        class_capacity = grown_capacity(class_capacity, n_classes)
+        feature_capacity = grown_capacity(feature_capacity, n_features)
+        C, F = self.n_classes, self.n_features
+
+        idf = np.zeros(feature_capacity)
+        idf[:F] = self._idf[:F]
+        classes = np.empty(class_capacity, dtype=object)
+        classes[:C] = self._classes[:C]
+        feature_count = np.zeros((class_capacity, feature_capacity))
+        feature_count[:C, :F] = self._feature_count[:C, :F]
+        log_smoothed = np.full((class_capacity, feature_capacity), np.log(self.alpha))
+        log_smoothed[:C, :F] = self._log_smoothed[:C, :F]
+        totals = np.zeros(class_capacity)
+        totals[:C] = self._totals[:C]
+        class_count = np.zeros(class_capacity)
+        class_count[:C] = self._class_count[:C]
+
+        self._idf, self._classes, self._feature_count = idf, classes, feature_count
+        self._log_smoothed, self._totals, self._class_count = log_smoothed, totals, class_count
+
+    def _add_feature(self, term):
+        index = self.n_features
+        self._reserve(self.n_classes, index + 1)
+        self.vocabulary[term] = index
+        self._idf[index] = np.log((1 + self.n_documents) / 2) + 1
+        # Every class gains one smoothed (zero-count) entry for the new term.
+        self._totals[:self.n_classes] += self.alpha
+        self.n_features += 1
+        return index
+
+    def _add_class(self, caption):
+        index = self.n_classes
+        self._reserve(index + 1, self.n_features)
+        self.class_index[caption] = index
+        self._classes[index] = caption
+        self._totals[index] = self.alpha * self.n_features
+        self.n_classes += 1
+        return index
+
+    def transform(self, label_lists):
+        """
+        Vectorises label lists with the current vocabulary, ignoring unknown terms.
+
+        :param label_lists: List of lists of labels.
+        :return: L2-normalised TF-IDF CSR matrix of shape (len(label_lists), n_features).
+        """
+        return tfidf_transform(self.analyzer, self.vocabulary, self.idf, label_lists)
+
+    def joint_log_likelihood(self, X):
+        """Unnormalised log P(caption, x) for every row of X and every caption."""
+        log_totals = np.log(self._totals[:self.n_classes])
+        row_sums = np.asarray(X.sum(axis=1))
+        return (X @ self._log_smoothed[:self.n_classes, :self.n_features].T
+                - row_sums * log_totals
+                + self.class_log_prior())
+
+    def joint_log_likelihood_for(self, columns, weights, classes):
+        """
+        Unnormalised log P(caption, x) for a single sparse query, restricted to some captions.
+
+        :param columns: Term columns of the query's non-zero entries.
+        :param weights: TF-IDF weights of those entries.
+        :param classes: Caption indices to score.
+        :return: Array of len(classes) log-likelihoods.
+        """
+        log_smoothed = self._log_smoothed[np.ix_(classes, columns)]
+        return (log_smoothed @ weights
+                - weights.sum() * np.log(self._totals[classes])
+                + np.log(self._class_count[classes]) - np.log(self._class_total))
+
+    def predict_proba(self, X):
+        """
+        :param X: Matrix returned by transform().
+        :return: Array of shape (n_samples, n_classes) with P(caption | x).
+        """
+        jll = np.asarray(self.joint_log_likelihood(X))
+        return np.exp(jll - logsumexp(jll, axis=1, keepdims=True))
+
+    def partial_fit(self, label_lists, captions):
+        """
+        Learns from new examples, adding any unseen terms and captions.
+
+        :param label_lists: List of lists of labels.
+        :param captions: Caption for each label list.
+        :return: List of (caption index, updated term columns) per example.
+        """
+        for labels in label_lists:
+            for token in self.analyzer(' '.join(labels)):
+                if token not in self.vocabulary:
+                    self._add_feature(token)
+        self.n_documents += len(label_lists)
+
+        X = self.transform(label_lists)
+        updated = []
+        for row, caption in enumerate(captions):
+            class_index = self.class_index.get(caption)
+            if class_index is None:
+                class_index = self._add_class(caption)
+            start, end = X.indptr[row], X.indptr[row + 1]
+            columns, weights = X.indices[start:end], X.data[start:end]
+            self._feature_count[class_index, columns] += weights
+            self._log_smoothed[class_index, columns] = np.log(self._feature_count[class_index, columns] + self.alpha)
+            self._totals[class_index] += weights.sum()
+            self._class_count[class_index] += 1
+            self._class_total += 1
+            updated.append((class_index, columns))
+        return updated
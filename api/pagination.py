@@ -0,0 +1,22 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class ImageCursorPagination(CursorPagination):
+    """
+    Keyset pagination over images, newest first.
+
+    Pages are fetched with ``WHERE id < cursor`` on an indexed column, so deep pages cost
+    the same as the first one, unlike OFFSET-based pagination.
+    """
+
+    ordering = '-id'
+    page_size = settings.IMAGE_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.IMAGE_MAX_PAGE_SIZE
+
+
+class FeedCursorPagination(ImageCursorPagination):
+    """Keyset pagination for a user's feed, backed by the (user, -uploaded_at, -id) index."""
+
+    ordering = ('-uploaded_at', '-id')
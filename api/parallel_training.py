@@ -0,0 +1,246 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from .caption_generator import CustomCaptionGenerator
+from .online_model import OnlineNaiveBayes, tfidf_transform, vocabulary_from_document_frequency
+
+# Functions in this module run in spawned worker processes, which import it without setting
+# up Django, so it must not import anything that touches models or settings. Shard loaders
+# that read the database run after setup_django_worker has set Django up in the worker.
+
+# Vocabulary, IDF and caption rows set once per counting worker by _init_count_worker.
+_count_model = None
+# Model loaded once per evaluation worker by _init_evaluation_worker.
+_evaluation_generator = None
+
+
+def split_shards(items, n_shards):
+    """
+    Splits a sequence into at most n_shards contiguous slices of near-equal size.
+
+    :return: List of non-empty slices.
+    """
+    n_shards = max(1, min(n_shards, len(items)))
+    bounds = np.linspace(0, len(items), n_shards + 1).astype(int)
+    return [items[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _map_shards(func, shards, workers, initializer=None, initargs=()):
+    """Maps func over shards on a spawned process pool, or inline when workers is 0."""
+    if workers <= 0 or not shards:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(shard) for shard in shards]
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=multiprocessing.get_context('spawn'),
+                             initializer=initializer, initargs=initargs) as executor:
+        return list(executor.map(func, shards))
+
+
+def examples_in(shard):
+    """Shard loader for shards that already are lists of (labels, caption) pairs."""
+    return shard
+
+
+def setup_django_worker(settings_module):
+    """
+    Worker initializer for shard loaders that read the database.
+
+    :param settings_module: DJANGO_SETTINGS_MODULE of the parent process.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _shard_vocabulary(task):
+    load_examples, shard = task
+    analyzer = TfidfVectorizer().build_analyzer()
+    document_frequency, captions, n_documents = {}, set(), 0
+    for labels, caption in load_examples(shard):
+        for term in set(analyzer(' '.join(labels))):
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+        captions.add(caption)
+        n_documents += 1
+    return document_frequency, captions, n_documents
+
+
+def _init_count_worker(document_frequency, n_documents, captions, setup=None, setup_args=()):
+    global _count_model
+    if setup is not None:
+        setup(*setup_args)
+    vocabulary, idf = vocabulary_from_document_frequency(document_frequency, n_documents)
+    _count_model = (TfidfVectorizer().build_analyzer(), vocabulary, idf,
+                    {caption: i for i, caption in enumerate(captions)})
+
+
+def _shard_counts(task):
+    load_examples, shard, batch_size = task
+    analyzer, vocabulary, idf, class_index = _count_model
+    feature_count = sparse.csr_matrix((len(class_index), len(idf)))
+    class_count = np.zeros(len(class_index))
+    examples = iter(load_examples(shard))
+    while True:
+        batch = list(islice(examples, batch_size))
+        if not batch:
+            return feature_count, class_count
+        X = tfidf_transform(analyzer, vocabulary, idf, [labels for labels, _ in batch])
+        rows = np.array([class_index[caption] for _, caption in batch])
+        # One-hot caption matrix; Y.T @ X sums each caption's TF-IDF rows as MultinomialNB does.
+        Y = sparse.csr_matrix((np.ones(len(batch)), (np.arange(len(batch)), rows)),
+                              shape=(len(batch), len(class_index)))
+        feature_count = feature_count + (Y.T @ X).tocsr()
+        class_count += np.bincount(rows, minlength=len(class_index))
+
+
+def train_parallel(labels_list, captions, workers, generator=None):
+    """
+    Trains a caption model with the corpus sharded across a process pool.
+
+    :param labels_list: List of lists of labels.
+    :param captions: Caption for each label list.
+    :param workers: Number of worker processes; 0 trains inline.
+    :param generator: Generator to train; a new one is created if omitted.
+    :return: The trained CustomCaptionGenerator.
+    """
+    examples = list(zip(labels_list, captions))
+    if not examples:
+        raise ValueError("Cannot train a caption model without examples")
+    return train_sharded(split_shards(examples, max(workers, 1)), examples_in, workers, generator=generator)
+
+
+def train_sharded(shards, load_examples, workers, generator=None, setup=None, setup_args=(), batch_size=1000):
+    """
+    Trains a caption model with each worker reading its own shard of the corpus.
+
+    Workers first count document frequencies for their shard, which are summed into the
+    shared vocabulary and IDF; they then accumulate Naive Bayes counts for their shard,
+    which are summed into the final model. Both merges are exact, so the result matches
+    CustomCaptionGenerator.train on the same data.
+
+    The caption-to-row mapping and IDF are sent to each worker once, through the pool
+    initializer, and workers return sparse counts. Memory does not depend on the number of
+    examples, but the merged model is dense captions x vocabulary, so it still grows with
+    the number of distinct captions.
+
+    :param shards: Picklable shard descriptions.
+    :param load_examples: Module-level function called in the worker with a shard, returning
+        an iterable of (labels, caption) pairs. It is called once per pass.
+    :param workers: Number of worker processes; 0 trains inline.
+    :param generator: Generator to train; a new one is created if omitted.
+    :param setup: Optional function run once in each worker before loading shards.
+    :param setup_args: Arguments for ``setup``.
+    :param batch_size: Examples counted per partial_fit call.
+    :return: The trained CustomCaptionGenerator, or None if the shards held no examples.
+    """
+    generator = generator if generator is not None else CustomCaptionGenerator()
+    document_frequency, all_captions, n_documents = {}, set(), 0
+    vocabulary_tasks = [(load_examples, shard) for shard in shards]
+    for shard_frequency, shard_captions, shard_documents in _map_shards(_shard_vocabulary, vocabulary_tasks, workers,
+                                                                       initializer=setup, initargs=setup_args):
+        for term, count in shard_frequency.items():
+            document_frequency[term] = document_frequency.get(term, 0) + count
+        all_captions |= shard_captions
+        n_documents += shard_documents
+    if not n_documents:
+        return None
+
+    global _count_model
+    alpha = generator.classifier.alpha
+    captions = sorted(all_captions)
+    tasks = [(load_examples, shard, batch_size) for shard in shards]
+    try:
+        counts = _map_shards(_shard_counts, tasks, workers, initializer=_init_count_worker,
+                             initargs=(document_frequency, n_documents, captions, setup, setup_args))
+    finally:
+        _count_model = None  # Only set in this process when counting inline
+    feature_count = sum(shard_feature_count for shard_feature_count, _ in counts)
+    class_count = sum(shard_class_count for _, shard_class_count in counts)
+
+    vocabulary, idf = vocabulary_from_document_frequency(document_frequency, n_documents)
+    generator.set_online_model(OnlineNaiveBayes(
+        generator.vectorizer.build_analyzer(), vocabulary, idf, captions,
+        feature_count.toarray(), class_count, n_documents, alpha=alpha
+    ))
+    return generator
+
+
+def _init_evaluation_worker(model_path, setup=None, setup_args=()):
+    global _evaluation_generator
+    if setup is not None:
+        setup(*setup_args)
+    _evaluation_generator = CustomCaptionGenerator.load(model_path)
+
+
+def _evaluate_shard(task):
+    load_examples, shard, batch_size = task
+    examples = iter(load_examples(shard))
+    n_examples = correct = 0
+    while True:
+        batch = list(islice(examples, batch_size))
+        if not batch:
+            return n_examples, correct
+        probs = _evaluation_generator.predict_proba([labels for labels, _ in batch])
+        predicted = _evaluation_generator.classes[probs.argmax(axis=1)]
+        correct += sum(1 for prediction, (_, caption) in zip(predicted, batch) if prediction == caption)
+        n_examples += len(batch)
+
+
+def evaluate_parallel(generator, labels_list, captions, workers, shard_size=1000):
+    """
+    Measures how often the most probable caption is the expected one on held-out examples.
+
+    :param generator: Trained CustomCaptionGenerator.
+    :param labels_list: List of lists of labels.
+    :param captions: Expected caption for each label list.
+    :param workers: Number of worker processes; 0 evaluates inline.
+    :param shard_size: Examples scored per task.
+    :return: Dict with examples, correct, accuracy, seconds and examples_per_second.
+    """
+    examples = list(zip(labels_list, captions))
+    shards = [examples[i:i + shard_size] for i in range(0, len(examples), shard_size)]
+    return evaluate_sharded(generator, shards, examples_in, workers)
+
+
+def evaluate_sharded(generator, shards, load_examples, workers, setup=None, setup_args=(), batch_size=1000):
+    """
+    Scores a model on examples that each worker reads from its own shard.
+
+    The model is saved to a temporary directory and memory-mapped by each worker, so it is
+    not copied per process.
+
+    :param generator: Trained CustomCaptionGenerator.
+    :param shards: Picklable shard descriptions.
+    :param load_examples: Module-level function called in the worker with a shard, returning
+        an iterable of (labels, expected caption) pairs.
+    :param workers: Number of worker processes; 0 evaluates inline.
+    :param setup: Optional function run once in each worker before loading shards.
+    :param setup_args: Arguments for ``setup``.
+    :param batch_size: Examples scored per predict_proba call.
+    :return: Dict with examples, correct, accuracy, seconds and examples_per_second.
+    """
+    global _evaluation_generator
+    tasks = [(load_examples, shard, batch_size) for shard in shards]
+    with tempfile.TemporaryDirectory() as model_path:
+        generator.save(model_path)
+        start = time.perf_counter()
+        try:
+            results = _map_shards(_evaluate_shard, tasks, workers, initializer=_init_evaluation_worker,
+                                  initargs=(model_path, setup, setup_args))
+        finally:
+            _evaluation_generator = None  # Only set in this process when evaluating inline
+        seconds = time.perf_counter() - start
+    n_examples = sum(shard_examples for shard_examples, _ in results)
+    correct = sum(shard_correct for _, shard_correct in results)
+    return {
+        'examples': n_examples,
+        'correct': correct,
+        'accuracy': correct / n_examples if n_examples else 0.0,
+        'seconds': seconds,
+        'examples_per_second': n_examples / seconds if seconds else 0.0,
+    }
@@ -0,0 +1,237 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, Q, When
+from django.utils import timezone
+from .metrics import time_stage
+from .models import Image, Caption
+from .model_registry import get_caption_generator
+from .renditions import schedule_renditions
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def default_analyzer():
+    """
+    Returns the callable used to moderate and label images outside of a request.
+
+    :return: Callable taking an image file and a digest keyword, returning (labels, is_nsfw, nsfw_score).
+    """
+    from .views import ImageViewSet
+    return ImageViewSet().process_image_with_rekognition
+
+
+def process_image(image, analyze, caption_generator):
+    """
+    Runs moderation, labelling and captioning for a stored image and records the outcome.
+
+    :param image: Image whose file has already been saved.
+    :param analyze: Callable taking an image file and a digest keyword, returning (labels, is_nsfw, nsfw_score).
+    :param caption_generator: Generator used to caption accepted images.
+    :return: The updated Image.
+    """
+    with image.image.open('rb') as f:
+        labels, is_nsfw, nsfw_score = analyze(f, digest=image.content_hash or None)
+
+    image.labels = labels
+    image.is_nsfw = is_nsfw
+    image.nsfw_score = nsfw_score
+    if is_nsfw:
+        image.release_file()
+        image.status = 'REJECTED'
+        image.save()
+        return image
+
+    with time_stage('caption'):
+        caption_text = caption_generator.generate_improved_caption(labels)
+    with time_stage('db_write'), transaction.atomic():
+        image.status = 'ACCEPTED'
+        image.save()
+        Caption.objects.update_or_create(image=image, defaults={'text': caption_text, 'generated_text': caption_text})
+
+    # Train the model with the new image's labels and generated caption
+    with time_stage('update_model'):
+        caption_generator.update_model(labels, caption_text)
+    schedule_renditions(image.id)
+    return image
+
+
+def processed_duplicates(digest, user=None):
+    """
+    :param digest: Content digest of an upload.
+    :param user: Uploading user, whose own images are preferred over other users'.
+    :return: Queryset of fully processed images with that digest, the user's first and then
+        earliest first, with captions pre-fetched.
+    """
+    return _processed_images(user).filter(content_hash=digest)
+
+
+def find_processed_duplicates(digests, user=None):
+    """
+    Batch version of find_processed_duplicate, answered with one query.
+
+    :param digests: Content digests of uploads.
+    :param user: Uploading user.
+    :return: Dict mapping each digest that has a processed image to the Image to reuse.
+    """
+    duplicates = {}
+    for image in _processed_images(user).filter(content_hash__in=set(digests)):
+        duplicates.setdefault(image.content_hash, image)
+    return duplicates
+
+
+def _processed_images(user):
+    ordering = ['id']
+    if user is not None:
+        ordering.insert(0, Case(When(user=user, then=0), default=1))
+    return (
+        Image.objects.filter(status__in=['ACCEPTED', 'REJECTED'])
+        .select_related('caption')
+        .order_by(*ordering)
+    )
+
+
+def find_processed_duplicate(digest, user=None):
+    """
+    Finds the processed image an upload with the given content digest should reuse.
+
+    The user's own earliest copy is preferred, so repeated uploads of a file someone else
+    uploaded first do not create a new row each time.
+
+    :param digest: Content digest of an upload.
+    :param user: Uploading user.
+    :return: Image with its caption pre-fetched, or None.
+    """
+    return processed_duplicates(digest, user).first()
+
+
+def copy_processed_image(source, user):
+    """
+    Creates an Image for another user that shares the source's blob, labels and moderation result.
+
+    The copy gets the source's generated caption, never the owner's edited text; captions stored
+    before the generated text was kept are generated again from the labels.
+
+    :param source: Processed Image with identical content.
+    :param user: Owner of the new image.
+    :return: The new Image.
+    """
+    with transaction.atomic():
+        image = Image.objects.create(
+            user=user,
+            image=source.image.name,
+            content_hash=source.content_hash,
+            labels=source.labels,
+            is_nsfw=source.is_nsfw,
+            nsfw_score=source.nsfw_score,
+            status=source.status
+        )
+        source_caption = getattr(source, 'caption', None)
+        if source_caption is not None:
+            text = source_caption.generated_text or get_caption_generator().generate_improved_caption(source.labels)
+            Caption.objects.create(image=image, text=text, generated_text=text)
+    return image
+
+
+def claim_image(image_id):
+    """
+    Atomically moves an image from PENDING to PROCESSING so only one worker handles it.
+
+    :param image_id: Primary key of the image.
+    :return: True if this caller claimed the image.
+    """
+    return Image.objects.filter(id=image_id, status='PENDING').update(status='PROCESSING',
+                                                                      claimed_at=timezone.now()) == 1
+
+
+def requeue_stale_images(timeout=None):
+    """
+    Moves images claimed longer than ``timeout`` ago back from PROCESSING to PENDING.
+
+    A worker that dies or restarts mid-job leaves its claimed row in PROCESSING; re-queueing
+    it lets ``manage.py process_uploads`` pick it up again. Rows without a claim time count as stale.
+
+    :param timeout: Seconds after which a claim is presumed abandoned; defaults to UPLOAD_PROCESSING_TIMEOUT.
+    :return: Number of images re-queued.
+    """
+    timeout = settings.UPLOAD_PROCESSING_TIMEOUT if timeout is None else timeout
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return (
+        Image.objects.filter(Q(claimed_at__lt=cutoff) | Q(claimed_at__isnull=True), status='PROCESSING')
+        .update(status='PENDING', claimed_at=None)
+    )
+
+
+def process_pending_image(image_id, analyze=None):
+    """
+    Claims and processes a queued image. Failures leave the row in the FAILED state.
+
+    :param image_id: Primary key of a PENDING image.
+    :param analyze: Optional analyzer; defaults to default_analyzer().
+    :return: The processed Image, or None if it was not claimed or processing failed.
+    """
+    if not claim_image(image_id):
+        return None
+
+    image = Image.objects.get(id=image_id)
+    try:
+        return process_image(image, analyze or default_analyzer(), get_caption_generator())
+    except Exception as e:
+        logger.error(f"Error processing queued image {image_id}: {str(e)}")
+        Image.objects.filter(id=image_id).update(status='FAILED')
+        return None
+
+
+def _process_in_worker(image_id):
+    try:
+        return process_pending_image(image_id)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    """Returns the process-wide thread pool that drains the upload queue."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_WORKERS,
+                                               thread_name_prefix='upload-worker')
+    return _executor
+
+
+def enqueue_image(image_id):
+    """
+    Schedules a PENDING image for background processing once the current transaction commits.
+
+    With UPLOAD_WORKERS set to 0 the image is processed inline in the committing thread.
+    Rows left PENDING, or left PROCESSING by a worker that died mid-job, are picked up by
+    ``manage.py process_uploads``.
+
+    :param image_id: Primary key of the image.
+    """
+    def submit():
+        if settings.UPLOAD_WORKERS <= 0:
+            process_pending_image(image_id)
+        else:
+            get_executor().submit(_process_in_worker, image_id)
+
+    transaction.on_commit(submit)
+
+
+def process_pending_images(image_ids, workers):
+    """
+    Processes a batch of queued images on a temporary thread pool.
+
+    :param image_ids: Primary keys of PENDING images.
+    :param workers: Number of threads to use.
+    :return: Number of images processed successfully.
+    """
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='upload-worker') as executor:
+        return sum(1 for image in executor.map(_process_in_worker, image_ids) if image is not None)
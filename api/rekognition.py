@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+import boto3
+from botocore.config import Config
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session as get_aiobotocore_session
+except ImportError:  # Optional: without aiobotocore, async callers run the boto3 client on threads
+    AioConfig = get_aiobotocore_session = None
+
+_client = None
+_client_lock = threading.Lock()
+
+_async_clients = weakref.WeakKeyDictionary()  # Event loop -> aiobotocore client bound to it
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class StubRekognitionClient:
+    """
+    Offline stand-in for the Rekognition client, selected with REKOGNITION_BACKEND = 'stub'.
+
+    Every image is reported as safe and labelled with REKOGNITION_STUB_LABELS, which makes
+    uploads testable and load-testable without AWS credentials or network access.
+    """
+
+    def __init__(self, labels=None):
+        self.labels = list(labels if labels is not None else settings.REKOGNITION_STUB_LABELS)
+
+    def detect_moderation_labels(self, Image, **kwargs):
+        return {'ModerationLabels': []}
+
+    def detect_labels(self, Image, **kwargs):
+        return {'Labels': [{'Name': name, 'Confidence': 99.0} for name in self.labels]}
+
+
+def build_rekognition_client():
+    """
+    Creates a Rekognition client configured from settings.
+
+    :return: A boto3 Rekognition client, or a StubRekognitionClient for the 'stub' backend.
+    """
+    if settings.REKOGNITION_BACKEND == 'stub':
+        return StubRekognitionClient()
+    if settings.REKOGNITION_BACKEND != 'aws':
+        raise ValueError(f"Unknown REKOGNITION_BACKEND: {settings.REKOGNITION_BACKEND}")
+
+    return boto3.client('rekognition', config=rekognition_client_config(Config), **rekognition_client_kwargs())
+
+
+def rekognition_client_config(config_class):
+    """
+    :param config_class: botocore Config, or aiobotocore's AioConfig.
+    :return: Client configuration built from the REKOGNITION_* settings.
+    """
+    return config_class(
+        max_pool_connections=settings.REKOGNITION_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.REKOGNITION_CONNECT_TIMEOUT,
+        read_timeout=settings.REKOGNITION_READ_TIMEOUT,
+        retries={'max_attempts': settings.REKOGNITION_MAX_ATTEMPTS, 'mode': settings.REKOGNITION_RETRY_MODE},
+    )
+
+
+def rekognition_client_kwargs():
+    """Credentials and region shared by the boto3 and aiobotocore clients."""
+    return {
+        'aws_access_key_id': settings.AWS_ACCESS_KEY_ID,
+        'aws_secret_access_key': settings.AWS_SECRET_ACCESS_KEY,
+        'region_name': settings.AWS_REGION,
+    }
+
+
+def get_rekognition_client():
+    """
+    Returns the process-wide Rekognition client, creating it on first use.
+
+    boto3 clients are thread-safe, so one client (and its HTTP connection pool) is shared by
+    every request and worker thread in the process.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = build_rekognition_client()
+    return _client
+
+
+async def get_async_rekognition_client():
+    """
+    Returns the aiobotocore Rekognition client for the running event loop, creating it on first use.
+
+    aiobotocore clients are bound to the loop they were created on, so each loop (one per
+    ASGI worker process) gets its own client and HTTP connection pool.
+
+    :return: An aiobotocore client, or None for the 'stub' backend or when aiobotocore is not installed.
+    """
+    if settings.REKOGNITION_BACKEND != 'aws' or get_aiobotocore_session is None:
+        return None
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        context = get_aiobotocore_session().create_client('rekognition', config=rekognition_client_config(AioConfig),
+                                                          **rekognition_client_kwargs())
+        client = await context.__aenter__()
+        # Another request on this loop may have created one while this one was connecting.
+        existing = _async_clients.setdefault(loop, client)
+        if existing is not client:
+            await context.__aexit__(None, None, None)
+            client = existing
+    return client
+
+
+def reset_rekognition_client():
+    """Drops the shared clients so the next call rebuilds them from the current settings."""
+    global _client
+    with _client_lock:
+        _client = None
+        _async_clients.clear()
+
+
+def get_rekognition_executor():
+    """Returns the process-wide thread pool used to issue Rekognition calls concurrently."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.REKOGNITION_MAX_CONCURRENCY,
+                                               thread_name_prefix='rekognition')
+    return _executor
@@ -0,0 +1,124 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, close_old_connections, transaction
+from PIL import Image as PILImage
+from .imaging import render_rendition
+from .models import Image, Rendition
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png', 'AVIF': 'avif'}
+
+
+def rendition_path(image, name):
+    """
+    Storage path of a rendition.
+
+    Paths are derived from the content digest, so images sharing a blob also share their
+    renditions on disk; images without a digest fall back to their id.
+    """
+    spec = settings.IMAGE_RENDITIONS[name]
+    extension = EXTENSIONS.get(spec['format'].upper(), spec['format'].lower())
+    key = image.content_hash or f"image-{image.id}"
+    return f"renditions/{key[:2]}/{key}_{name}.{extension}"
+
+
+def get_rendition(image, name):
+    """
+    Returns a rendition of an image, generating and indexing it on first request.
+
+    :param image: Image with a stored file.
+    :param name: Key into settings.IMAGE_RENDITIONS.
+    :return: Rendition.
+    """
+    if name not in settings.IMAGE_RENDITIONS:
+        raise ValueError(f"Unknown rendition: {name}")
+    rendition = Rendition.objects.filter(image=image, name=name).first()
+    if rendition is not None:
+        return rendition
+    return create_rendition(image, name)
+
+
+def create_rendition(image, name):
+    """
+    Renders a rendition to storage (unless an identical blob already has one) and indexes it.
+
+    :param image: Image with a stored file.
+    :param name: Key into settings.IMAGE_RENDITIONS.
+    :return: Rendition.
+    """
+    if not image.image:
+        raise ValueError(f"Image {image.id} has no stored file")
+
+    spec = settings.IMAGE_RENDITIONS[name]
+    path = rendition_path(image, name)
+    storage = Rendition._meta.get_field('file').storage
+    if storage.exists(path):
+        with storage.open(path, 'rb') as f, PILImage.open(f) as existing:
+            width, height = existing.size
+    else:
+        with image.image.open('rb') as f:
+            content, width, height = render_rendition(f, spec['size'], spec['format'],
+                                                      spec.get('quality', settings.RENDITION_QUALITY))
+        path = storage.save(path, ContentFile(content))
+
+    try:
+        with transaction.atomic():
+            return Rendition.objects.create(image=image, name=name, file=path, width=width, height=height)
+    except IntegrityError:
+        # Another request indexed the same rendition concurrently.
+        return Rendition.objects.get(image=image, name=name)
+
+
+def create_renditions(image_id):
+    """Generates every configured rendition that an accepted image does not have yet."""
+    image = Image.objects.filter(id=image_id, status='ACCEPTED').first()
+    if image is None or not image.image:
+        return
+    existing = set(image.renditions.values_list('name', flat=True))
+    for name in settings.IMAGE_RENDITIONS:
+        if name not in existing:
+            try:
+                create_rendition(image, name)
+            except Exception as e:
+                logger.error(f"Error creating rendition {name} for image {image_id}: {str(e)}")
+
+
+def _create_renditions_in_worker(image_id):
+    try:
+        create_renditions(image_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(image_id):
+    """
+    Pre-generates renditions in the background after the current transaction commits.
+
+    Does nothing unless RENDITIONS_ON_UPLOAD is set; renditions are otherwise created lazily
+    on first request. With RENDITION_WORKERS set to 0 they are generated inline.
+
+    :param image_id: Primary key of an accepted image.
+    """
+    if not settings.RENDITIONS_ON_UPLOAD:
+        return
+
+    def submit():
+        global _executor
+        if settings.RENDITION_WORKERS <= 0:
+            create_renditions(image_id)
+            return
+        if _executor is None:
+            with _executor_lock:
+                if _executor is None:
+                    _executor = ThreadPoolExecutor(max_workers=settings.RENDITION_WORKERS,
+                                                   thread_name_prefix='rendition')
+        _executor.submit(_create_renditions_in_worker, image_id)
+
+    transaction.on_commit(submit)
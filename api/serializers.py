@@ -1,12 +1,38 @@
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
 from .models import Image, Caption
 
 class ImageSerializer(serializers.ModelSerializer):
+    renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = Image
-        fields = ['id', 'image', 'uploaded_at', 'is_nsfw', 'nsfw_score', 'labels', 'status', 'user']  # Ensure all fields are included
+        fields = ['id', 'image', 'uploaded_at', 'is_nsfw', 'nsfw_score', 'labels', 'status', 'user', 'renditions']  # Ensure all fields are included
         read_only_fields = ['is_nsfw', 'nsfw_score', 'uploaded_at', 'labels', 'status', 'user']
 
+    def get_renditions(self, image):
+        """URLs of the rendition endpoint for each configured size; renditions are generated on first fetch."""
+        if image.status != 'ACCEPTED' or not image.image:
+            return {}
+        request = self.context.get('request')
+        urls = {}
+        for name in settings.IMAGE_RENDITIONS:
+            url = reverse('image-rendition', kwargs={'pk': image.pk, 'name': name})
+            urls[name] = request.build_absolute_uri(url) if request is not None else url
+        return urls
+
+class FeedImageSerializer(ImageSerializer):
+    caption = serializers.SerializerMethodField()
+
+    class Meta(ImageSerializer.Meta):
+        fields = ImageSerializer.Meta.fields + ['caption']
+
+    def get_caption(self, image):
+        """Caption text, read from the caption joined by the feed query."""
+        caption = getattr(image, 'caption', None)
+        return caption.text if caption is not None else None
+
 class CaptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Caption
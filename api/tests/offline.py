@@ -0,0 +1,23 @@
+from django.test import override_settings
+from api.rekognition import reset_rekognition_client
+from api.vision import reset_vision_backend
+
+
+class OfflineVisionMixin:
+    """
+    Runs each test against the stub Rekognition client, so it needs no AWS credentials or region.
+
+    The shared client and vision backend are rebuilt around every test, so neither the stub
+    nor a real client leaks into other test classes. Subclasses defining setUp must call
+    ``super().setUp()``.
+    """
+
+    def setUp(self):
+        super().setUp()
+        offline = override_settings(REKOGNITION_BACKEND='stub', VISION_BACKEND='api.vision.RekognitionBackend')
+        offline.enable()
+        self.addCleanup(offline.disable)
+        reset_rekognition_client()
+        reset_vision_backend()
+        self.addCleanup(reset_vision_backend)
+        self.addCleanup(reset_rekognition_client)
@@ -0,0 +1,156 @@
+import tempfile
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from api.benchmarks import OFFLINE_UPLOAD_SETTINGS, sample_image
+from api.digests import content_digest
+from api.model_registry import reset_caption_generator
+from api.models import Caption, Image
+from api.rekognition import reset_rekognition_client
+from api.vision import RekognitionBackend, aanalyze_image, reset_vision_backend
+
+UPLOAD_URL = '/api/images/upload_image_async/'
+
+class FakeAsyncRekognitionClient:
+    def __init__(self, moderation_labels=()):
+        self.moderation_labels = list(moderation_labels)
+        self.calls = []
+
+    async def detect_moderation_labels(self, Image):
+        self.calls.append('detect_moderation_labels')
+        return {'ModerationLabels': self.moderation_labels}
+
+    async def detect_labels(self, Image):
+        self.calls.append('detect_labels')
+        return {'Labels': [{'Name': 'Dog'}, {'Name': 'Park'}]}
+
+@override_settings(CAPTION_MODEL_DIR=tempfile.mkdtemp(), **OFFLINE_UPLOAD_SETTINGS)
+class AsyncUploadTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_rekognition_client()
+        reset_vision_backend()
+        reset_caption_generator()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.other_user = User.objects.create_user(username='otheruser', password='12345')
+        self.token = Token.objects.create(user=self.user)
+        self.other_token = Token.objects.create(user=self.other_user)
+
+    def tearDown(self):
+        cache.clear()
+        reset_rekognition_client()
+        reset_vision_backend()
+        reset_caption_generator()
+
+    async def upload(self, content, token=None):
+        token = token if token is not None else self.token
+        return await self.async_client.post(
+            UPLOAD_URL, {'image': SimpleUploadedFile('photo.jpg', content, content_type='image/jpeg')},
+            headers={'Authorization': f'Token {token.key}'}
+        )
+
+    async def test_upload_image(self):
+        response = await self.upload(sample_image(0, 64))
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['labels'], ['Object'])
+        self.assertEqual(data['status'], 'ACCEPTED')
+        self.assertIn('text', data['caption'])
+
+        image = await Image.objects.aget(id=data['id'])
+        self.assertEqual(image.user_id, self.user.id)
+        self.assertEqual(image.content_hash, content_digest([sample_image(0, 64)]))
+        self.assertTrue(await Caption.objects.filter(image=image).aexists())
+        self.assertEqual([name async for name in image.label_entries.values_list('name', flat=True)], ['object'])
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.post(
+            UPLOAD_URL, {'image': SimpleUploadedFile('photo.jpg', sample_image(0, 64), content_type='image/jpeg')}
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+        response = await self.async_client.post(UPLOAD_URL, {}, headers={'Authorization': 'Token invalid'})
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(await Image.objects.aexists())
+
+    async def test_missing_image(self):
+        response = await self.async_client.post(UPLOAD_URL, {}, headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "No image provided"})
+
+    async def test_get_not_allowed(self):
+        response = await self.async_client.get(UPLOAD_URL, headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, 405)
+
+    async def test_duplicate_uploads(self):
+        first = await self.upload(sample_image(1, 64))
+        self.assertEqual(first.status_code, 201)
+
+        again = await self.upload(sample_image(1, 64))
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['id'], first.json()['id'])
+
+        copied = await self.upload(sample_image(1, 64), token=self.other_token)
+        self.assertEqual(copied.status_code, 201)
+        self.assertEqual(copied.json()['caption'], first.json()['caption'])
+        self.assertEqual(await Image.objects.acount(), 2)
+
+        copied_again = await self.upload(sample_image(1, 64), token=self.other_token)
+        self.assertEqual(copied_again.status_code, 200)
+        self.assertEqual(copied_again.json()['id'], copied.json()['id'])
+        self.assertEqual(await Image.objects.acount(), 2)
+
+    @override_settings(ASYNC_UPLOADS=True, UPLOAD_WORKERS=0)
+    async def test_queued_upload(self):
+        response = await self.upload(sample_image(2, 64))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'PENDING')
+
+class AsyncVisionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    async def test_rekognition_backend_uses_async_client(self):
+        client = FakeAsyncRekognitionClient()
+        backend = RekognitionBackend(client=object(), async_client=client)
+        self.assertEqual(await backend.aanalyze(b'image'), (['Dog', 'Park'], False, 0))
+        self.assertEqual(sorted(client.calls), ['detect_labels', 'detect_moderation_labels'])
+
+    @override_settings(REKOGNITION_SKIP_LABELS_ON_NSFW=True)
+    async def test_rekognition_backend_skips_labels_on_nsfw(self):
+        client = FakeAsyncRekognitionClient([{'ParentName': 'Violence', 'Confidence': 97.0}])
+        backend = RekognitionBackend(client=object(), async_client=client)
+        self.assertEqual(await backend.aanalyze(b'image'), ([], True, 97.0))
+        self.assertEqual(client.calls, ['detect_moderation_labels'])
+
+    @override_settings(REKOGNITION_BACKEND='stub')
+    async def test_rekognition_backend_falls_back_to_threads(self):
+        backend = RekognitionBackend()
+        self.assertIsNone(await backend.get_async_client())
+        self.assertEqual(await backend.aanalyze(b'image'), (['Object'], False, 0))
+
+    async def test_aanalyze_image_reuses_stored_result(self):
+        user = await User.objects.acreate(username='testuser')
+        digest = content_digest([b'fake image content'])
+        await Image.objects.acreate(user=user, content_hash=digest, labels=['Cat'], status='ACCEPTED')
+        client = FakeAsyncRekognitionClient()
+        backend = RekognitionBackend(client=object(), async_client=client)
+
+        self.assertEqual(await aanalyze_image(b'fake image content', backend=backend), (['Cat'], False, 0.0))
+        self.assertEqual(client.calls, [])
+        self.assertEqual(await cache.aget(f"rekognition_{digest}"), (['Cat'], False, 0.0))
+
+    async def test_aanalyze_image_caches_backend_result(self):
+        client = FakeAsyncRekognitionClient()
+        backend = RekognitionBackend(client=object(), async_client=client)
+        image_bytes = sample_image(3, 64)
+
+        self.assertEqual(await aanalyze_image(image_bytes, backend=backend), (['Dog', 'Park'], False, 0))
+        self.assertEqual(await aanalyze_image(image_bytes, backend=backend), (['Dog', 'Park'], False, 0))
+        self.assertEqual(len(client.calls), 2)
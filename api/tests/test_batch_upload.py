@@ -0,0 +1,190 @@
+import io
+import json
+import tempfile
+import zipfile
+from unittest.mock import patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from api.digests import content_digest
+from api.models import Image, Caption
+from api.model_registry import reset_caption_generator
+from api.tests.offline import OfflineVisionMixin
+
+def fake_rekognition(self, image_file, digest=None):
+    image_bytes = image_file.read()
+    if image_bytes.startswith(b'nsfw'):
+        return (['explicit content'], True, 0.9)
+    if image_bytes.startswith(b'broken'):
+        raise ValueError("unreadable image")
+    return (['person', 'dog'], False, 0.1)
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CAPTION_MODEL_DIR=tempfile.mkdtemp(), UPLOAD_BATCH_CHUNK_SIZE=2)
+@patch('api.views.ImageViewSet.process_image_with_rekognition', fake_rekognition)
+class BatchUploadTestCase(OfflineVisionMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_caption_generator()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        reset_caption_generator()
+
+    def read_results(self, response):
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_upload_many_files(self):
+        images = [SimpleUploadedFile(f"image_{i}.jpg", b'fake image content %d' % i, content_type="image/jpeg")
+                  for i in range(5)]
+        response = self.client.post('/api/images/upload_batch/', {'images': images}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        results = self.read_results(response)
+        self.assertEqual([result['name'] for result in results], [f"image_{i}.jpg" for i in range(5)])
+        self.assertTrue(all('caption' in result for result in results))
+        self.assertEqual(Image.objects.filter(status='ACCEPTED', user=self.user).count(), 5)
+        self.assertEqual(Caption.objects.count(), 5)
+
+    def test_upload_zip_archive(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('album/one.jpg', b'fake image one')
+            archive.writestr('album/two.png', b'nsfw image two')
+            archive.writestr('album/notes.txt', b'not an image')
+        archive_file = SimpleUploadedFile("album.zip", buffer.getvalue(), content_type="application/zip")
+
+        response = self.client.post('/api/images/upload_batch/', {'archive': archive_file}, format='multipart')
+
+        results = self.read_results(response)
+        self.assertEqual([result['name'] for result in results], ['one.jpg', 'two.png'])
+        self.assertEqual(results[1]['error'], "NSFW image detected and rejected")
+        self.assertEqual(Image.objects.get(id=results[1]['id']).status, 'REJECTED')
+        self.assertEqual(Caption.objects.count(), 1)
+
+    def test_failed_item_does_not_fail_batch(self):
+        images = [
+            SimpleUploadedFile("good.jpg", b'fake image content', content_type="image/jpeg"),
+            SimpleUploadedFile("broken.jpg", b'broken image content', content_type="image/jpeg"),
+        ]
+        response = self.client.post('/api/images/upload_batch/', {'images': images}, format='multipart')
+
+        results = self.read_results(response)
+        self.assertIn('id', results[0])
+        self.assertIn('unreadable image', results[1]['error'])
+        self.assertEqual(Image.objects.count(), 1)
+
+    def test_upload_batch_no_files(self):
+        response = self.client.post('/api/images/upload_batch/', {}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], "No images provided")
+
+    @override_settings(UPLOAD_BATCH_MAX_ITEMS=1)
+    def test_upload_batch_too_large(self):
+        images = [SimpleUploadedFile(f"image_{i}.jpg", b'fake', content_type="image/jpeg") for i in range(2)]
+        response = self.client.post('/api/images/upload_batch/', {'images': images}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(MAX_IMAGE_UPLOAD_SIZE=4096)
+    def test_oversized_archive_member_is_reported(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('small.jpg', b'fake image one')
+            archive.writestr('bomb.jpg', b'\0' * 1024 * 1024)
+        archive_file = SimpleUploadedFile("album.zip", buffer.getvalue(), content_type="application/zip")
+
+        opened, real_open = [], zipfile.ZipFile.open
+
+        def tracking_open(archive, member, *args, **kwargs):
+            opened.append(member.filename)
+            return real_open(archive, member, *args, **kwargs)
+
+        with patch.object(zipfile.ZipFile, 'open', tracking_open):
+            response = self.client.post('/api/images/upload_batch/', {'archive': archive_file}, format='multipart')
+            results = self.read_results(response)
+
+        self.assertEqual([result['name'] for result in results], ['small.jpg', 'bomb.jpg'])
+        self.assertIn('caption', results[0])
+        self.assertEqual(results[1], {"name": 'bomb.jpg', "error": "Image exceeds the 4096 byte upload limit"})
+        self.assertEqual(opened, ['small.jpg'])
+        self.assertEqual(Image.objects.count(), 1)
+
+    @override_settings(MAX_IMAGE_UPLOAD_SIZE=1024, UPLOAD_BATCH_MAX_ARCHIVE_SIZE=64 * 1024)
+    def test_archive_has_its_own_size_limit(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for i in range(4):
+                archive.writestr(f'image_{i}.jpg', b'fake image content %d' % i + b' ' * 512)
+        self.assertGreater(len(buffer.getvalue()), 1024)
+        archive_file = SimpleUploadedFile("album.zip", buffer.getvalue(), content_type="application/zip")
+
+        response = self.client.post('/api/images/upload_batch/', {'archive': archive_file}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([result for result in self.read_results(response) if 'caption' in result]), 4)
+
+        big_archive = SimpleUploadedFile("album.zip", b'x' * (128 * 1024), content_type="application/zip")
+        response = self.client.post('/api/images/upload_batch/', {'archive': big_archive}, format='multipart')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.data['error'], "Archive exceeds the 65536 byte upload limit")
+
+    @override_settings(MAX_IMAGE_UPLOAD_SIZE=1024)
+    def test_oversized_file_is_reported(self):
+        images = [
+            SimpleUploadedFile("big.jpg", b'x' * 4096, content_type="image/jpeg"),
+            SimpleUploadedFile("small.jpg", b'fake image content', content_type="image/jpeg"),
+            SimpleUploadedFile("huge.jpg", b'x' * 8192, content_type="image/jpeg"),
+        ]
+        response = self.client.post('/api/images/upload_batch/', {'images': images}, format='multipart')
+
+        results = self.read_results(response)
+        self.assertEqual([result['name'] for result in results], ['big.jpg', 'small.jpg', 'huge.jpg'])
+        self.assertEqual(results[0]['error'], "Image exceeds the 1024 byte upload limit")
+        self.assertIn('caption', results[1])
+        self.assertEqual(results[2]['error'], "Image exceeds the 1024 byte upload limit")
+
+    def test_uploads_are_not_read_into_memory(self):
+        images = [SimpleUploadedFile(f"image_{i}.jpg", b'fake image content %d' % i, content_type="image/jpeg")
+                  for i in range(2)]
+        with patch('api.views.file_digest') as mock_file_digest:
+            response = self.client.post('/api/images/upload_batch/', {'images': images}, format='multipart')
+            results = self.read_results(response)
+
+        mock_file_digest.assert_not_called()
+        self.assertEqual(Image.objects.get(id=results[1]['id']).content_hash, content_digest([b'fake image content 1']))
+        with Image.objects.get(id=results[1]['id']).image.open('rb') as f:
+            self.assertEqual(f.read(), b'fake image content 1')
+
+    def test_reuploaded_images_are_not_analysed_again(self):
+        other_user = User.objects.create_user(username='otheruser', password='12345')
+        first = self.client.post('/api/images/upload_batch/', {'images': [
+            SimpleUploadedFile("one.jpg", b'fake image one', content_type="image/jpeg"),
+            SimpleUploadedFile("two.jpg", b'nsfw image two', content_type="image/jpeg"),
+        ]}, format='multipart')
+        first_results = self.read_results(first)
+
+        images = [
+            SimpleUploadedFile("one.jpg", b'fake image one', content_type="image/jpeg"),
+            SimpleUploadedFile("two.jpg", b'nsfw image two', content_type="image/jpeg"),
+            SimpleUploadedFile("three.jpg", b'fake image three', content_type="image/jpeg"),
+        ]
+        with patch('api.views.ImageViewSet.process_image_with_rekognition', side_effect=fake_rekognition,
+                   autospec=True) as mock_process_image:
+            again = self.read_results(self.client.post('/api/images/upload_batch/', {'images': images},
+                                                       format='multipart'))
+        self.assertEqual(mock_process_image.call_count, 1)
+        self.assertEqual([result['name'] for result in again], ['one.jpg', 'two.jpg', 'three.jpg'])
+        self.assertEqual(again[0]['id'], first_results[0]['id'])
+        self.assertEqual(again[0]['caption'], first_results[0]['caption'])
+        self.assertEqual(again[1], {"name": 'two.jpg', "id": first_results[1]['id'],
+                                    "error": "NSFW image detected and rejected"})
+        self.assertEqual(Image.objects.filter(user=self.user).count(), 3)
+
+        self.client.force_authenticate(user=other_user)
+        copied = self.read_results(self.client.post('/api/images/upload_batch/', {'images': [
+            SimpleUploadedFile("one.jpg", b'fake image one', content_type="image/jpeg"),
+        ]}, format='multipart'))
+        copy = Image.objects.get(id=copied[0]['id'])
+        self.assertEqual((copy.user, copy.content_hash), (other_user, content_digest([b'fake image one'])))
+        self.assertEqual(copied[0]['caption'], first_results[0]['caption'])
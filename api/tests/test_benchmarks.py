@@ -0,0 +1,36 @@
+import json
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from api.benchmarks import benchmark_caption_model, benchmark_uploads, synthetic_corpus
+from api.models import Image
+
+class BenchmarkTestCase(TestCase):
+    def test_synthetic_corpus_is_reproducible(self):
+        self.assertEqual(synthetic_corpus(20, 5), synthetic_corpus(20, 5))
+        labels_list, captions = synthetic_corpus(20, 5)
+        self.assertEqual(len(labels_list), 20)
+        self.assertLessEqual(len(set(captions)), 5)
+
+    def test_benchmark_caption_model(self):
+        results = benchmark_caption_model(100, 5, calls=5)
+        self.assertEqual([result['name'] for result in results], [
+            'train', 'generate_improved_caption', 'generate_improved_captions',
+            'update_model', 'generate_improved_caption_after_updates',
+        ])
+        self.assertTrue(all(result['total_seconds'] >= 0 for result in results))
+
+    def test_benchmark_uploads(self):
+        result, = benchmark_uploads(2, image_size=64)
+        self.assertEqual(result['calls'], 2)
+        self.assertEqual(Image.objects.filter(status='ACCEPTED').count(), 2)
+
+    def test_command_writes_json(self):
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False).name
+        call_command('benchmark', '--sizes', '50', '--calls', '3', '--uploads', '0', '--output', output,
+                     stderr=StringIO())
+        with open(output) as f:
+            report = json.load(f)
+        self.assertIn('numpy', report['environment'])
+        self.assertEqual({result['size'] for result in report['results']}, {50})
@@ -0,0 +1,70 @@
+import tempfile
+from unittest.mock import patch
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from api.caption_cache import CaptionCache, canonical_labels
+from api.caption_generator import CustomCaptionGenerator
+from api.model_registry import SharedCaptionGenerator
+from api.model_store import ModelStore
+
+@override_settings(CAPTION_CACHE_SIZE=2, CAPTION_CACHE_STALE_UPDATES=3, CAPTION_CACHE_SHARED=False)
+class CaptionCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        generator = CustomCaptionGenerator()
+        generator.train([["dog", "cat"], ["house", "tree"]], ["A dog and a cat", "A house near a tree"])
+        self.shared = SharedCaptionGenerator(generator)
+
+    def test_canonical_labels(self):
+        self.assertEqual(canonical_labels(["Person", " outdoors", "Nature"]), ("nature", "outdoors", "person"))
+
+    def test_repeated_label_sets_reuse_distribution(self):
+        with patch.object(CustomCaptionGenerator, 'caption_distribution',
+                          wraps=self.shared.generator.caption_distribution) as caption_distribution:
+            self.shared.generate_improved_caption(["Dog", "House"])
+            caption = self.shared.generate_improved_caption(["house", "dog"])
+        self.assertEqual(caption_distribution.call_count, 1)
+        self.assertIn(caption, ["A dog and a cat", "A house near a tree"])
+
+    def test_lru_eviction(self):
+        lru = CaptionCache()
+        for labels in [("a",), ("b",), ("c",)]:
+            lru.set(labels, 0, labels)
+        self.assertEqual(len(lru), 2)
+        self.assertIsNone(lru.get(("a",), 0))
+        self.assertEqual(lru.get(("c",), 0), ("c",))
+
+    def test_entries_expire_after_online_updates(self):
+        lru = CaptionCache()
+        lru.set(("dog",), 0, "distribution")
+        self.assertEqual(lru.get(("dog",), 2), "distribution")
+        self.assertIsNone(lru.get(("dog",), 3))
+
+    def test_swap_invalidates(self):
+        self.shared.generate_improved_caption(["dog"])
+        generator = CustomCaptionGenerator()
+        generator.train([["dog"]], ["Only a dog"])
+        self.shared.swap(generator)
+        self.assertEqual(self.shared.generate_improved_caption(["dog"]), "Only a dog")
+
+    @override_settings(CAPTION_CACHE_SHARED=True)
+    def test_shared_tier(self):
+        CaptionCache().set(("dog",), 0, "distribution", version=4)
+        self.assertEqual(CaptionCache().get(("dog",), 0, version=4), "distribution")
+        self.assertIsNone(CaptionCache().get(("dog",), 0, version=5))
+        self.assertIsNone(CaptionCache().get(("dog",), 0))
+
+    @override_settings(CAPTION_CACHE_SHARED=True)
+    def test_shared_tier_across_workers_with_online_updates(self):
+        store = ModelStore(tempfile.mkdtemp())
+        version = store.save(self.shared.generator)
+        workers = [SharedCaptionGenerator(store.load(version)[1], store=store, version=version) for _ in range(2)]
+        worker_a, worker_b = workers
+
+        worker_a.update_model(["dog"], "A brand new dog caption")
+        worker_a.generate_improved_caption(["dog"])
+        with patch.object(CustomCaptionGenerator, 'caption_distribution') as caption_distribution:
+            caption = worker_b.generate_improved_caption(["dog"])
+
+        caption_distribution.assert_not_called()
+        self.assertIn(caption, ["A dog and a cat", "A house near a tree", "A brand new dog caption"])
@@ -1,5 +1,5 @@
 from django.test import TestCase
-from api.caption_generator import CustomCaptionGenerator
+from api.caption_generator import CustomCaptionGenerator, count_frequent
 import numpy as np
 from unittest.mock import patch
 
@@ -50,3 +50,68 @@ class CustomCaptionGeneratorTestCase(TestCase):
 
         improved_caption = self.generator.generate_improved_caption(new_labels)
         self.assertIn(improved_caption, [initial_caption, new_caption])
+
+    def test_generate_improved_captions_batch(self):
+        captions = ["A dog and a cat", "A house near a tree"]
+        self.generator.train([["dog", "cat"], ["house", "tree"]], captions)
+
+        labels_list = [["dog"], ["house"], ["dog", "house"]] * 10
+        batch = self.generator.generate_improved_captions(labels_list, rng=np.random.default_rng(0))
+        self.assertEqual(len(batch), 30)
+        self.assertTrue(set(batch) <= set(captions))
+        self.assertEqual(batch, self.generator.generate_improved_captions(labels_list, rng=np.random.default_rng(0)))
+
+    def test_generate_improved_captions_follows_distribution(self):
+        self.generator.train([["dog", "cat"], ["house", "tree"]], ["A dog and a cat", "A house near a tree"])
+        probs = self.generator.predict_proba([["dog"]])[0]
+        batch = self.generator.generate_improved_captions([["dog"]] * 4000, rng=1)
+        self.assertAlmostEqual(batch.count("A dog and a cat") / 4000, probs[0], delta=0.03)
+
+    def test_generate_improved_captions_untrained(self):
+        self.assertEqual(self.generator.generate_improved_captions([[]]), ["An interesting image."])
+
+    def test_generate_improved_captions_with_index(self):
+        captions = ["A dog and a cat", "A house near a tree"]
+        self.generator.train([["dog", "cat"], ["house", "tree"]], captions)
+        self.generator.index_min_classes = 0
+        batch = self.generator.generate_improved_captions([["dog"], ["tree"]], rng=0)
+        self.assertTrue(set(batch) <= set(captions))
+
+    def test_train_streaming_matches_train(self):
+        labels_list = [["dog", "cat"], ["house", "tree"], ["dog", "tree"], ["cat"], ["house", "dog"]]
+        captions = ["A dog and a cat", "A house near a tree", "A dog under a tree", "A dog and a cat", "A house"]
+        self.generator.train(labels_list, captions)
+
+        examples = list(zip(labels_list, captions))
+        progress = []
+        streamed = CustomCaptionGenerator()
+        trained = streamed.train_streaming(lambda: (examples[i:i + 2] for i in range(0, len(examples), 2)),
+                                           progress=lambda phase, seen: progress.append((phase, seen)))
+
+        self.assertEqual(trained, 5)
+        self.assertEqual(progress[-1], ('counts', 5))
+        self.assertEqual(list(streamed.classes), list(self.generator.classes))
+        self.assertEqual(streamed.vocabulary(), self.generator.vocabulary())
+        query = [["dog", "house"], ["tree"]]
+        np.testing.assert_allclose(streamed.predict_proba(query), self.generator.predict_proba(query))
+
+    def test_train_streaming_caps_classes(self):
+        examples = [(["dog"], "A dog")] * 6 + [(["cat"], "A cat")] * 4
+        examples += [([f"thing{i}"], f"Thing {i}") for i in range(5)]
+        streamed = CustomCaptionGenerator()
+        trained = streamed.train_streaming(lambda: (examples[i:i + 4] for i in range(0, len(examples), 4)),
+                                           max_classes=2)
+
+        self.assertEqual(sorted(streamed.classes), ["A cat", "A dog"])
+        self.assertEqual(trained, 10)
+
+    def test_count_frequent_is_bounded(self):
+        counts = {}
+        for item in ["a", "b", "a", "c", "a", "d", "e", "a"]:
+            count_frequent(counts, item, 2)
+            self.assertLessEqual(len(counts), 2)
+        self.assertIn("a", counts)
+
+    def test_train_streaming_empty(self):
+        self.assertEqual(self.generator.train_streaming(lambda: iter([])), 0)
+        self.assertFalse(self.generator.trained)
@@ -0,0 +1,66 @@
+import numpy as np
+from unittest.mock import patch
+from django.test import TestCase
+from api.caption_generator import CustomCaptionGenerator
+from api import caption_index
+from api.caption_index import CaptionIndex
+
+class CaptionIndexTestCase(TestCase):
+    def setUp(self):
+        self.generator = CustomCaptionGenerator()
+        labels_list = [[f"subject{i}", f"place{i % 10}"] for i in range(200)]
+        captions = [f"Caption {i}" for i in range(200)]
+        self.generator.train(labels_list, captions)
+        self.generator.index_min_classes = 0
+        self.generator.index_postings_per_term = 8
+
+    def test_postings_are_bounded(self):
+        index = self.generator.get_index()
+        self.assertTrue(all(len(posting) <= 8 for posting in index.postings.values()))
+        self.assertEqual(len(index.popular), 8)
+
+    def test_build_in_column_blocks(self):
+        feature_count = self.generator.classifier.feature_count_
+        expected = CaptionIndex.build(feature_count, self.generator.classifier.class_count_, postings_per_term=8)
+        # 200 classes per block of one column, so every column is its own block.
+        with patch.object(caption_index, 'BUILD_BLOCK_VALUES', 200):
+            blocked = CaptionIndex.build(feature_count, self.generator.classifier.class_count_, postings_per_term=8)
+
+        self.assertEqual(blocked.postings.keys(), expected.postings.keys())
+        for column, posting in expected.postings.items():
+            np.testing.assert_array_equal(np.sort(blocked.postings[column]), np.sort(posting))
+        strongest = np.argsort(feature_count[:, 0])[-8:]
+        np.testing.assert_array_equal(np.sort(blocked.postings[0]), np.sort(strongest))
+
+    def test_candidates_cover_query_terms(self):
+        candidates, probs = self.generator.candidate_proba(["subject42"])
+        self.assertLessEqual(len(candidates), 16)
+        self.assertIn("Caption 42", self.generator.classes[candidates])
+        self.assertAlmostEqual(probs.sum(), 1)
+        self.assertEqual(self.generator.top_captions(["subject42"], k=1)[0][0], "Caption 42")
+
+    def test_matches_full_distribution_when_postings_cover_all_captions(self):
+        self.generator.index_postings_per_term = 1000
+        candidates, probs = self.generator.candidate_proba(["subject3", "place3"])
+        np.testing.assert_array_equal(candidates, np.arange(200))
+        np.testing.assert_allclose(probs, self.generator.predict_proba([["subject3", "place3"]])[0])
+
+    def test_online_updates_reach_index(self):
+        self.generator.get_index()
+        self.generator.update_model(["boat", "lake"], "A boat on a lake")
+        self.assertEqual(self.generator.top_captions(["boat"], k=1)[0][0], "A boat on a lake")
+        candidates, probs = self.generator.candidate_proba(["subject7", "place7"])
+        np.testing.assert_allclose(
+            probs,
+            self.generator.predict_proba([["subject7", "place7"]])[0][candidates] /
+            self.generator.predict_proba([["subject7", "place7"]])[0][candidates].sum()
+        )
+
+    def test_update_keeps_strongest_captions(self):
+        index = CaptionIndex(postings_per_term=2)
+        feature_count = np.array([[1.0], [3.0], [2.0]])
+        class_count = np.array([1.0, 1.0, 1.0])
+        index.update(0, [0], feature_count, class_count)
+        index.update(1, [0], feature_count, class_count)
+        index.update(2, [0], feature_count, class_count)
+        self.assertEqual(sorted(index.postings[0]), [1, 2])
@@ -0,0 +1,124 @@
+import os
+import tempfile
+from unittest.mock import patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from api.digests import content_digest
+from api.models import Image, Caption
+from api.model_registry import reset_caption_generator
+from api.tests.offline import OfflineVisionMixin
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CAPTION_MODEL_DIR=tempfile.mkdtemp())
+@patch('api.views.ImageViewSet.process_image_with_rekognition')
+class DeduplicationTestCase(OfflineVisionMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_caption_generator()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.other_user = User.objects.create_user(username='otheruser', password='12345')
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        reset_caption_generator()
+
+    def upload(self, content=b'fake image content', name="test_image.jpg"):
+        image = SimpleUploadedFile(name, content, content_type="image/jpeg")
+        return self.client.post('/api/images/upload_image/', {'image': image}, format='multipart')
+
+    def test_file_is_stored_under_content_digest(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        response = self.upload()
+
+        image = Image.objects.get(id=response.data['id'])
+        digest = content_digest([b'fake image content'])
+        self.assertEqual(image.content_hash, digest)
+        self.assertEqual(image.image.name, f"images/{digest[:2]}/{digest}.jpg")
+
+    def test_same_user_reupload_returns_existing_image(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        first = self.upload()
+        second = self.upload(name="copy.jpg")
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second.data['caption'], first.data['caption'])
+        self.assertEqual(Image.objects.count(), 1)
+        mock_process_image.assert_called_once()
+
+    def test_other_user_reupload_shares_blob_and_caption(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        first = self.upload()
+        self.client.force_authenticate(user=self.other_user)
+        second = self.upload(name="copy.jpg")
+
+        self.assertEqual(second.status_code, 201)
+        self.assertNotEqual(second.data['id'], first.data['id'])
+        original = Image.objects.get(id=first.data['id'])
+        copy = Image.objects.get(id=second.data['id'])
+        self.assertEqual(copy.user, self.other_user)
+        self.assertEqual(copy.image.name, original.image.name)
+        self.assertEqual(copy.labels, original.labels)
+        self.assertEqual(Caption.objects.get(image=copy).text, Caption.objects.get(image=original).text)
+        self.assertEqual(len(os.listdir(os.path.dirname(original.image.path))), 1)
+        mock_process_image.assert_called_once()
+
+    def test_other_user_reupload_does_not_get_edited_caption(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        first = self.upload()
+        generated = first.data['caption']['text']
+        self.client.post(f"/api/images/{first.data['id']}/update_caption/", {'caption': 'My private note'})
+        self.client.force_authenticate(user=self.other_user)
+        second = self.upload(name="copy.jpg")
+
+        self.assertEqual(second.data['caption']['text'], generated)
+        copy = Caption.objects.get(image_id=second.data['id'])
+        self.assertEqual((copy.text, copy.generated_text), (generated, generated))
+        self.assertEqual(Caption.objects.get(image_id=first.data['id']).text, 'My private note')
+
+    def test_other_user_reupload_regenerates_caption_without_generated_text(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        first = self.upload()
+        generated = first.data['caption']['text']
+        Caption.objects.filter(image_id=first.data['id']).update(text='My private note', generated_text='')
+        self.client.force_authenticate(user=self.other_user)
+        second = self.upload(name="copy.jpg")
+
+        self.assertEqual(second.data['caption']['text'], generated)
+
+    def test_repeated_reupload_of_other_users_image_reuses_own_copy(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        first = self.upload()
+        self.client.force_authenticate(user=self.other_user)
+        copy = self.upload(name="copy.jpg")
+        again = self.upload(name="copy.jpg")
+        once_more = self.upload(name="copy.jpg")
+
+        self.assertEqual(copy.status_code, 201)
+        self.assertEqual((again.status_code, again.data['id']), (200, copy.data['id']))
+        self.assertEqual((once_more.status_code, once_more.data['id']), (200, copy.data['id']))
+        self.assertEqual(Image.objects.filter(user=self.other_user).count(), 1)
+        self.assertNotEqual(copy.data['id'], first.data['id'])
+        mock_process_image.assert_called_once()
+
+    def test_rejected_reupload_is_rejected_without_analysis(self, mock_process_image):
+        mock_process_image.return_value = (['explicit content'], True, 0.9)
+        self.upload()
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Image.objects.count(), 1)
+        mock_process_image.assert_called_once()
+
+    def test_release_file_keeps_shared_blob(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        first = self.upload()
+        self.client.force_authenticate(user=self.other_user)
+        second = self.upload()
+
+        copy = Image.objects.get(id=second.data['id'])
+        copy.release_file()
+        original = Image.objects.get(id=first.data['id'])
+        self.assertTrue(original.image.storage.exists(original.image.name))
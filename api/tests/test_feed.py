@@ -0,0 +1,47 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from api.models import Image, Caption
+from api.tests.offline import OfflineVisionMixin
+
+class FeedTestCase(OfflineVisionMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.other_user = User.objects.create_user(username='otheruser', password='12345')
+        self.client.force_authenticate(user=self.user)
+        self.images = []
+        for i in range(5):
+            image = Image.objects.create(user=self.user, labels=['dog'], status='ACCEPTED')
+            Caption.objects.create(image=image, text=f"Caption {i}")
+            self.images.append(image)
+        Image.objects.create(user=self.other_user, labels=['cat'], status='ACCEPTED')
+
+    def test_feed_lists_own_images_newest_first(self):
+        response = self.client.get('/api/images/feed/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([image['id'] for image in response.data['results']],
+                         [image.id for image in reversed(self.images)])
+        self.assertEqual(response.data['results'][0]['caption'], "Caption 4")
+
+    def test_feed_pages_with_cursor(self):
+        seen = []
+        url = '/api/images/feed/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen += [image['id'] for image in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, [image.id for image in reversed(self.images)])
+
+    def test_feed_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/images/feed/')
+        self.assertEqual(len(queries), 1)
+
+    def test_image_without_caption(self):
+        Image.objects.create(user=self.user, status='PENDING')
+        response = self.client.get('/api/images/feed/')
+        self.assertIsNone(response.data['results'][0]['caption'])
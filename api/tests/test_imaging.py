@@ -0,0 +1,84 @@
+import io
+import os
+from unittest.mock import MagicMock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PIL import Image as PILImage
+from api.imaging import UnreadableImage, prepare_for_analysis
+from api.vision import analyze_image
+
+def encode_image(size, image_format='JPEG', orientation=None):
+    buffer = io.BytesIO()
+    image = PILImage.new('RGB', size, (0, 128, 255))
+    exif = PILImage.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(buffer, format=image_format, exif=exif.tobytes())
+    return buffer.getvalue()
+
+def decoded_size(image_bytes):
+    with PILImage.open(io.BytesIO(image_bytes)) as image:
+        return image.size
+
+class PrepareForAnalysisTestCase(TestCase):
+    def test_large_image_is_downscaled(self):
+        prepared = prepare_for_analysis(encode_image((4000, 3000)), 1000)
+        self.assertEqual(decoded_size(prepared), (1000, 750))
+
+    def test_small_image_passes_through(self):
+        original = encode_image((800, 600))
+        self.assertIs(prepare_for_analysis(original, 1000), original)
+
+    def test_image_over_byte_budget_is_reencoded(self):
+        # Noise barely compresses, so this PNG is far larger than its pixel count suggests.
+        noisy = PILImage.frombytes('RGB', (400, 400), os.urandom(400 * 400 * 3))
+        buffer = io.BytesIO()
+        noisy.save(buffer, format='PNG')
+        original = buffer.getvalue()
+        self.assertGreater(len(original), 100_000)
+
+        self.assertIs(prepare_for_analysis(original, 1000, max_bytes=len(original)), original)
+        prepared = prepare_for_analysis(io.BytesIO(original), 1000, max_bytes=100_000)
+        self.assertLessEqual(len(prepared), 100_000)
+        with PILImage.open(io.BytesIO(prepared)) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (400, 400)))
+
+    def test_exif_orientation_is_applied(self):
+        # Orientation 6 means the camera was rotated; the upright image is taller than wide.
+        prepared = prepare_for_analysis(encode_image((800, 600), orientation=6), 1000)
+        self.assertEqual(decoded_size(prepared), (600, 800))
+
+    def test_other_formats_are_reencoded(self):
+        prepared = prepare_for_analysis(encode_image((100, 50), image_format='BMP'), 1000)
+        with PILImage.open(io.BytesIO(prepared)) as image:
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_undecodable_upload_is_rejected(self):
+        with self.assertRaises(UnreadableImage):
+            prepare_for_analysis(io.BytesIO(b'fake image content' * 1000), 1000)
+
+    def test_disabled(self):
+        original = encode_image((4000, 3000))
+        self.assertIs(prepare_for_analysis(original, 0), original)
+
+    @override_settings(VISION_MAX_DIMENSION=500)
+    def test_backend_receives_downscaled_copy(self):
+        cache.clear()
+        backend = MagicMock()
+        backend.name = 'mock'
+        backend.analyze.return_value = (['Sky'], False, 0)
+
+        analyze_image(encode_image((2000, 1000)), backend=backend)
+
+        self.assertEqual(decoded_size(backend.analyze.call_args[0][0]), (500, 250))
+        cache.clear()
+
+    def test_backend_is_not_called_for_undecodable_upload(self):
+        cache.clear()
+        backend = MagicMock()
+        backend.name = 'mock'
+
+        with self.assertRaises(UnreadableImage):
+            analyze_image(b'fake image content', backend=backend)
+
+        backend.analyze.assert_not_called()
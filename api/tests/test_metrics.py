@@ -0,0 +1,53 @@
+import tempfile
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+from api.benchmarks import sample_image
+from api.model_registry import reset_caption_generator
+from api.rekognition import reset_rekognition_client
+from api.vision import analyze_image, reset_vision_backend
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CAPTION_MODEL_DIR=tempfile.mkdtemp(),
+                   REKOGNITION_BACKEND='stub', VISION_BACKEND='api.vision.RekognitionBackend')
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_rekognition_client()
+        reset_vision_backend()
+        reset_caption_generator()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        reset_rekognition_client()
+        reset_vision_backend()
+        reset_caption_generator()
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_vision_result_sources(self):
+        backend_before = self.sample('caption_vision_results_total', source='backend')
+        cache_before = self.sample('caption_vision_results_total', source='cache')
+        image = sample_image(1, size=64)
+        analyze_image(image)
+        analyze_image(image)
+        self.assertEqual(self.sample('caption_vision_results_total', source='backend'), backend_before + 1)
+        self.assertEqual(self.sample('caption_vision_results_total', source='cache'), cache_before + 1)
+
+    def test_metrics_endpoint(self):
+        self.client.post('/api/images/upload_image/',
+                         {'image': SimpleUploadedFile("a.jpg", sample_image(2, size=64), content_type='image/jpeg')},
+                         format='multipart')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        for stage in ('total', 'duplicate_lookup', 'storage', 'db_write', 'caption', 'update_model'):
+            self.assertIn(f'caption_upload_stage_seconds_count{{stage="{stage}"}}', body)
+        self.assertIn('caption_uploads_total{outcome="accepted"}', body)
+        self.assertIn('caption_distribution_cache_total', body)
+        self.assertIn('caption_model_captions 1.0', body)
@@ -0,0 +1,52 @@
+import tempfile
+import threading
+from django.test import TestCase, override_settings
+from api.caption_generator import CustomCaptionGenerator
+from api.model_registry import SharedCaptionGenerator, get_caption_generator, reset_caption_generator
+from api.views import ImageViewSet
+from api.tests.offline import OfflineVisionMixin
+
+@override_settings(CAPTION_MODEL_DIR=tempfile.mkdtemp())
+class ModelRegistryTestCase(OfflineVisionMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_caption_generator()
+
+    def tearDown(self):
+        reset_caption_generator()
+
+    def test_get_caption_generator_is_shared(self):
+        self.assertIs(get_caption_generator(), get_caption_generator())
+
+    def test_viewsets_share_generator(self):
+        self.assertIs(ImageViewSet().caption_generator, ImageViewSet().caption_generator)
+
+    def test_updates_survive_across_viewsets(self):
+        ImageViewSet().caption_generator.update_model(["dog", "cat"], "A dog and a cat")
+        self.assertTrue(ImageViewSet().caption_generator.trained)
+
+    def test_explicit_train_swaps_generator(self):
+        shared = SharedCaptionGenerator()
+        original = shared.generator
+        shared.explicit_train([["dog", "cat"], ["house", "tree"]], ["A dog and a cat", "A house near a tree"])
+        self.assertIsNot(shared.generator, original)
+        self.assertFalse(original.trained)
+        self.assertIn(shared.generate_improved_caption(["dog"]), ["A dog and a cat", "A house near a tree"])
+
+    def test_concurrent_updates(self):
+        generator = CustomCaptionGenerator()
+        generator.train([["dog", "cat"], ["house", "tree"]], ["A dog and a cat", "A house near a tree"])
+        shared = SharedCaptionGenerator(generator)
+
+        def worker():
+            for _ in range(20):
+                shared.update_model(["dog", "house"], "A house near a tree")
+                shared.generate_improved_caption(["dog", "house"])
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(generator.model_arrays()['class_count'].sum(), 2 + 4 * 20)
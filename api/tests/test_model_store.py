@@ -0,0 +1,72 @@
+import tempfile
+import numpy as np
+from django.test import TestCase, override_settings
+from api.caption_generator import CustomCaptionGenerator
+from api.model_registry import SharedCaptionGenerator, get_caption_generator, reset_caption_generator
+from api.model_store import ModelStore
+
+class ModelStoreTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = ModelStore(self.root)
+        self.generator = CustomCaptionGenerator()
+        self.generator.train([["dog", "cat"], ["house", "tree"]], ["A dog and a cat", "A house near a tree"])
+
+    def test_save_and_load_round_trip(self):
+        version = self.store.save(self.generator)
+        self.assertEqual(version, 1)
+        self.assertEqual(self.store.current_version(), 1)
+
+        loaded_version, loaded = self.store.load()
+        self.assertEqual(loaded_version, 1)
+        self.assertIsInstance(loaded.classifier.feature_count_, np.memmap)
+        X = self.generator.vectorizer.transform(["dog house"])
+        Y = loaded.vectorizer.transform(["dog house"])
+        np.testing.assert_allclose(X.toarray(), Y.toarray())
+        np.testing.assert_allclose(self.generator.classifier.predict_proba(X), loaded.classifier.predict_proba(Y))
+        self.assertEqual(list(loaded.classifier.classes_), list(self.generator.classifier.classes_))
+
+    def test_versions_increment(self):
+        self.store.save(self.generator)
+        self.store.save(self.generator, publish=False)
+        self.assertEqual(self.store.versions(), [1, 2])
+        self.assertEqual(self.store.current_version(), 1)
+        self.store.publish(2)
+        self.assertEqual(self.store.current_version(), 2)
+
+    def test_empty_store(self):
+        self.assertEqual(self.store.load(), (None, None))
+
+    def test_save_untrained_model(self):
+        with self.assertRaises(ValueError):
+            self.store.save(CustomCaptionGenerator())
+
+    def test_update_memory_mapped_model(self):
+        self.store.save(self.generator)
+        _, loaded = self.store.load()
+        loaded.update_model(["dog"], "A dog and a cat")
+        self.assertEqual(loaded.model_arrays()['class_count'].sum(), 3)
+        # The stored artifact is untouched by the in-process update.
+        _, reloaded = self.store.load()
+        self.assertEqual(reloaded.classifier.class_count_.sum(), 2)
+
+    def test_refresh_hot_swaps_published_version(self):
+        shared = SharedCaptionGenerator(store=self.store)
+        shared.refresh(force=True)
+        self.assertFalse(shared.trained)
+
+        self.store.save(self.generator)
+        shared.refresh(force=True)
+        self.assertTrue(shared.trained)
+        self.assertEqual(shared.version, 1)
+
+    def test_shared_generator_loads_published_model(self):
+        self.store.save(self.generator)
+        with override_settings(CAPTION_MODEL_DIR=self.root):
+            reset_caption_generator()
+            try:
+                shared = get_caption_generator()
+                self.assertEqual(shared.version, 1)
+                self.assertTrue(shared.trained)
+            finally:
+                reset_caption_generator()
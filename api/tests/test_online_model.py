@@ -0,0 +1,60 @@
+import tempfile
+import numpy as np
+from django.test import TestCase
+from api.caption_generator import CustomCaptionGenerator
+from api.online_model import OnlineNaiveBayes, grown_capacity
+
+class OnlineNaiveBayesTestCase(TestCase):
+    def setUp(self):
+        self.generator = CustomCaptionGenerator()
+        self.generator.train([["dog", "cat"], ["house", "tree"], ["dog", "tree"]],
+                             ["A dog and a cat", "A house near a tree", "A dog under a tree"])
+        self.online = OnlineNaiveBayes.from_estimators(self.generator.vectorizer, self.generator.classifier, 3)
+
+    def test_matches_fitted_estimators(self):
+        labels_list = [["dog", "house"], ["cat"], ["unknown"]]
+        X = self.generator.vectorizer.transform([' '.join(labels) for labels in labels_list])
+        np.testing.assert_allclose(self.online.predict_proba(self.online.transform(labels_list)),
+                                   self.generator.classifier.predict_proba(X))
+        np.testing.assert_allclose(self.online.feature_log_prob(), self.generator.classifier.feature_log_prob_)
+
+    def test_matches_partial_fit_for_known_terms(self):
+        X = self.generator.vectorizer.transform(["dog house"])
+        self.generator.classifier.partial_fit(X, ["A dog and a cat"])
+        self.online.partial_fit([["dog", "house"]], ["A dog and a cat"])
+        np.testing.assert_allclose(self.online.feature_log_prob(), self.generator.classifier.feature_log_prob_)
+        np.testing.assert_allclose(self.online.class_log_prior(), self.generator.classifier.class_log_prior_)
+
+    def test_learns_new_terms_and_captions(self):
+        self.online.partial_fit([["boat", "lake"]], ["A boat on a lake"])
+        self.assertIn("boat", self.online.vocabulary)
+        self.assertEqual(self.online.classes[-1], "A boat on a lake")
+        probs = self.online.predict_proba(self.online.transform([["boat"]]))[0]
+        self.assertEqual(self.online.classes[probs.argmax()], "A boat on a lake")
+        np.testing.assert_allclose(np.exp(self.online.feature_log_prob()).sum(axis=1), 1)
+
+    def test_buffers_grow_by_doubling(self):
+        capacities = set()
+        for i in range(100):
+            self.online.partial_fit([[f"term{i}"]], [f"Caption {i}"])
+            capacities.add(self.online._feature_count.shape)
+        self.assertEqual(self.online.n_classes, 103)
+        # Each dimension doubles 16 -> 32 -> 64 -> 128 rather than reallocating per update.
+        self.assertEqual(self.online._feature_count.shape, (128, 128))
+        self.assertLessEqual(len(capacities), 7)
+        self.assertEqual(grown_capacity(16, 103), 128)
+
+    def test_generator_learns_new_caption_online(self):
+        self.generator.update_model(["boat", "lake"], "A boat on a lake")
+        probs = self.generator.predict_proba([["boat", "lake"]])[0]
+        self.assertEqual(self.generator.classes[probs.argmax()], "A boat on a lake")
+
+    def test_save_after_online_growth(self):
+        self.generator.update_model(["boat", "lake"], "A boat on a lake")
+        path = tempfile.mkdtemp()
+        self.generator.save(path)
+        loaded = CustomCaptionGenerator.load(path)
+        self.assertEqual(list(loaded.classes), list(self.generator.classes))
+        self.assertEqual(loaded.n_documents, 4)
+        np.testing.assert_allclose(loaded.predict_proba([["boat", "dog"]]),
+                                   self.generator.predict_proba([["boat", "dog"]]))
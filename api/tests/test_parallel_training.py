@@ -0,0 +1,61 @@
+import numpy as np
+from unittest.mock import patch
+from scipy import sparse
+from django.test import SimpleTestCase
+from api.caption_generator import CustomCaptionGenerator
+from api import parallel_training
+from api.parallel_training import evaluate_parallel, split_shards, train_parallel
+
+class ParallelTrainingTestCase(SimpleTestCase):
+    def setUp(self):
+        self.labels_list = [[f"subject{i % 7}", f"place{i % 3}"] for i in range(60)]
+        self.captions = [f"Caption {i % 7}" for i in range(60)]
+
+    def test_split_shards(self):
+        shards = split_shards(list(range(10)), 3)
+        self.assertEqual([len(shard) for shard in shards], [3, 3, 4])
+        self.assertEqual(sum(shards, []), list(range(10)))
+        self.assertEqual(len(split_shards([1, 2], 8)), 2)
+
+    def test_sharded_counts_match_single_process_training(self):
+        expected = CustomCaptionGenerator()
+        expected.train(self.labels_list, self.captions)
+
+        generator = train_parallel(self.labels_list, self.captions, workers=2)
+
+        self.assertEqual(list(generator.classes), list(expected.classes))
+        np.testing.assert_allclose(generator.model_arrays()['feature_count'], expected.classifier.feature_count_)
+        query = [["subject3"], ["place1", "subject5"]]
+        np.testing.assert_allclose(generator.predict_proba(query), expected.predict_proba(query))
+
+    def test_workers_return_sparse_counts(self):
+        shard_counts, real_shard_counts = [], parallel_training._shard_counts
+
+        def record(task):
+            # Captions and IDF travel through the worker initializer, not with every task.
+            self.assertEqual(len(task), 3)
+            counts = real_shard_counts(task)
+            shard_counts.append(counts)
+            return counts
+
+        with patch.object(parallel_training, '_shard_counts', record):
+            train_parallel(self.labels_list, self.captions, workers=0)
+
+        self.assertTrue(shard_counts)
+        self.assertTrue(all(sparse.issparse(feature_count) for feature_count, _ in shard_counts))
+        self.assertIsNone(parallel_training._count_model)
+
+    def test_train_inline(self):
+        generator = train_parallel(self.labels_list, self.captions, workers=0)
+        self.assertEqual(len(generator.classes), 7)
+
+    def test_train_without_examples(self):
+        with self.assertRaises(ValueError):
+            train_parallel([], [], workers=0)
+
+    def test_evaluate_parallel(self):
+        generator = train_parallel(self.labels_list, self.captions, workers=0)
+        report = evaluate_parallel(generator, self.labels_list, self.captions, workers=2, shard_size=16)
+        self.assertEqual(report['examples'], 60)
+        self.assertEqual(report['accuracy'], 1.0)
+        self.assertGreater(report['examples_per_second'], 0)
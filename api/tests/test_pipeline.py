@@ -0,0 +1,128 @@
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from api.digests import content_digest
+from api.models import Image, Caption
+from api.model_registry import reset_caption_generator
+from api.pipeline import claim_image, process_pending_image
+from api.tests.offline import OfflineVisionMixin
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), UPLOAD_WORKERS=0, CAPTION_MODEL_DIR=tempfile.mkdtemp())
+class AsyncUploadTestCase(OfflineVisionMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_caption_generator()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        reset_caption_generator()
+
+    def upload(self, content=b'fake image content'):
+        image = SimpleUploadedFile("test_image.jpg", content, content_type="image/jpeg")
+        return self.client.post('/api/images/upload_image/?async=1', {'image': image}, format='multipart')
+
+    @patch('api.views.ImageViewSet.process_image_with_rekognition')
+    def test_upload_returns_pending(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.upload()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'PENDING')
+        self.assertEqual(Image.objects.get(id=response.data['id']).status, 'PENDING')
+        mock_process_image.assert_not_called()
+
+    @patch('api.views.ImageViewSet.process_image_with_rekognition')
+    def test_queued_image_is_accepted(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload()
+
+        image = Image.objects.get(id=response.data['id'])
+        self.assertEqual(image.status, 'ACCEPTED')
+        self.assertEqual(image.labels, ['person', 'dog'])
+        self.assertTrue(Caption.objects.filter(image=image).exists())
+        image_file = mock_process_image.call_args[0][0]
+        self.assertEqual(mock_process_image.call_args[1], {'digest': content_digest([b'fake image content'])})
+        self.assertTrue(image_file.closed)
+
+    @patch('api.views.ImageViewSet.process_image_with_rekognition')
+    def test_queued_nsfw_image_is_rejected(self, mock_process_image):
+        mock_process_image.return_value = (['explicit content'], True, 0.9)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload()
+
+        image = Image.objects.get(id=response.data['id'])
+        self.assertEqual(image.status, 'REJECTED')
+        self.assertTrue(image.is_nsfw)
+        self.assertFalse(image.image)
+        self.assertFalse(Caption.objects.filter(image=image).exists())
+
+    @patch('api.views.ImageViewSet.process_image_with_rekognition')
+    def test_processing_failure_marks_image_failed(self, mock_process_image):
+        mock_process_image.side_effect = RuntimeError("boom")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload()
+
+        self.assertEqual(Image.objects.get(id=response.data['id']).status, 'FAILED')
+
+    @patch('api.views.ImageViewSet.process_image_with_rekognition')
+    def test_image_is_processed_once(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload()
+
+        self.assertIsNone(process_pending_image(response.data['id']))
+        mock_process_image.assert_called_once()
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CAPTION_MODEL_DIR=tempfile.mkdtemp())
+class ProcessUploadsCommandTestCase(OfflineVisionMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_caption_generator()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+    def tearDown(self):
+        reset_caption_generator()
+
+    @patch('api.views.ImageViewSet.process_image_with_rekognition')
+    def test_process_uploads_command(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        image = Image(user=self.user, status='PENDING')
+        image.image.save('test_image.jpg', ContentFile(b'fake image content'), save=False)
+        image.save()
+
+        call_command('process_uploads', '--once', '--workers', '2', stdout=StringIO())
+
+        image.refresh_from_db()
+        self.assertEqual(image.status, 'ACCEPTED')
+        self.assertEqual(image.labels, ['person', 'dog'])
+
+    @patch('api.views.ImageViewSet.process_image_with_rekognition')
+    def test_abandoned_image_is_requeued(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        image = Image(user=self.user, status='PENDING')
+        image.image.save('test_image.jpg', ContentFile(b'fake image content'), save=False)
+        image.save()
+        # A worker claimed the image and died before finishing it.
+        self.assertTrue(claim_image(image.id))
+        Image.objects.filter(id=image.id).update(claimed_at=timezone.now() - timedelta(hours=1))
+        in_progress = Image.objects.create(user=self.user, status='PROCESSING', claimed_at=timezone.now())
+
+        output = StringIO()
+        call_command('process_uploads', '--once', '--workers', '2', '--processing-timeout', '60', stdout=output)
+
+        image.refresh_from_db()
+        self.assertEqual(image.status, 'ACCEPTED')
+        self.assertIn("Re-queued 1 images", output.getvalue())
+        self.assertEqual(Image.objects.get(id=in_progress.id).status, 'PROCESSING')
@@ -0,0 +1,110 @@
+import pstats
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from api.middleware import _profiler_lock
+from api.models import RequestProfile
+from api.tests.offline import OfflineVisionMixin
+
+@override_settings(PROFILING_ENABLED=False, PROFILING_SAMPLE_RATE=0)
+class ProfilingMiddlewareTestCase(OfflineVisionMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.profile_dir = Path(tempfile.mkdtemp())
+        self.settings_override = override_settings(PROFILING_DIR=self.profile_dir)
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.staff = User.objects.create_user(username='staffuser', password='12345', is_staff=True)
+
+    def tearDown(self):
+        self.settings_override.disable()
+
+    def test_not_profiled_by_default(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get('/api/images/')
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_enabled_by_setting(self):
+        self.client.force_authenticate(user=self.user)
+        with self.settings(PROFILING_ENABLED=True):
+            self.client.get('/api/images/')
+        profile = RequestProfile.objects.get()
+        self.assertEqual((profile.path, profile.method, profile.status_code, profile.trigger),
+                         ('/api/images/', 'GET', 200, 'setting'))
+        self.assertEqual(profile.user, self.user)
+        self.assertGreater(pstats.Stats(profile.profile_file).total_calls, 0)
+
+    def test_sampling(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1.0):
+            self.client.get('/api/images/')
+        self.assertEqual(RequestProfile.objects.get().trigger, 'sample')
+
+    async def test_async_request(self):
+        with self.settings(PROFILING_ENABLED=True):
+            response = await self.async_client.post('/api/images/upload_image_async/', {})
+        self.assertEqual(response.status_code, 401)
+        profile = await RequestProfile.objects.aget()
+        self.assertEqual((profile.path, profile.method, profile.status_code),
+                         ('/api/images/upload_image_async/', 'POST', 401))
+        self.assertGreater(pstats.Stats(profile.profile_file).total_calls, 0)
+
+    def test_header_requires_staff(self):
+        token = Token.objects.create(user=self.user)
+        self.client.get('/api/images/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.client.get('/api/images/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Token invalid')
+        self.assertFalse(RequestProfile.objects.exists())
+        self.assertEqual(list(self.profile_dir.iterdir()), [])
+
+        staff_token = Token.objects.create(user=self.staff)
+        self.client.get('/api/images/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Token {staff_token.key}')
+        profile = RequestProfile.objects.get()
+        self.assertEqual((profile.trigger, profile.user), ('header', self.staff))
+
+    def test_header_checks_user_before_profiling(self):
+        self.client.force_login(self.user)
+        with patch('api.middleware.cProfile.Profile') as profile:
+            self.client.get('/api/images/', HTTP_X_PROFILE='1')
+        profile.assert_not_called()
+
+        self.client.force_login(self.staff)
+        self.client.get('/api/images/', HTTP_X_PROFILE='1')
+        self.assertEqual(RequestProfile.objects.get().trigger, 'header')
+
+    async def test_async_header_requires_staff(self):
+        token = await Token.objects.acreate(user=self.staff)
+        with patch('api.middleware.cProfile.Profile') as profile:
+            await self.async_client.post('/api/images/upload_image_async/', {}, headers={'X-Profile': '1'})
+        profile.assert_not_called()
+
+        await self.async_client.post('/api/images/upload_image_async/', {},
+                                     headers={'X-Profile': '1', 'Authorization': f'Token {token.key}'})
+        self.assertEqual((await RequestProfile.objects.aget()).trigger, 'header')
+
+    def test_overlapping_requests_are_not_profiled(self):
+        self.client.force_authenticate(user=self.user)
+        with self.settings(PROFILING_ENABLED=True):
+            with _profiler_lock:
+                response = self.client.get('/api/images/')
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(RequestProfile.objects.exists())
+
+            self.client.get('/api/images/')
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+    def test_admin_lists_slowest_first(self):
+        RequestProfile.objects.create(path='/fast', method='GET', status_code=200, duration_ms=5,
+                                      trigger='sample', profile_file='fast.pstats')
+        RequestProfile.objects.create(path='/slow', method='GET', status_code=200, duration_ms=500,
+                                      trigger='sample', profile_file='slow.pstats')
+        self.staff.is_superuser = True
+        self.staff.save()
+        self.client.force_login(self.staff)
+        response = self.client.get('/admin/api/requestprofile/')
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertLess(content.index('/slow'), content.index('/fast'))
@@ -0,0 +1,126 @@
+import threading
+from unittest.mock import MagicMock
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from api.benchmarks import sample_image
+from api.digests import content_digest
+from api.models import Image
+from api.rekognition import (StubRekognitionClient, build_rekognition_client, get_rekognition_client,
+                             reset_rekognition_client)
+from api.views import ImageViewSet
+from api.vision import RekognitionBackend, reset_vision_backend
+from api.tests.offline import OfflineVisionMixin
+
+IMAGE = sample_image(0, 64)
+
+class RekognitionTestCase(OfflineVisionMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.rekognition_client = MagicMock()
+        self.rekognition_client.detect_moderation_labels.return_value = {'ModerationLabels': []}
+        self.rekognition_client.detect_labels.return_value = {'Labels': [{'Name': 'Dog'}, {'Name': 'Park'}]}
+        self.viewset = ImageViewSet()
+        self.viewset.vision_backend = RekognitionBackend(client=self.rekognition_client)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_content_digest_is_stable(self):
+        self.assertEqual(content_digest([b'fake ', b'image']), content_digest([b'fake image']))
+        self.assertEqual(len(content_digest([b'fake image'])), 64)
+        self.assertNotEqual(content_digest([b'fake image']), content_digest([b'other image']))
+
+    def test_cache_key_uses_content_digest(self):
+        self.viewset.process_image_with_rekognition(IMAGE)
+        cached = cache.get(f"rekognition_{content_digest([IMAGE])}")
+        self.assertEqual(cached, (['Dog', 'Park'], False, 0))
+
+        self.viewset.process_image_with_rekognition(IMAGE)
+        self.rekognition_client.detect_labels.assert_called_once()
+
+    def test_stored_result_skips_rekognition(self):
+        user = User.objects.create_user(username='testuser', password='12345')
+        digest = content_digest([IMAGE])
+        Image.objects.create(user=user, content_hash=digest, labels=['Cat'], status='ACCEPTED', nsfw_score=1.5)
+
+        result = self.viewset.process_image_with_rekognition(IMAGE, digest=digest)
+
+        self.assertEqual(tuple(result), (['Cat'], False, 1.5))
+        self.rekognition_client.detect_moderation_labels.assert_not_called()
+        self.rekognition_client.detect_labels.assert_not_called()
+
+    def test_moderation_and_labels_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def moderation(**kwargs):
+            barrier.wait()
+            return {'ModerationLabels': []}
+
+        def labels(**kwargs):
+            barrier.wait()
+            return {'Labels': [{'Name': 'Dog'}]}
+
+        self.rekognition_client.detect_moderation_labels.side_effect = moderation
+        self.rekognition_client.detect_labels.side_effect = labels
+
+        result = self.viewset.process_image_with_rekognition(IMAGE)
+
+        self.assertEqual(result, (['Dog'], False, 0))
+
+    @override_settings(REKOGNITION_SKIP_LABELS_ON_NSFW=True)
+    def test_skip_labels_on_nsfw(self):
+        self.rekognition_client.detect_moderation_labels.return_value = {
+            'ModerationLabels': [{'ParentName': 'Explicit Nudity', 'Confidence': 97.0}]
+        }
+
+        result = self.viewset.process_image_with_rekognition(IMAGE)
+
+        self.assertEqual(result, ([], True, 97.0))
+        self.rekognition_client.detect_labels.assert_not_called()
+
+    @override_settings(REKOGNITION_SKIP_LABELS_ON_NSFW=True)
+    def test_skip_labels_on_nsfw_keeps_labels_for_safe_images(self):
+        result = self.viewset.process_image_with_rekognition(IMAGE)
+
+        self.assertEqual(result, (['Dog', 'Park'], False, 0))
+
+class RekognitionClientTestCase(TestCase):
+    def setUp(self):
+        reset_rekognition_client()
+        reset_vision_backend()
+
+    def tearDown(self):
+        reset_rekognition_client()
+        reset_vision_backend()
+
+    @override_settings(REKOGNITION_BACKEND='aws', AWS_REGION='us-east-1')
+    def test_client_is_shared(self):
+        self.assertIs(get_rekognition_client(), get_rekognition_client())
+        self.assertIs(ImageViewSet().vision_backend.client, ImageViewSet().vision_backend.client)
+
+    @override_settings(REKOGNITION_BACKEND='aws', AWS_REGION='us-east-1', REKOGNITION_MAX_POOL_CONNECTIONS=32,
+                       REKOGNITION_CONNECT_TIMEOUT=2, REKOGNITION_READ_TIMEOUT=7, REKOGNITION_MAX_ATTEMPTS=5)
+    def test_client_configuration(self):
+        config = build_rekognition_client().meta.config
+        self.assertEqual(config.max_pool_connections, 32)
+        self.assertEqual(config.connect_timeout, 2)
+        self.assertEqual(config.read_timeout, 7)
+        self.assertEqual(config.retries['total_max_attempts'], 6)
+
+    @override_settings(REKOGNITION_BACKEND='stub', REKOGNITION_STUB_LABELS=['Dog', 'Park'])
+    def test_stub_backend(self):
+        cache.clear()
+        client = get_rekognition_client()
+        self.assertIsInstance(client, StubRekognitionClient)
+
+        result = ImageViewSet().process_image_with_rekognition(IMAGE)
+
+        self.assertEqual(result, (['Dog', 'Park'], False, 0))
+        cache.clear()
+
+    @override_settings(REKOGNITION_BACKEND='unknown')
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            build_rekognition_client()
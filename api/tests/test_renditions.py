@@ -0,0 +1,82 @@
+import tempfile
+from unittest.mock import patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from PIL import Image as PILImage
+from rest_framework.test import APIClient
+from api.models import Image, Rendition
+from api.model_registry import reset_caption_generator
+from api.tests.offline import OfflineVisionMixin
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CAPTION_MODEL_DIR=tempfile.mkdtemp(),
+                   IMAGE_RENDITIONS={'thumbnail': {'size': 64, 'format': 'WEBP'}})
+@patch('api.views.ImageViewSet.process_image_with_rekognition', lambda self, image_bytes, digest=None: (['Dog'], False, 0))
+class RenditionTestCase(OfflineVisionMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_caption_generator()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        reset_caption_generator()
+
+    def upload(self):
+        with open('api/tests/test_photo.png', 'rb') as f:
+            image = SimpleUploadedFile("test_photo.png", f.read(), content_type="image/png")
+        return self.client.post('/api/images/upload_image/', {'image': image}, format='multipart')
+
+    def test_serializer_exposes_rendition_urls(self):
+        response = self.upload()
+        self.assertEqual(list(response.data['renditions']), ['thumbnail'])
+        self.assertTrue(response.data['renditions']['thumbnail'].endswith(f"/api/images/{response.data['id']}/renditions/thumbnail/"))
+
+    def test_rendition_is_generated_on_first_request(self):
+        image_id = self.upload().data['id']
+        self.assertFalse(Rendition.objects.exists())
+
+        response = self.client.get(f'/api/images/{image_id}/renditions/thumbnail/')
+
+        self.assertEqual(response.status_code, 302)
+        rendition = Rendition.objects.get(image_id=image_id, name='thumbnail')
+        self.assertEqual(response['Location'], rendition.file.url)
+        self.assertEqual(max(rendition.width, rendition.height), 64)
+        with PILImage.open(rendition.file.path) as thumbnail:
+            self.assertEqual(thumbnail.format, 'WEBP')
+            self.assertEqual(thumbnail.size, (rendition.width, rendition.height))
+
+        self.client.get(f'/api/images/{image_id}/renditions/thumbnail/')
+        self.assertEqual(Rendition.objects.count(), 1)
+
+    def test_shared_blob_reuses_rendition_file(self):
+        image_id = self.upload().data['id']
+        self.client.get(f'/api/images/{image_id}/renditions/thumbnail/')
+        other_user = User.objects.create_user(username='otheruser', password='12345')
+        self.client.force_authenticate(user=other_user)
+        copy_id = self.upload().data['id']
+
+        self.client.get(f'/api/images/{copy_id}/renditions/thumbnail/')
+
+        self.assertEqual(
+            Rendition.objects.get(image_id=copy_id).file.name,
+            Rendition.objects.get(image_id=image_id).file.name,
+        )
+
+    def test_unknown_rendition(self):
+        image_id = self.upload().data['id']
+        response = self.client.get(f'/api/images/{image_id}/renditions/huge/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_rejected_image_has_no_renditions(self):
+        user = User.objects.get(username='testuser')
+        image = Image.objects.create(user=user, status='REJECTED', is_nsfw=True)
+        response = self.client.get(f'/api/images/{image.id}/renditions/thumbnail/')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(RENDITIONS_ON_UPLOAD=True, RENDITION_WORKERS=0)
+    def test_renditions_on_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image_id = self.upload().data['id']
+        self.assertTrue(Rendition.objects.filter(image_id=image_id, name='thumbnail').exists())
@@ -0,0 +1,67 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+from api.models import Image, ImageLabel
+from api.tests.offline import OfflineVisionMixin
+
+class LabelSearchTestCase(OfflineVisionMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client.force_authenticate(user=self.user)
+        self.dog_park = Image.objects.create(user=self.user, labels=['Dog', 'Park'], status='ACCEPTED')
+        self.dog = Image.objects.create(user=self.user, labels=['Dog'], status='ACCEPTED')
+        self.cat = Image.objects.create(user=self.user, labels=['Cat', 'Park'], status='ACCEPTED')
+        Image.objects.create(user=self.user, labels=['Dog'], status='REJECTED')
+
+    def search(self, query):
+        return self.client.get(f'/api/images/search/?{query}')
+
+    def result_ids(self, response):
+        return [image['id'] for image in response.data['results']]
+
+    def test_labels_are_indexed(self):
+        self.assertEqual(set(ImageLabel.objects.filter(image=self.dog_park).values_list('name', flat=True)),
+                         {'dog', 'park'})
+
+    def test_index_follows_label_changes(self):
+        image = Image.objects.get(id=self.dog.id)
+        image.labels = ['Horse']
+        image.save()
+        self.assertEqual(list(image.label_entries.values_list('name', flat=True)), ['horse'])
+
+    def test_index_follows_in_place_label_edits(self):
+        image = Image.objects.get(id=self.dog.id)
+        image.labels.append('Ball')
+        image.save()
+        self.assertEqual(set(image.label_entries.values_list('name', flat=True)), {'dog', 'ball'})
+
+    def test_unlabelled_image_skips_index_writes(self):
+        with self.assertNumQueries(1):
+            image = Image.objects.create(user=self.user, status='PENDING')
+        self.assertFalse(image.label_entries.exists())
+
+        image.labels = ['Dog']
+        image.save()
+        self.assertEqual(list(image.label_entries.values_list('name', flat=True)), ['dog'])
+
+    def test_and_search(self):
+        response = self.search('labels=dog,park')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.result_ids(response), [self.dog_park.id])
+
+    def test_or_search(self):
+        response = self.search('labels=DOG&labels=cat&mode=or')
+        self.assertEqual(self.result_ids(response), [self.cat.id, self.dog.id, self.dog_park.id])
+
+    def test_cursor_pagination(self):
+        response = self.search('labels=park&mode=or&page_size=1')
+        self.assertEqual(self.result_ids(response), [self.cat.id])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.result_ids(response), [self.dog_park.id])
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_queries(self):
+        self.assertEqual(self.search('labels=').status_code, 400)
+        self.assertEqual(self.search('labels=dog&mode=xor').status_code, 400)
@@ -0,0 +1,132 @@
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from api.model_store import ModelStore
+from api.models import Image, Caption
+from api.caption_generator import CustomCaptionGenerator
+from api.parallel_training import train_sharded
+from api.training import (
+    is_held_out, iter_shard_pairs, iter_training_pairs, retrain_from_database, retrain_parallel_from_database,
+    training_data_signature, training_id_ranges
+)
+
+@override_settings(CAPTION_MODEL_DIR=tempfile.mkdtemp())
+class RetrainTestCase(TestCase):
+    def setUp(self):
+        self.store = ModelStore(tempfile.mkdtemp())
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+    def add_caption(self, labels, text, status='ACCEPTED'):
+        image = Image.objects.create(user=self.user, labels=labels, status=status)
+        return Caption.objects.create(image=image, text=text)
+
+    def test_iter_training_pairs(self):
+        self.add_caption(['dog', 'cat'], "A dog and a cat")
+        self.add_caption(['house'], "A house", status='REJECTED')
+        self.add_caption([], "Nothing to learn from")
+        self.assertEqual(list(iter_training_pairs(chunk_size=1)), [(['dog', 'cat'], "A dog and a cat")])
+
+    def test_retrain_publishes_version(self):
+        self.add_caption(['dog', 'cat'], "A dog and a cat")
+        self.add_caption(['house', 'tree'], "A house near a tree")
+
+        version = retrain_from_database(self.store)
+
+        self.assertEqual(self.store.current_version(), version)
+        _, generator = self.store.load()
+        self.assertEqual(generator.top_captions(['house'], k=1)[0][0], "A house near a tree")
+
+    @override_settings(CAPTION_RETRAIN_MAX_CLASSES=1)
+    def test_retrain_caps_classes(self):
+        for _ in range(3):
+            self.add_caption(['dog'], "A dog")
+        self.add_caption(['house'], "A house")
+
+        retrain_from_database(self.store)
+
+        _, generator = self.store.load()
+        self.assertEqual(list(generator.classes), ["A dog"])
+
+    def test_retrain_without_data(self):
+        self.assertIsNone(retrain_from_database(self.store))
+        self.assertIsNone(self.store.current_version())
+
+    def test_signature_changes_with_new_captions(self):
+        signature = training_data_signature()
+        self.add_caption(['dog'], "A dog")
+        self.assertNotEqual(training_data_signature(), signature)
+
+    def test_signature_changes_with_caption_edits(self):
+        caption = self.add_caption(['dog'], "A dog")
+        signature = training_data_signature()
+        caption.text = "A corrected dog caption"
+        caption.save()
+        self.assertNotEqual(training_data_signature(), signature)
+
+    def test_command(self):
+        self.add_caption(['dog', 'cat'], "A dog and a cat")
+        out = StringIO()
+        call_command('retrain_caption_model', '--chunk-size', '10', '--progress', stdout=out)
+        self.assertIn("counts: 1 examples", out.getvalue())
+        self.assertIn("Published caption model version 1", out.getvalue())
+        self.assertEqual(ModelStore().current_version(), 1)
+
+    def test_retrain_parallel_with_holdout(self):
+        for i in range(20):
+            self.add_caption([f"subject{i % 2}"], f"Caption {i % 2}")
+
+        version, report = retrain_parallel_from_database(self.store, workers=0, holdout=0.25)
+
+        self.assertEqual(self.store.current_version(), version)
+        self.assertGreater(report['examples'], 0)
+        self.assertEqual(report['accuracy'], 1.0)
+
+    def test_id_ranges_cover_training_captions(self):
+        captions = [self.add_caption([f"subject{i}"], f"Caption {i}") for i in range(10)]
+        self.add_caption(['house'], "A house", status='REJECTED')
+
+        ranges = training_id_ranges(3)
+
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[0][0], captions[0].id)
+        self.assertEqual(ranges[-1][1], captions[-1].id)
+        self.assertTrue(all(end + 1 == start for (_, end), (start, _) in zip(ranges, ranges[1:])))
+        shards = [(first_id, last_id, 2, 0.0, False) for first_id, last_id in ranges]
+        self.assertEqual([pair for shard in shards for pair in iter_shard_pairs(shard)], list(iter_training_pairs()))
+        self.assertEqual(training_id_ranges(20), [(caption.id, caption.id) for caption in captions])
+
+    def test_holdout_is_chosen_by_caption_id(self):
+        captions = [self.add_caption([f"subject{i}"], f"Caption {i}") for i in range(40)]
+        (first_id, last_id), = training_id_ranges(1)
+
+        training = list(iter_shard_pairs((first_id, last_id, 7, 0.25, False)))
+        evaluation = list(iter_shard_pairs((first_id, last_id, 7, 0.25, True)))
+
+        expected = [(caption.image.labels, caption.text) for caption in captions if is_held_out(caption.id, 0.25)]
+        self.assertEqual(evaluation, expected)
+        self.assertEqual(len(training) + len(evaluation), 40)
+        self.assertTrue(0 < len(evaluation) < 40)
+        self.assertFalse(is_held_out(captions[0].id, 0.0))
+
+    def test_sharded_database_training_matches_single_pass(self):
+        for i in range(30):
+            self.add_caption([f"subject{i % 4}", f"place{i % 3}"], f"Caption {i % 4}")
+        expected = CustomCaptionGenerator()
+        expected.train(*map(list, zip(*iter_training_pairs())))
+
+        shards = [(first_id, last_id, 4, 0.0, False) for first_id, last_id in training_id_ranges(3)]
+        generator = train_sharded(shards, iter_shard_pairs, workers=0, batch_size=4)
+
+        self.assertEqual(list(generator.classes), list(expected.classes))
+        query = [["subject1"], ["place2", "subject3"]]
+        self.assertTrue(((generator.predict_proba(query) - expected.predict_proba(query)) ** 2).sum() < 1e-12)
+
+    def test_retrain_parallel_does_not_load_the_corpus(self):
+        self.add_caption(['dog'], "A dog")
+        with patch('api.training.iter_training_pairs', side_effect=AssertionError("loaded the whole corpus")):
+            version, report = retrain_parallel_from_database(self.store, workers=0)
+        self.assertEqual(self.store.current_version(), version)
+        self.assertIsNone(report)
@@ -0,0 +1,56 @@
+import tempfile
+from unittest.mock import patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from api.digests import content_digest
+from api.models import Image
+from api.model_registry import reset_caption_generator
+from api.tests.offline import OfflineVisionMixin
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CAPTION_MODEL_DIR=tempfile.mkdtemp())
+@patch('api.views.ImageViewSet.process_image_with_rekognition')
+class StreamingUploadTestCase(OfflineVisionMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_caption_generator()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        reset_caption_generator()
+
+    def upload(self, content):
+        image = SimpleUploadedFile("test_image.jpg", content, content_type="image/jpeg")
+        return self.client.post('/api/images/upload_image/', {'image': image}, format='multipart')
+
+    def test_upload_is_hashed_while_streaming(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        content = b'fake image content' * 10000
+
+        with patch('api.views.file_digest') as mock_file_digest:
+            response = self.upload(content)
+
+        self.assertEqual(response.status_code, 201)
+        mock_file_digest.assert_not_called()
+        image = Image.objects.get(id=response.data['id'])
+        self.assertEqual(image.content_hash, content_digest([content]))
+        with image.image.open('rb') as f:
+            self.assertEqual(f.read(), content)
+
+    def test_vision_backend_receives_temporary_file(self, mock_process_image):
+        mock_process_image.return_value = (['person', 'dog'], False, 0.1)
+        self.upload(b'fake image content')
+
+        uploaded_file = mock_process_image.call_args[0][0]
+        self.assertTrue(hasattr(uploaded_file, 'temporary_file_path'))
+
+    @override_settings(MAX_IMAGE_UPLOAD_SIZE=1024)
+    def test_oversized_upload_is_rejected(self, mock_process_image):
+        response = self.upload(b'x' * 4096)
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(Image.objects.count(), 0)
+        mock_process_image.assert_not_called()
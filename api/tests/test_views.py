@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import patch
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient, APITestCase
@@ -28,10 +29,15 @@ class ImageUploadTestCase(APITestCase):
         print(f"Resolved URL for upload_image: {url}")
         with open('api/tests/test_image.jpg', 'rb') as image:
             # Mock Rekognition to detect NSFW content
-            ImageViewSet.process_image_with_rekognition = lambda self, image_bytes: ([], True, 95.0)
-            response = self.client.post(url, {'image': image}, format='multipart')
+            with patch.object(ImageViewSet, 'process_image_with_rekognition',
+                              lambda self, image_bytes, digest=None: ([], True, 95.0)):
+                response = self.client.post(url, {'image': image}, format='multipart')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(Image.objects.count(), 0)
+        self.assertEqual(response.data, {"error": "NSFW image detected and rejected"})
+        # The rejection is recorded, without the file or a caption.
+        image = Image.objects.get()
+        self.assertEqual((image.status, image.is_nsfw), ('REJECTED', True))
+        self.assertFalse(image.image)
         self.assertEqual(Caption.objects.count(), 0)
 
     def test_update_caption(self):
@@ -0,0 +1,79 @@
+import io
+from unittest.mock import patch
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PIL import Image as PILImage
+from api.local_vision import analyze_locally
+from api.vision import (LocalBackend, RekognitionBackend, VisionBackend, analyze_image, get_vision_backend,
+                        reset_vision_backend)
+
+def encode_image(color, size=(64, 32), image_format='PNG'):
+    buffer = io.BytesIO()
+    PILImage.new('RGB', size, color).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+class LocalVisionTestCase(TestCase):
+    def test_colour_and_orientation_labels(self):
+        labels, is_nsfw, nsfw_score = analyze_locally(encode_image((0, 0, 255)), 64, 90)
+        self.assertIn('Landscape', labels)
+        self.assertIn('Blue', labels)
+        self.assertIn('Colorful', labels)
+        self.assertFalse(is_nsfw)
+        self.assertEqual(nsfw_score, 0)
+
+    def test_monochrome_and_dark(self):
+        labels, _, _ = analyze_locally(encode_image((10, 10, 10), size=(32, 64)), 64, 90)
+        self.assertEqual(labels, ['Portrait', 'Dark', 'Monochrome'])
+
+    def test_skin_dominated_image_is_flagged(self):
+        labels, is_nsfw, nsfw_score = analyze_locally(encode_image((224, 172, 105)), 64, 90)
+        self.assertTrue(is_nsfw)
+        self.assertEqual(nsfw_score, 100)
+
+    def test_exif_photo(self):
+        with open('api/tests/test_image.jpg', 'rb') as f:
+            labels, _, _ = analyze_locally(f.read(), 128, 90)
+        self.assertIn('Photo', labels)
+        self.assertIn('Landscape', labels)
+
+    def test_undecodable_bytes(self):
+        with self.assertRaises(Exception):
+            analyze_locally(b'fake image content', 64, 90)
+
+    @override_settings(VISION_LOCAL_WORKERS=1)
+    def test_process_pool(self):
+        backend = LocalBackend()
+        self.assertIn('Blue', backend.detect_labels(encode_image((0, 0, 255))))
+        backend.get_executor().shutdown()
+
+class VisionBackendSelectionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_vision_backend()
+
+    def tearDown(self):
+        cache.clear()
+        reset_vision_backend()
+
+    @override_settings(VISION_BACKEND='api.vision.LocalBackend', VISION_LOCAL_WORKERS=0)
+    def test_local_backend_from_settings(self):
+        self.assertIsInstance(get_vision_backend(), LocalBackend)
+        result = analyze_image(encode_image((255, 0, 0)))
+        self.assertIn('Red', result[0])
+
+    @override_settings(VISION_BACKEND='api.vision.RekognitionBackend', REKOGNITION_BACKEND='stub')
+    @patch('api.rekognition._client', None)
+    def test_rekognition_backend_from_settings(self):
+        self.assertIsInstance(get_vision_backend(), RekognitionBackend)
+
+    def test_base_backend_analyze(self):
+        class FixedBackend(VisionBackend):
+            name = 'fixed'
+
+            def detect_moderation(self, image_bytes):
+                return False, 1.0
+
+            def detect_labels(self, image_bytes):
+                return ['Tree']
+
+        self.assertEqual(FixedBackend().analyze(b'image'), (['Tree'], False, 1.0))
@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import os
+from itertools import islice
+from django.conf import settings
+from django.db.models import Count, Max
+from .caption_generator import CustomCaptionGenerator
+from .model_store import ModelStore
+from .models import Caption
+from .parallel_training import evaluate_sharded, setup_django_worker, train_sharded
+
+logger = logging.getLogger(__name__)
+
+
+def training_captions():
+    """:return: Queryset of the captions a model is trained on, those of accepted images."""
+    return Caption.objects.filter(image__status='ACCEPTED')
+
+
+def iter_training_pairs(chunk_size=None):
+    """
+    Streams (labels, caption) pairs for accepted images from the database.
+
+    Rows are fetched with a server-side iterator in chunks, so memory does not grow with
+    the size of the tables. Images without labels are skipped.
+
+    :param chunk_size: Rows fetched per query; defaults to CAPTION_RETRAIN_CHUNK_SIZE.
+    :return: Iterator of (labels, caption text) tuples.
+    """
+    pairs = (
+        training_captions()
+        .order_by('id')
+        .values_list('image__labels', 'text')
+        .iterator(chunk_size=chunk_size or settings.CAPTION_RETRAIN_CHUNK_SIZE)
+    )
+    for labels, text in pairs:
+        if labels:
+            yield labels, text
+
+
+def is_held_out(caption_id, holdout):
+    """
+    Decides from a stable hash of the caption id whether a pair is reserved for evaluation.
+
+    :param caption_id: Primary key of the caption.
+    :param holdout: Fraction of pairs reserved for evaluation.
+    :return: True if the pair is held out of training.
+    """
+    if holdout <= 0:
+        return False
+    digest = hashlib.blake2b(str(caption_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64 < holdout
+
+
+def training_id_ranges(n_ranges):
+    """
+    Splits the training captions into contiguous id ranges of near-equal row counts.
+
+    :param n_ranges: Number of ranges wanted.
+    :return: List of (first id, last id) tuples covering every training caption; empty when there are none.
+    """
+    ids = training_captions().order_by('id').values_list('id', flat=True)
+    count = ids.count()
+    if not count:
+        return []
+    n_ranges = max(1, min(n_ranges, count))
+    starts = [ids[count * i // n_ranges] for i in range(n_ranges)]
+    ends = [start - 1 for start in starts[1:]] + [ids.last()]
+    return list(zip(starts, ends))
+
+
+def iter_shard_pairs(shard):
+    """
+    Streams the (labels, caption) pairs of one id range, for retrain_parallel_from_database workers.
+
+    :param shard: Tuple of (first id, last id, rows per query, holdout fraction, held_out), where
+        held_out selects the evaluation pairs instead of the training pairs.
+    :return: Iterator of (labels, caption text) tuples.
+    """
+    first_id, last_id, chunk_size, holdout, held_out = shard
+    rows = (
+        training_captions()
+        .filter(id__gte=first_id, id__lte=last_id)
+        .order_by('id')
+        .values_list('id', 'image__labels', 'text')
+        .iterator(chunk_size=chunk_size)
+    )
+    for caption_id, labels, text in rows:
+        if labels and is_held_out(caption_id, holdout) == held_out:
+            yield labels, text
+
+
+def iter_training_batches(chunk_size=None):
+    """
+    Groups iter_training_pairs() into lists for CustomCaptionGenerator.train_streaming.
+
+    :param chunk_size: Pairs per batch and rows per query; defaults to CAPTION_RETRAIN_CHUNK_SIZE.
+    :return: Iterator of lists of (labels, caption text) tuples.
+    """
+    chunk_size = chunk_size or settings.CAPTION_RETRAIN_CHUNK_SIZE
+    pairs = iter_training_pairs(chunk_size)
+    while True:
+        batch = list(islice(pairs, chunk_size))
+        if not batch:
+            return
+        yield batch
+
+
+def training_data_signature():
+    """
+    Summarises the training data so scheduled retrains can skip unchanged tables.
+
+    Includes the latest caption edit, so corrections made through update_caption trigger
+    a retrain even though they add no rows.
+
+    :return: Tuple of (caption count, latest caption id, latest caption update time).
+    """
+    summary = training_captions().aggregate(
+        count=Count('id'), latest_id=Max('id'), latest_update=Max('updated_at')
+    )
+    return summary['count'], summary['latest_id'], summary['latest_update']
+
+
+def retrain_from_database(store=None, chunk_size=None, progress=None, max_classes=None):
+    """
+    Trains a new caption model from every stored Image/Caption pair and publishes it.
+
+    Training streams the tables twice in chunks (see CustomCaptionGenerator.train_streaming),
+    so memory does not grow with the number of images, only with the distinct captions kept
+    times the vocabulary. Workers pick the new version up on their next refresh of the model
+    store.
+
+    :param store: ModelStore to publish to; defaults to ModelStore().
+    :param chunk_size: Rows fetched per query; defaults to CAPTION_RETRAIN_CHUNK_SIZE.
+    :param progress: Optional progress callback passed to train_streaming.
+    :param max_classes: Most frequent captions to keep; defaults to CAPTION_RETRAIN_MAX_CLASSES.
+    :return: The published version number, or None if there was nothing to train on.
+    """
+    max_classes = settings.CAPTION_RETRAIN_MAX_CLASSES if max_classes is None else max_classes
+    generator = CustomCaptionGenerator()
+    trained = generator.train_streaming(lambda: iter_training_batches(chunk_size), progress=progress,
+                                        max_classes=max_classes)
+    if not trained:
+        return None
+
+    store = store if store is not None else ModelStore()
+    version = store.save(generator)
+    logger.info(f"Published caption model version {version} trained on {trained} captions")
+    return version
+
+
+def retrain_parallel_from_database(store=None, workers=None, holdout=0.0, chunk_size=None):
+    """
+    Trains a new caption model on a process pool and publishes it.
+
+    The captions are split into CAPTION_TRAINING_WORKERS id ranges and each worker streams
+    its own range from the database, so neither this process nor the workers hold the
+    corpus in memory. A ``holdout`` fraction of the pairs, chosen by a hash of the caption
+    id, is kept out of training and scored in parallel afterwards.
+
+    :param store: ModelStore to publish to; defaults to ModelStore().
+    :param workers: Worker processes; defaults to CAPTION_TRAINING_WORKERS.
+    :param holdout: Fraction of pairs reserved for evaluation.
+    :param chunk_size: Rows fetched per query; defaults to CAPTION_RETRAIN_CHUNK_SIZE.
+    :return: Tuple of (published version or None, evaluation dict or None).
+    """
+    workers = settings.CAPTION_TRAINING_WORKERS if workers is None else workers
+    chunk_size = chunk_size or settings.CAPTION_RETRAIN_CHUNK_SIZE
+    ranges = training_id_ranges(max(workers, 1))
+    # Spawned workers start without Django; inline runs already have it set up.
+    setup, setup_args = (setup_django_worker, (os.environ['DJANGO_SETTINGS_MODULE'],)) if workers > 0 else (None, ())
+
+    shards = [(first_id, last_id, chunk_size, holdout, False) for first_id, last_id in ranges]
+    generator = train_sharded(shards, iter_shard_pairs, workers, setup=setup, setup_args=setup_args,
+                              batch_size=chunk_size)
+    if generator is None:
+        return None, None
+
+    report = None
+    if holdout > 0:
+        shards = [(first_id, last_id, chunk_size, holdout, True) for first_id, last_id in ranges]
+        report = evaluate_sharded(generator, shards, iter_shard_pairs, workers, setup=setup, setup_args=setup_args,
+                                  batch_size=chunk_size)
+        if not report['examples']:
+            report = None
+
+    store = store if store is not None else ModelStore()
+    version = store.save(generator)
+    logger.info(f"Published caption model version {version} trained on {generator.n_documents} captions")
+    return version, report
@@ -0,0 +1,49 @@
+import hashlib
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from .digests import DIGEST_SIZE
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams uploads to a temporary file while hashing and size-checking each chunk.
+
+    Completed files carry a ``content_hash`` attribute with the same digest
+    ``digests.file_digest`` would compute, so views never have to re-read them. Files over
+    MAX_IMAGE_UPLOAD_SIZE (UPLOAD_BATCH_MAX_ARCHIVE_SIZE for the batch ``archive`` field) are
+    dropped as soon as the limit is crossed and listed per form field in
+    ``request.rejected_uploads`` as (position, file name) pairs, the position being the file's
+    index among that field's files in the request.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.field_positions = {}
+
+    def size_limit(self):
+        if self.field_name == 'archive':
+            return settings.UPLOAD_BATCH_MAX_ARCHIVE_SIZE
+        return settings.MAX_IMAGE_UPLOAD_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        self.received = 0
+        self.limit = self.size_limit()
+        self.position = self.field_positions.get(self.field_name, 0)
+        self.field_positions[self.field_name] = self.position + 1
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.limit:
+            if not hasattr(self.request, 'rejected_uploads'):
+                self.request.rejected_uploads = {}
+            self.request.rejected_uploads.setdefault(self.field_name, []).append((self.position, self.file_name))
+            raise SkipFile()
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.content_hash = self.hasher.hexdigest()
+        return uploaded_file
@@ -0,0 +1,76 @@
+import logging
+from django.conf import settings
+from rest_framework import status
+from .metrics import UPLOADS_TOTAL
+from .models import Image
+
+logger = logging.getLogger(__name__)
+
+# Steps shared by the single-image upload views: ImageViewSet.handle_upload (DRF, sync) and
+# async_views.handle_upload (native coroutine). Helpers return plain (body, status) pairs so
+# each view wraps them in its own response class; only the awaited calls differ between them.
+
+NSFW_REJECTED = "NSFW image detected and rejected"
+
+
+def upload_error(message, response_status, outcome=None):
+    """
+    Builds the answer to an upload that is not processed.
+
+    :param message: Error shown to the client.
+    :param response_status: HTTP status code.
+    :param outcome: UPLOADS_TOTAL outcome to count the upload under, if any.
+    :return: Tuple of (body, status).
+    """
+    if outcome is not None:
+        UPLOADS_TOTAL.labels(outcome=outcome).inc()
+    return {"error": message}, response_status
+
+
+def upload_failure(message, response_status, outcome):
+    """Logs and counts an upload that failed while being processed. :return: Tuple of (body, status)."""
+    logger.error(message)
+    return upload_error(message, response_status, outcome)
+
+
+def check_upload(image_file, rejected_uploads):
+    """
+    Rejects requests without a usable ``image`` file.
+
+    :param image_file: The uploaded file, or None.
+    :param rejected_uploads: Field names rejected by the upload handlers for exceeding the size limit.
+    :return: Tuple of (body, status) to answer with, or None if the upload can be processed.
+    """
+    if 'image' in rejected_uploads:
+        return upload_error(f"Image exceeds the {settings.MAX_IMAGE_UPLOAD_SIZE} byte upload limit",
+                            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, 'too_large')
+    if not image_file:
+        return upload_error("No image provided", status.HTTP_400_BAD_REQUEST, 'missing')
+    return None
+
+
+def use_async_pipeline(query_params):
+    """Async mode is chosen per request with ?async=, falling back to the ASYNC_UPLOADS setting."""
+    requested = query_params.get('async')
+    if requested is None:
+        return settings.ASYNC_UPLOADS
+    return requested.lower() in ('1', 'true', 'yes')
+
+
+def analysed_image(user, digest, labels, is_nsfw, nsfw_score):
+    """:return: Unsaved Image holding a vision result, accepted unless it was flagged as NSFW."""
+    return Image(
+        user=user,
+        labels=labels,
+        content_hash=digest,
+        is_nsfw=is_nsfw,
+        nsfw_score=nsfw_score,
+        status='REJECTED' if is_nsfw else 'ACCEPTED'
+    )
+
+
+def with_caption(image_data, caption):
+    """Adds the caption to serialized image data, when there is one. :return: The image data."""
+    if caption is not None:
+        image_data['caption'] = {'text': caption.text}
+    return image_data
@@ -1,10 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import upload_image_async
 from .views import ImageViewSet
 
 router = DefaultRouter()
 router.register(r'images', ImageViewSet, basename='image')
 
 urlpatterns = [
+    # Ahead of the router, whose detail route would otherwise match this path.
+    path('images/upload_image_async/', upload_image_async, name='image-upload_image_async'),
     path('', include(router.urls)),
 ]
@@ -1,95 +1,376 @@
+import json
 import logging
-from django.core.files.base import ContentFile
-from django.core.cache import cache
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from django.core.files.base import File
+from django.db import transaction
+from django.db.models import Count
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Image, Caption
-from .serializers import ImageSerializer
+from .models import Image, Caption, ImageLabel, normalize_label
+from .pagination import FeedCursorPagination, ImageCursorPagination
+from .serializers import FeedImageSerializer, ImageSerializer
 from django.conf import settings
-import boto3
-from botocore.exceptions import ClientError
-from .caption_generator import CustomCaptionGenerator
+from .digests import file_digest
+from .metrics import UPLOADS_TOTAL, time_stage
+from .model_registry import get_caption_generator
+from .pipeline import copy_processed_image, enqueue_image, find_processed_duplicate, find_processed_duplicates
+from .renditions import get_rendition, schedule_renditions
+from .uploads import (
+    NSFW_REJECTED, analysed_image, check_upload, upload_error, upload_failure, use_async_pipeline, with_caption
+)
+from .vision import analyze_image, get_vision_backend
 
 logger = logging.getLogger(__name__)
 
+BATCH_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff')
+
 class ImageViewSet(viewsets.ModelViewSet):
     queryset = Image.objects.select_related('user').all()
     serializer_class = ImageSerializer
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.rekognition_client = boto3.client('rekognition',
-                                               aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                                               aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                                               region_name=settings.AWS_REGION)
-        self.caption_generator = CustomCaptionGenerator()
+        self.vision_backend = get_vision_backend()
+        self.caption_generator = get_caption_generator()
 
     @action(detail=False, methods=['post'], url_path='upload_image', url_name='upload_image')
     def upload_image(self, request):
+        with time_stage('total'):
+            return self.handle_upload(request)
+
+    def handle_upload(self, request):
+        """Validates, analyses, stores and captions a single upload, recording per-stage metrics."""
         image_file = request.FILES.get('image')
-        if not image_file:
-            return Response({"error": "No image provided"}, status=status.HTTP_400_BAD_REQUEST)
+        rejection = check_upload(image_file, getattr(request, 'rejected_uploads', {}))
+        if rejection is not None:
+            return Response(*rejection)
+
+        # HashingUploadHandler digests the file while it streams in; other handlers need a pass over it.
+        digest = getattr(image_file, 'content_hash', None)
+        if not digest:
+            with time_stage('digest'):
+                digest = file_digest(image_file)
+        with time_stage('duplicate_lookup'):
+            duplicate = find_processed_duplicate(digest, request.user)
+        if duplicate is not None:
+            UPLOADS_TOTAL.labels(outcome='duplicate').inc()
+            return self.reuse_duplicate(request, duplicate)
+
+        if use_async_pipeline(request.query_params):
+            UPLOADS_TOTAL.labels(outcome='queued').inc()
+            return self.queue_image(request, image_file, digest)
 
         try:
-            image_bytes = image_file.read()
-            labels, is_nsfw, nsfw_score = self.process_image_with_rekognition(image_bytes)
+            labels, is_nsfw, nsfw_score = self.process_image_with_rekognition(image_file, digest=digest)
         except Exception as e:
-            logger.error(f"Error processing image: {str(e)}")
-            return Response({"error": f"Error processing image: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
-
-        image = Image(
-            user=request.user,
-            is_nsfw=is_nsfw,
-            nsfw_score=nsfw_score,
-            status='REJECTED' if is_nsfw else 'ACCEPTED'
-        )
+            return Response(*upload_failure(f"Error processing image: {str(e)}", status.HTTP_400_BAD_REQUEST,
+                                            'vision_error'))
 
+        image = analysed_image(request.user, digest, labels, is_nsfw, nsfw_score)
         if not is_nsfw:
-            image.image.save(image_file.name, ContentFile(image_bytes), save=False)
-        image.save()
+            image_file.seek(0)
+            with time_stage('storage'):
+                image.store_file(image_file.name, image_file)
+        with time_stage('db_write'):
+            image.save()
 
         if is_nsfw:
-            return Response({"error": "NSFW image detected and rejected"}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(*upload_error(NSFW_REJECTED, status.HTTP_400_BAD_REQUEST, 'rejected_nsfw'))
 
         try:
-            caption_text = self.caption_generator.generate_improved_caption(labels)
-            caption = Caption.objects.create(image=image, text=caption_text)
+            with time_stage('caption'):
+                caption_text = self.caption_generator.generate_improved_caption(labels)
+            with time_stage('db_write'):
+                caption = Caption.objects.create(image=image, text=caption_text, generated_text=caption_text)
 
             # Train the model with the new image's labels and generated caption
-            self.caption_generator.update_model(labels, caption_text)
+            with time_stage('update_model'):
+                self.caption_generator.update_model(labels, caption_text)
+            schedule_renditions(image.id)
+
+        except Exception as e:
+            return Response(*upload_failure(f"Error generating caption: {str(e)}",
+                                            status.HTTP_500_INTERNAL_SERVER_ERROR, 'caption_error'))
+
+        UPLOADS_TOTAL.labels(outcome='accepted').inc()
+        return Response(with_caption(self.get_serializer(image).data, caption), status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='upload_batch', url_name='upload_batch')
+    def upload_batch(self, request):
+        """
+        Uploads many images at once, sent as repeated ``images`` files and/or a zip ``archive``.
+
+        Items are moderated and labelled on a bounded thread pool and written in chunks with
+        bulk_create. Results are streamed back as one JSON object per line, in upload order.
+        """
+        image_files = request.FILES.getlist('images')
+        archive_file = request.FILES.get('archive')
+        rejected_uploads = getattr(request, 'rejected_uploads', {})
+        if 'archive' in rejected_uploads:
+            limit = settings.UPLOAD_BATCH_MAX_ARCHIVE_SIZE
+            return Response({"error": f"Archive exceeds the {limit} byte upload limit"},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        rejected_images = rejected_uploads.get('images', [])
+        if not image_files and not archive_file and not rejected_images:
+            return Response({"error": "No images provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+        archive_members = []
+        if archive_file:
+            try:
+                archive = zipfile.ZipFile(archive_file)
+            except zipfile.BadZipFile:
+                return Response({"error": "Archive is not a valid zip file"}, status=status.HTTP_400_BAD_REQUEST)
+            archive_members = [
+                member for member in archive.infolist()
+                if not member.is_dir() and member.filename.lower().endswith(BATCH_IMAGE_EXTENSIONS)
+            ]
+
+        if len(image_files) + len(archive_members) + len(rejected_images) > settings.UPLOAD_BATCH_MAX_ITEMS:
+            return Response({"error": f"A batch may contain at most {settings.UPLOAD_BATCH_MAX_ITEMS} images"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        too_large = f"Image exceeds the {settings.MAX_IMAGE_UPLOAD_SIZE} byte upload limit"
+        # Rejected files are put back where they were sent, so results stay in upload order.
+        rejected_at = dict(rejected_images)
+        accepted = iter(image_files)
+        uploads = []
+        for position in range(len(image_files) + len(rejected_images)):
+            if position in rejected_at:
+                uploads.append((rejected_at[position], None, too_large))
+            else:
+                image_file = next(accepted)
+                uploads.append((image_file.name, lambda image_file=image_file: image_file, None))
+        for member in archive_members:
+            name = member.filename.rsplit('/', 1)[-1]
+            # file_size comes from the archive's directory, and zipfile never decompresses past it.
+            if member.file_size > settings.MAX_IMAGE_UPLOAD_SIZE:
+                uploads.append((name, None, too_large))
+            else:
+                uploads.append((name, lambda member=member, name=name: File(archive.open(member), name=name), None))
+
+        return StreamingHttpResponse(self.stream_batch_results(request.user, uploads),
+                                     content_type='application/x-ndjson')
+
+    def stream_batch_results(self, user, uploads):
+        """Yields one NDJSON line per upload, processing UPLOAD_BATCH_CHUNK_SIZE items at a time."""
+        uploads = iter(uploads)
+        with ThreadPoolExecutor(max_workers=settings.UPLOAD_BATCH_WORKERS) as executor:
+            while True:
+                chunk = list(islice(uploads, settings.UPLOAD_BATCH_CHUNK_SIZE))
+                if not chunk:
+                    break
+                for result in self.create_batch_images(user, chunk, executor):
+                    yield json.dumps(result, default=str) + '\n'
+
+    def create_batch_images(self, user, chunk, executor):
+        """
+        Analyses one chunk of uploads concurrently and bulk-creates their Image and Caption rows.
+
+        Items are read from their files rather than loaded into memory up front; uploads carry the
+        digest computed by HashingUploadHandler. Items whose content was already processed reuse
+        that image, as in handle_upload, instead of being analysed again.
+
+        :param user: Owner of the uploaded images.
+        :param chunk: List of (file name, callable opening a Django File, error); items rejected
+            before processing have no callable and an error message.
+        :param executor: Executor used to fan out the vision calls.
+        :return: List of per-item result dicts, in chunk order.
+        """
+        files = [open_file() if open_file is not None else None for _, open_file, _ in chunk]
+        try:
+            return self._create_batch_images(user, chunk, files, executor)
+        finally:
+            for image_file in files:
+                if image_file is not None:
+                    image_file.close()
+
+    def _create_batch_images(self, user, chunk, files, executor):
+        digests = [
+            (getattr(image_file, 'content_hash', None) or file_digest(image_file)) if image_file is not None else None
+            for image_file in files
+        ]
+        # Content that was already processed is reused as in handle_upload, without analysing it again.
+        duplicates = find_processed_duplicates([digest for digest in digests if digest is not None], user)
+        analyses = list(executor.map(self.analyze_batch_item,
+                                     [None if digest in duplicates else image_file
+                                      for image_file, digest in zip(files, digests)],
+                                     digests))
 
+        entries = []
+        new_images = []
+        captions = {}
+        for (name, _, error), image_file, digest, analysis in zip(chunk, files, digests, analyses):
+            if error:
+                UPLOADS_TOTAL.labels(outcome='too_large').inc()
+                entries.append((name, None, error))
+                continue
+            duplicate = duplicates.get(digest)
+            if duplicate is not None:
+                UPLOADS_TOTAL.labels(outcome='duplicate').inc()
+                image = duplicate if duplicate.user_id == user.id else copy_processed_image(duplicate, user)
+                # Own images keep the caption joined by find_processed_duplicates; copies get their own.
+                captions[image.id] = getattr(image, 'caption', None)
+                entries.append((name, image, NSFW_REJECTED if image.is_nsfw else None))
+                continue
+            if isinstance(analysis, Exception):
+                UPLOADS_TOTAL.labels(outcome='vision_error').inc()
+                entries.append((name, None, f"Error processing image: {str(analysis)}"))
+                continue
+            labels, is_nsfw, nsfw_score = analysis
+            image = analysed_image(user, digest, labels, is_nsfw, nsfw_score)
+            if not is_nsfw:
+                image_file.seek(0)
+                image.store_file(name, image_file)
+            new_images.append(image)
+            entries.append((name, image, NSFW_REJECTED if is_nsfw else None))
+
+        created_captions = {}
+        save_error = None
+        try:
+            with transaction.atomic():
+                Image.objects.bulk_create(new_images)
+                ImageLabel.objects.bulk_create([row for image in new_images for row in ImageLabel.rows_for(image)])
+                accepted = [image for image in new_images if not image.is_nsfw]
+                caption_texts = self.caption_generator.generate_improved_captions([image.labels for image in accepted])
+                for image, text in zip(accepted, caption_texts):
+                    created_captions[image.id] = Caption(image=image, text=text, generated_text=text)
+                Caption.objects.bulk_create(created_captions.values())
         except Exception as e:
-            logger.error(f"Error generating caption: {str(e)}")
-            return Response({"error": f"Error generating caption: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            logger.error(f"Error saving image batch: {str(e)}")
+            UPLOADS_TOTAL.labels(outcome='save_error').inc(len(new_images))
+            save_error = f"Error saving image: {str(e)}"
+            created_captions = {}
+        captions.update(created_captions)
+
+        # Train the model with the new images' labels and generated captions
+        for caption in created_captions.values():
+            self.caption_generator.update_model(caption.image.labels, caption.text)
+            schedule_renditions(caption.image.id)
+        if save_error is None:
+            for image in new_images:
+                UPLOADS_TOTAL.labels(outcome='rejected_nsfw' if image.is_nsfw else 'accepted').inc()
+
+        unsaved = {id(image) for image in new_images} if save_error is not None else set()
+        results = []
+        for name, image, error in entries:
+            if id(image) in unsaved:
+                result = {"name": name, "error": save_error}
+            elif image is None or error:
+                result = {"name": name, "error": error}
+                if image is not None:
+                    result['id'] = image.id
+            else:
+                result = dict(with_caption(self.get_serializer(image).data, captions.get(image.id)), name=name)
+            results.append(result)
+        return results
+
+    def analyze_batch_item(self, image_file, digest):
+        """Runs the vision calls for one batch item, returning the exception instead of raising it."""
+        if image_file is None:
+            return None
+        try:
+            return self.process_image_with_rekognition(image_file, digest=digest)
+        except Exception as e:
+            logger.error(f"Error processing image: {str(e)}")
+            return e
+
+    def reuse_duplicate(self, request, duplicate):
+        """
+        Answers an upload whose content was already processed without storing or analysing it again.
+
+        The user's own earlier image is returned as-is; otherwise a new row shares its blob,
+        labels, moderation result and generated caption.
+        """
+        if duplicate.user_id == request.user.id:
+            image, response_status = duplicate, status.HTTP_200_OK
+        else:
+            image, response_status = copy_processed_image(duplicate, request.user), status.HTTP_201_CREATED
+
+        if image.is_nsfw:
+            return Response(*upload_error(NSFW_REJECTED, status.HTTP_400_BAD_REQUEST))
+        # Own images keep the caption joined by processed_duplicates; copies get their own.
+        return Response(with_caption(self.get_serializer(image).data, getattr(image, 'caption', None)),
+                        status=response_status)
+
+    def queue_image(self, request, image_file, digest):
+        """Stores the upload as PENDING and leaves moderation and captioning to the upload workers."""
+        image = Image(user=request.user, status='PENDING', content_hash=digest)
+        image.store_file(image_file.name, image_file)
+        image.save()
+        enqueue_image(image.id)
 
         serializer = self.get_serializer(image)
-        image_data = serializer.data
-        image_data['caption'] = {'text': caption.text}  # Add the caption to the response data
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    def process_image_with_rekognition(self, image_bytes, digest=None):
+        """
+        Moderates and labels an image with the configured vision backend.
 
-        return Response(image_data, status=status.HTTP_201_CREATED)
+        :param image_bytes: Image bytes, or an uploaded file positioned at the start of the image.
+        :param digest: Content digest of the image, if already computed.
+        :return: Tuple of (labels, is_nsfw, nsfw_score).
+        """
+        with time_stage('vision'):
+            return analyze_image(image_bytes, digest=digest, backend=self.vision_backend)
 
-    def process_image_with_rekognition(self, image_bytes):
-        cache_key = f"rekognition_{hash(image_bytes)}"
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            return cached_result
+    @action(detail=True, methods=['get'], url_path=r'renditions/(?P<name>[\w-]+)', url_name='rendition')
+    def rendition(self, request, pk=None, name=None):
+        """Redirects to a resized copy of the image, generating it on first request."""
+        image = self.get_object()
+        if name not in settings.IMAGE_RENDITIONS:
+            return Response({"error": f"Unknown rendition: {name}"}, status=status.HTTP_404_NOT_FOUND)
+        if image.status != 'ACCEPTED' or not image.image:
+            return Response({"error": "Image is not available"}, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            moderation_response = self.rekognition_client.detect_moderation_labels(Image={'Bytes': image_bytes})
-            moderation_labels = moderation_response.get('ModerationLabels', [])
-            is_nsfw = any(label['ParentName'] in ['Explicit Nudity', 'Violence'] for label in moderation_labels)
-            nsfw_score = max([label['Confidence'] for label in moderation_labels]) if moderation_labels else 0
-
-            label_response = self.rekognition_client.detect_labels(Image={'Bytes': image_bytes})
-            labels = [label['Name'] for label in label_response['Labels']]
-            
-            result = (labels, is_nsfw, nsfw_score)
-            cache.set(cache_key, result, timeout=3600)  # Cache for 1 hour
-            return result
-        except ClientError as e:
-            logger.error(f"Error processing image with Rekognition: {e}")
-            raise
+            rendition = get_rendition(image, name)
+        except Exception as e:
+            logger.error(f"Error creating rendition: {str(e)}")
+            return Response({"error": f"Error creating rendition: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return HttpResponseRedirect(rendition.file.url)
+
+    @action(detail=False, methods=['get'], url_path='feed', url_name='feed')
+    def feed(self, request):
+        """
+        Lists the requesting user's images, newest first, with their captions.
+
+        Pages are keyset-paginated on (uploaded_at, id) using the matching composite index,
+        and captions are joined in the same query.
+        """
+        queryset = Image.objects.filter(user=request.user).select_related('user', 'caption')
+        paginator = FeedCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = FeedImageSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='search', url_name='search')
+    def search(self, request):
+        """
+        Finds accepted images by label through the ImageLabel index, newest first.
+
+        ``labels`` is a comma-separated list (or repeated parameter); ``mode=and`` (default)
+        requires every label, ``mode=or`` any of them. Results use cursor pagination.
+        """
+        names = {normalize_label(name) for value in request.query_params.getlist('labels')
+                 for name in value.split(',')} - {''}
+        mode = request.query_params.get('mode', 'and').lower()
+        if not names:
+            return Response({"error": "No labels provided"}, status=status.HTTP_400_BAD_REQUEST)
+        if mode not in ('and', 'or'):
+            return Response({"error": "mode must be 'and' or 'or'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        matches = ImageLabel.objects.filter(name__in=names)
+        if mode == 'and':
+            matches = matches.values('image_id').annotate(matched=Count('name')).filter(matched=len(names))
+        queryset = self.get_queryset().filter(status='ACCEPTED', id__in=matches.values('image_id'))
+
+        paginator = ImageCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
 
     @action(detail=True, methods=['post'], url_path='update_caption', url_name='update_caption')
     def update_caption(self, request, pk=None):
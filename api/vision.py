@@ -0,0 +1,313 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from .digests import content_digest, file_digest
+from .imaging import prepare_for_analysis
+from .local_vision import analyze_locally
+from .metrics import VISION_RESULTS_TOTAL, time_stage
+from .models import Image
+from .rekognition import get_async_rekognition_client, get_rekognition_client, get_rekognition_executor
+
+logger = logging.getLogger(__name__)
+
+VISION_CACHE_TIMEOUT = 3600  # Results are cached for 1 hour
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class VisionBackend:
+    """
+    Interface for services that moderate and label images.
+
+    Subclasses implement ``detect_moderation`` and ``detect_labels``; ``analyze`` combines
+    them and may be overridden to run both more efficiently. ``aanalyze`` is the coroutine
+    version used by async views, and runs ``analyze`` on a worker thread unless overridden.
+    """
+
+    name = None  # Used to namespace cached results
+
+    def detect_moderation(self, image_bytes):
+        """
+        Scores image bytes for unsafe content.
+
+        :return: Tuple of (is_nsfw, nsfw_score).
+        """
+        raise NotImplementedError
+
+    def detect_labels(self, image_bytes):
+        """
+        Describes image bytes.
+
+        :return: List of label names.
+        """
+        raise NotImplementedError
+
+    def analyze(self, image_bytes):
+        """
+        Moderates and labels image bytes.
+
+        :return: Tuple of (labels, is_nsfw, nsfw_score).
+        """
+        is_nsfw, nsfw_score = self.detect_moderation(image_bytes)
+        return self.detect_labels(image_bytes), is_nsfw, nsfw_score
+
+    async def aanalyze(self, image_bytes):
+        """
+        Moderates and labels image bytes without blocking the event loop.
+
+        :return: Tuple of (labels, is_nsfw, nsfw_score).
+        """
+        return await sync_to_async(self.analyze, thread_sensitive=False)(image_bytes)
+
+
+class RekognitionBackend(VisionBackend):
+    """
+    AWS Rekognition, through the shared pooled client.
+
+    Under ASGI, ``aanalyze`` issues both calls on the event loop's aiobotocore client when
+    aiobotocore is installed, and otherwise falls back to the boto3 client on a thread.
+    """
+
+    name = 'rekognition'
+
+    def __init__(self, client=None, async_client=None):
+        self._client = client
+        self.async_client = async_client
+        self._use_shared_async_client = client is None and async_client is None
+
+    @property
+    def client(self):
+        """The client given to the constructor, or the shared client, built on first use."""
+        return self._client if self._client is not None else get_rekognition_client()
+
+    @staticmethod
+    def moderation_result(moderation_response):
+        """:return: Tuple of (is_nsfw, nsfw_score) for a DetectModerationLabels response."""
+        moderation_labels = moderation_response.get('ModerationLabels', [])
+        is_nsfw = any(label['ParentName'] in ['Explicit Nudity', 'Violence'] for label in moderation_labels)
+        nsfw_score = max([label['Confidence'] for label in moderation_labels]) if moderation_labels else 0
+        return is_nsfw, nsfw_score
+
+    @staticmethod
+    def label_names(label_response):
+        """:return: List of label names in a DetectLabels response."""
+        return [label['Name'] for label in label_response['Labels']]
+
+    def detect_moderation(self, image_bytes):
+        return self.moderation_result(self.client.detect_moderation_labels(Image={'Bytes': image_bytes}))
+
+    def detect_labels(self, image_bytes):
+        return self.label_names(self.client.detect_labels(Image={'Bytes': image_bytes}))
+
+    async def get_async_client(self):
+        """:return: The async client to use, or None to fall back to the boto3 client on a thread."""
+        if self._use_shared_async_client:
+            return await get_async_rekognition_client()
+        return self.async_client
+
+    async def aanalyze(self, image_bytes):
+        client = await self.get_async_client()
+        if client is None:
+            return await super().aanalyze(image_bytes)
+
+        async def detect_moderation():
+            return self.moderation_result(await client.detect_moderation_labels(Image={'Bytes': image_bytes}))
+
+        async def detect_labels():
+            return self.label_names(await client.detect_labels(Image={'Bytes': image_bytes}))
+
+        if settings.REKOGNITION_SKIP_LABELS_ON_NSFW:
+            is_nsfw, nsfw_score = await detect_moderation()
+            labels = [] if is_nsfw else await detect_labels()
+            return labels, is_nsfw, nsfw_score
+
+        (is_nsfw, nsfw_score), labels = await asyncio.gather(detect_moderation(), detect_labels())
+        return labels, is_nsfw, nsfw_score
+
+    def analyze(self, image_bytes):
+        if settings.REKOGNITION_SKIP_LABELS_ON_NSFW:
+            # Serial, so label detection is never paid for on images that get rejected.
+            is_nsfw, nsfw_score = self.detect_moderation(image_bytes)
+            labels = [] if is_nsfw else self.detect_labels(image_bytes)
+            return labels, is_nsfw, nsfw_score
+
+        executor = get_rekognition_executor()
+        moderation_future = executor.submit(self.detect_moderation, image_bytes)
+        labels_future = executor.submit(self.detect_labels, image_bytes)
+        is_nsfw, nsfw_score = moderation_future.result()
+        return labels_future.result(), is_nsfw, nsfw_score
+
+
+class LocalBackend(VisionBackend):
+    """
+    Offline CPU backend using Pillow heuristics, for CI, load tests and bulk offline work.
+
+    Work runs on a process pool of VISION_LOCAL_WORKERS processes (0 runs it inline), so
+    decoding does not contend for the GIL with request threads.
+    """
+
+    name = 'local'
+
+    def __init__(self):
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=settings.VISION_LOCAL_WORKERS,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def analyze(self, image_bytes):
+        args = (image_bytes, settings.VISION_LOCAL_MAX_DIMENSION, settings.VISION_LOCAL_NSFW_THRESHOLD)
+        if settings.VISION_LOCAL_WORKERS <= 0:
+            return analyze_locally(*args)
+        return self.get_executor().submit(analyze_locally, *args).result()
+
+    async def aanalyze(self, image_bytes):
+        if settings.VISION_LOCAL_WORKERS <= 0:
+            return await super().aanalyze(image_bytes)
+        args = (image_bytes, settings.VISION_LOCAL_MAX_DIMENSION, settings.VISION_LOCAL_NSFW_THRESHOLD)
+        return await asyncio.wrap_future(self.get_executor().submit(analyze_locally, *args))
+
+    def detect_moderation(self, image_bytes):
+        _, is_nsfw, nsfw_score = self.analyze(image_bytes)
+        return is_nsfw, nsfw_score
+
+    def detect_labels(self, image_bytes):
+        return self.analyze(image_bytes)[0]
+
+
+def get_vision_backend():
+    """
+    Returns the process-wide vision backend named by the VISION_BACKEND setting.
+
+    :return: VisionBackend instance.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.VISION_BACKEND)()
+    return _backend
+
+
+def reset_vision_backend():
+    """Drops the shared backend so the next call rebuilds it from the current settings."""
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def vision_cache_key(backend, digest):
+    """:return: Cache key of the backend's result for content with the given digest."""
+    return f"{backend.name}_{digest}"
+
+
+def stored_vision_result(digest):
+    """
+    :param digest: Content digest of an image.
+    :return: Queryset of (labels, is_nsfw, nsfw_score) from processed images with that digest.
+    """
+    return (
+        Image.objects.filter(content_hash=digest, status__in=['ACCEPTED', 'REJECTED'])
+        .values_list('labels', 'is_nsfw', 'nsfw_score')
+    )
+
+
+def analysis_bytes_for(image):
+    """:return: Image bytes for the backend, within VISION_MAX_DIMENSION and VISION_MAX_BYTES."""
+    return prepare_for_analysis(image, settings.VISION_MAX_DIMENSION, quality=settings.VISION_JPEG_QUALITY,
+                                max_bytes=settings.VISION_MAX_BYTES)
+
+
+def analyze_image(image, digest=None, backend=None):
+    """
+    Moderates and labels image bytes, reusing earlier results for identical content.
+
+    Results are looked up by content digest, first in the cache and then on previously
+    processed Image rows, so re-uploads skip the backend on every worker. On a miss the
+    backend gets a copy downscaled to VISION_MAX_DIMENSION.
+
+    :param image: Image bytes, or a Django File positioned at the start of the image.
+    :param digest: Content digest of the image, if already computed.
+    :param backend: VisionBackend to use; defaults to get_vision_backend().
+    :return: Tuple of (labels, is_nsfw, nsfw_score).
+    """
+    backend = backend if backend is not None else get_vision_backend()
+    if digest is None:
+        digest = content_digest([image]) if isinstance(image, bytes) else file_digest(image)
+    cache_key = vision_cache_key(backend, digest)
+    cached_result = cache.get(cache_key)
+    if cached_result:
+        VISION_RESULTS_TOTAL.labels(source='cache').inc()
+        return cached_result
+
+    stored_result = stored_vision_result(digest).first()
+    if stored_result:
+        VISION_RESULTS_TOTAL.labels(source='stored').inc()
+        cache.set(cache_key, stored_result, timeout=VISION_CACHE_TIMEOUT)
+        return stored_result
+
+    VISION_RESULTS_TOTAL.labels(source='backend').inc()
+    try:
+        with time_stage('vision_preprocess'):
+            analysis_bytes = analysis_bytes_for(image)
+        with time_stage('vision_backend'):
+            result = tuple(backend.analyze(analysis_bytes))
+    except Exception as e:
+        logger.error(f"Error processing image with {backend.name} vision backend: {e}")
+        raise
+    cache.set(cache_key, result, timeout=VISION_CACHE_TIMEOUT)
+    return result
+
+
+async def aanalyze_image(image, digest=None, backend=None):
+    """
+    Coroutine version of analyze_image for async views.
+
+    Cache and database lookups use the async APIs, the backend is awaited through
+    ``VisionBackend.aanalyze``, and hashing and downscaling run on a worker thread.
+
+    :param image: Image bytes, or a Django File positioned at the start of the image.
+    :param digest: Content digest of the image, if already computed.
+    :param backend: VisionBackend to use; defaults to get_vision_backend().
+    :return: Tuple of (labels, is_nsfw, nsfw_score).
+    """
+    backend = backend if backend is not None else get_vision_backend()
+    if digest is None and isinstance(image, bytes):
+        digest = content_digest([image])
+    elif digest is None:
+        digest = await sync_to_async(file_digest, thread_sensitive=False)(image)
+    cache_key = vision_cache_key(backend, digest)
+    cached_result = await cache.aget(cache_key)
+    if cached_result:
+        VISION_RESULTS_TOTAL.labels(source='cache').inc()
+        return cached_result
+
+    stored_result = await stored_vision_result(digest).afirst()
+    if stored_result:
+        VISION_RESULTS_TOTAL.labels(source='stored').inc()
+        await cache.aset(cache_key, stored_result, timeout=VISION_CACHE_TIMEOUT)
+        return stored_result
+
+    VISION_RESULTS_TOTAL.labels(source='backend').inc()
+    try:
+        with time_stage('vision_preprocess'):
+            analysis_bytes = await sync_to_async(analysis_bytes_for, thread_sensitive=False)(image)
+        with time_stage('vision_backend'):
+            result = tuple(await backend.aanalyze(analysis_bytes))
+    except Exception as e:
+        logger.error(f"Error processing image with {backend.name} vision backend: {e}")
+        raise
+    await cache.aset(cache_key, result, timeout=VISION_CACHE_TIMEOUT)
+    return result
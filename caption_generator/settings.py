@@ -57,6 +57,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     'django.middleware.common.CommonMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = "caption_generator.urls"
@@ -143,15 +144,74 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
+IMAGE_PAGE_SIZE = int(os.environ.get('IMAGE_PAGE_SIZE', 50))  # Default page size of cursor-paginated image listings
+IMAGE_MAX_PAGE_SIZE = int(os.environ.get('IMAGE_MAX_PAGE_SIZE', 200))
 
 # AWS Configuration
 AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 AWS_REGION = os.environ.get('AWS_REGION')
+REKOGNITION_BACKEND = os.environ.get('REKOGNITION_BACKEND', 'aws')  # 'aws', or 'stub' to run offline
+REKOGNITION_STUB_LABELS = ['Object']  # Labels returned for every image by the stub backend
+REKOGNITION_MAX_CONCURRENCY = int(os.environ.get('REKOGNITION_MAX_CONCURRENCY', 16))  # Threads issuing Rekognition calls per process
+REKOGNITION_MAX_POOL_CONNECTIONS = int(os.environ.get('REKOGNITION_MAX_POOL_CONNECTIONS', REKOGNITION_MAX_CONCURRENCY))
+REKOGNITION_CONNECT_TIMEOUT = float(os.environ.get('REKOGNITION_CONNECT_TIMEOUT', 5))  # Seconds
+REKOGNITION_READ_TIMEOUT = float(os.environ.get('REKOGNITION_READ_TIMEOUT', 30))  # Seconds
+REKOGNITION_MAX_ATTEMPTS = int(os.environ.get('REKOGNITION_MAX_ATTEMPTS', 3))
+REKOGNITION_RETRY_MODE = os.environ.get('REKOGNITION_RETRY_MODE', 'standard')  # botocore retry mode: legacy, standard or adaptive
+# Run moderation first and skip detect_labels for NSFW images, instead of issuing both calls concurrently
+REKOGNITION_SKIP_LABELS_ON_NSFW = os.environ.get('REKOGNITION_SKIP_LABELS_ON_NSFW', 'False') == 'True'
+
+# Vision backend: moderation and labelling of uploads
+VISION_BACKEND = os.environ.get('VISION_BACKEND', 'api.vision.RekognitionBackend')  # Or 'api.vision.LocalBackend' to run offline
+VISION_MAX_DIMENSION = int(os.environ.get('VISION_MAX_DIMENSION', 1600))  # Longest side sent for analysis; 0 sends the original
+VISION_JPEG_QUALITY = int(os.environ.get('VISION_JPEG_QUALITY', 90))  # Quality of the re-encoded analysis copy
+VISION_MAX_BYTES = int(os.environ.get('VISION_MAX_BYTES', 5 * 1024 * 1024))  # Larger originals are re-encoded; Rekognition accepts at most 5 MB of image bytes
+VISION_LOCAL_WORKERS = int(os.environ.get('VISION_LOCAL_WORKERS', os.cpu_count() or 1))  # LocalBackend processes; 0 runs inline
+VISION_LOCAL_MAX_DIMENSION = int(os.environ.get('VISION_LOCAL_MAX_DIMENSION', 256))  # Pixels analysed on the longest side
+VISION_LOCAL_NSFW_THRESHOLD = float(os.environ.get('VISION_LOCAL_NSFW_THRESHOLD', 90))  # Percentage of skin-tone pixels
+
+# Image renditions, generated lazily on first request unless RENDITIONS_ON_UPLOAD is set
+IMAGE_RENDITIONS = {
+    'thumbnail': {'size': 256, 'format': 'WEBP'},
+    'medium': {'size': 1024, 'format': 'WEBP'},
+}
+RENDITION_QUALITY = int(os.environ.get('RENDITION_QUALITY', 80))
+RENDITIONS_ON_UPLOAD = os.environ.get('RENDITIONS_ON_UPLOAD', 'False') == 'True'
+RENDITION_WORKERS = int(os.environ.get('RENDITION_WORKERS', 2))  # Background threads per process; 0 renders inline on commit
+
+# Caption model store
+CAPTION_MODEL_DIR = Path(os.environ.get('CAPTION_MODEL_DIR', BASE_DIR / 'caption_models'))
+CAPTION_MODEL_REFRESH_INTERVAL = float(os.environ.get('CAPTION_MODEL_REFRESH_INTERVAL', 30))  # Seconds between checks for a newer published model
+CAPTION_CACHE_SIZE = int(os.environ.get('CAPTION_CACHE_SIZE', 4096))  # Label sets whose caption distribution is kept per process; 0 disables
+CAPTION_CACHE_STALE_UPDATES = int(os.environ.get('CAPTION_CACHE_STALE_UPDATES', 100))  # Online updates after which cached distributions expire
+CAPTION_CACHE_SHARED = os.environ.get('CAPTION_CACHE_SHARED', 'False') == 'True'  # Also share distributions through the Django cache
+CAPTION_CACHE_TIMEOUT = int(os.environ.get('CAPTION_CACHE_TIMEOUT', 3600))
+CAPTION_RETRAIN_CHUNK_SIZE = int(os.environ.get('CAPTION_RETRAIN_CHUNK_SIZE', 2000))  # Rows fetched per query when retraining from the database
+CAPTION_RETRAIN_MAX_CLASSES = int(os.environ.get('CAPTION_RETRAIN_MAX_CLASSES', 0))  # Most frequent captions kept by streaming retrains, bounding model memory; 0 keeps all
+CAPTION_TRAINING_WORKERS = int(os.environ.get('CAPTION_TRAINING_WORKERS', 0))  # Processes for sharded retraining; 0 streams in one process
+
+# Upload pipeline
+# Uploads always stream to a temporary file, hashed and size-checked chunk by chunk
+FILE_UPLOAD_HANDLERS = ['api.upload_handlers.HashingUploadHandler']
+MAX_IMAGE_UPLOAD_SIZE = int(os.environ.get('MAX_IMAGE_UPLOAD_SIZE', 25 * 1024 * 1024))  # Bytes per uploaded file
+ASYNC_UPLOADS = os.environ.get('ASYNC_UPLOADS', 'False') == 'True'  # Default for requests without ?async=
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 4))  # Background threads per process; 0 processes inline on commit
+UPLOAD_PROCESSING_TIMEOUT = int(os.environ.get('UPLOAD_PROCESSING_TIMEOUT', 600))  # Seconds before a PROCESSING image is presumed abandoned and re-queued
+UPLOAD_BATCH_MAX_ITEMS = int(os.environ.get('UPLOAD_BATCH_MAX_ITEMS', 500))
+UPLOAD_BATCH_MAX_ARCHIVE_SIZE = int(os.environ.get('UPLOAD_BATCH_MAX_ARCHIVE_SIZE', 2 * 1024 * 1024 * 1024))  # Bytes per zip archive; members are still held to MAX_IMAGE_UPLOAD_SIZE
+UPLOAD_BATCH_WORKERS = int(os.environ.get('UPLOAD_BATCH_WORKERS', 8))  # Concurrent vision calls per batch request
+UPLOAD_BATCH_CHUNK_SIZE = int(os.environ.get('UPLOAD_BATCH_CHUNK_SIZE', 50))  # Items written per bulk_create
 
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8000",
     "http://127.0.0.1:8000",
 ]
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+# Request profiling
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False') == 'True'  # Profile every request
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))  # Fraction of requests profiled at random
+PROFILING_HEADER = 'HTTP_X_PROFILE'  # Staff requests sending "X-Profile: 1" are always profiled
+PROFILING_DIR = Path(os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles'))